@@ -0,0 +1,132 @@
+"""
+Per-turn overhead of the agent loop engine, excluding LLM and tool time.
+
+The provider and the MCP session are in-process fakes that answer instantly, so the
+measured time is what client_and_server_execution itself spends per loop turn
+(prompt building, response parsing, usage accounting, tool dispatch and history updates).
+
+Usage (from mcp_servers/python/clients):
+    python benchmarks/agent_loop_overhead.py --requests 2000 --turns 5 --tools-per-turn 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.llm.azureopenai import LlmResponseStruct
+from src.llm.providers import LlmProviders, OpenAICompatibleProvider
+from src.server_connection import MCPServers
+from src.client_and_server_execution import client_and_server_execution
+
+BENCH_CLIENT = "MCP_CLIENT_BENCHMARK"
+BENCH_SERVER = "BENCHMARK_SERVER"
+
+
+def llm_response(message: Dict[str, Any], output_type: str) -> LlmResponseStruct:
+    final_llm_response = {"choices": [{"message": message}], "usage": {"total_tokens": 30, "prompt_tokens": 20, "completion_tokens": 10}}
+    return LlmResponseStruct(
+        Data={
+            "total_llm_calls": 1,
+            "total_tokens": 30,
+            "total_input_tokens": 20,
+            "total_output_tokens": 10,
+            "final_llm_response": final_llm_response,
+            "llm_responses_arr": [final_llm_response],
+            "messages": [message.get("content") or ""],
+            "output_type": output_type
+        },
+        Error=None,
+        Status=True
+    )
+
+
+class BenchmarkProvider(OpenAICompatibleProvider):
+    """Answers the router call, then `turns` tool-call turns, then a final text answer"""
+    name = BENCH_CLIENT
+
+    def __init__(self, turns: int, tools_per_turn: int):
+        self.router_response = llm_response({"content": "<function_call>TRUE</function_call><selected_tools>bench_tool</selected_tools>"}, "text")
+        self.tool_response = llm_response({
+            "content": None,
+            "tool_calls": [
+                {"id": f"call_{i}", "type": "function", "function": {"name": "bench_tool", "arguments": json.dumps({"index": i})}}
+                for i in range(tools_per_turn)
+            ]
+        }, "tool_call")
+        self.final_response = llm_response({"content": "done"}, "text")
+        self.turns = turns
+        self.tools_per_turn = tools_per_turn
+
+    async def complete(self, client_details: Dict[str, Any], on_text: Any = None) -> LlmResponseStruct:
+        if not client_details.get("tools"):
+            return self.router_response
+        executed_tool_calls = sum(1 for message in client_details["chat_history"] if message["role"] == "assistant")
+        if executed_tool_calls < self.turns * self.tools_per_turn:
+            return self.tool_response
+        return self.final_response
+
+
+class BenchmarkSession:
+    async def call_tool(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        return {"content": [{"type": "text", "text": json.dumps({"tool": tool_name, "index": args.get("index")})}], "isError": False}
+
+
+def build_payload() -> Dict[str, Any]:
+    return {
+        "selected_client": BENCH_CLIENT,
+        "selected_servers": [BENCH_SERVER],
+        "selected_server_credentials": {BENCH_SERVER: {}},
+        "client_details": {
+            "input": "run the benchmark tool",
+            "prompt": "You are a benchmark assistant",
+            "api_key": "benchmark",
+            "tools": [{
+                "type": "function",
+                "function": {"name": "bench_tool", "description": "Benchmark tool", "parameters": {"type": "object", "properties": {}}}
+            }]
+        }
+    }
+
+
+async def run(requests: int, turns: int, tools_per_turn: int):
+    LlmProviders[BENCH_CLIENT] = BenchmarkProvider(turns, tools_per_turn)
+    MCPServers[BENCH_SERVER] = BenchmarkSession()
+
+    # Warm up imports and caches
+    for _ in range(20):
+        await client_and_server_execution(build_payload())
+
+    per_turn_us = []
+    llm_calls = 0
+    for _ in range(requests):
+        payload = build_payload()
+        start = time.perf_counter()
+        response = await client_and_server_execution(payload)
+        elapsed = time.perf_counter() - start
+        if not response.Status:
+            raise RuntimeError(f"Benchmark request failed: {response.Error}")
+        llm_calls = response.Data["total_llm_calls"]
+        per_turn_us.append(elapsed * 1e6 / llm_calls)
+
+    per_turn_us.sort()
+    print(f"requests        : {requests}")
+    print(f"tool turns      : {turns} x {tools_per_turn} tool calls")
+    print(f"llm calls/req   : {llm_calls}")
+    print(f"mean per turn   : {statistics.mean(per_turn_us):.1f} us")
+    print(f"p50 per turn    : {per_turn_us[len(per_turn_us) // 2]:.1f} us")
+    print(f"p99 per turn    : {per_turn_us[int(len(per_turn_us) * 0.99) - 1]:.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--tools-per-turn", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.turns, args.tools_per_turn))
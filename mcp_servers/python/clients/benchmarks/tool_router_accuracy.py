@@ -0,0 +1,98 @@
+"""
+Routing accuracy and latency of the local tool router against a request corpus.
+
+The corpus is JSON lines with "input", "isFunctionCall" and "selectedTools" (labelled by hand,
+or recorded from the LLM router with ToolRouterConfig["record_corpus_path"]). Recorded entries
+also carry "llm_latency_ms", which is reported next to the local router latency.
+
+Usage (from mcp_servers/python/clients):
+    python benchmarks/tool_router_accuracy.py
+    python benchmarks/tool_router_accuracy.py --corpus recorded.jsonl --tools benchmarks/data/gsuite_tools.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.tool_router import route_tools_locally
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(corpus_path: str, tools_path: str, router_name: str, repeat: int, verbose: bool):
+    with open(tools_path) as f:
+        all_tools = json.load(f)
+    with open(corpus_path) as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    decided = 0
+    decision_correct = 0
+    top1_correct = 0
+    tool_call_samples = 0
+    recall_sum = 0.0
+    latencies_us = []
+    llm_latencies_ms = []
+
+    for sample in samples:
+        # Recorded samples only keep tool names, restrict the catalog to the tools offered at the time
+        tools = all_tools
+        if sample.get("tools"):
+            tools = [tool for tool in all_tools if tool["function"]["name"] in sample["tools"]]
+        if sample.get("llm_latency_ms") is not None:
+            llm_latencies_ms.append(sample["llm_latency_ms"])
+
+        decision = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            decision = route_tools_locally(sample["input"], tools, sample.get("server_name", ""), router_name)
+            latencies_us.append((time.perf_counter() - start) * 1e6)
+
+        if decision is None:
+            if verbose:
+                print(f"FALLBACK  {sample['input']}")
+            continue
+
+        decided += 1
+        expected_tools = sample.get("selectedTools", [])
+        if decision["isFunctionCall"] == sample["isFunctionCall"]:
+            decision_correct += 1
+        if sample["isFunctionCall"] and expected_tools:
+            tool_call_samples += 1
+            if decision["selectedTools"] and decision["selectedTools"][0] in expected_tools:
+                top1_correct += 1
+            recall_sum += len(set(decision["selectedTools"]) & set(expected_tools)) / len(expected_tools)
+
+        if verbose:
+            print(f"{decision['confidence']:.2f}  {decision['isFunctionCall']!s:5}  {','.join(decision['selectedTools']) or '-':60}  {sample['input']}")
+
+    print(f"samples               : {len(samples)}")
+    print(f"decided locally       : {decided} ({decided / len(samples):.0%}), fallback to LLM: {len(samples) - decided}")
+    print(f"function call accuracy: {decision_correct / decided:.1%}" if decided else "function call accuracy: n/a")
+    print(f"top-1 tool accuracy   : {top1_correct / tool_call_samples:.1%}" if tool_call_samples else "top-1 tool accuracy   : n/a")
+    print(f"expected tool recall  : {recall_sum / tool_call_samples:.1%}" if tool_call_samples else "expected tool recall  : n/a")
+    print(f"local latency p50/p99 : {percentile(latencies_us, 0.5):.1f} / {percentile(latencies_us, 0.99):.1f} us")
+    if llm_latencies_ms:
+        print(f"llm latency p50/p99   : {percentile(llm_latencies_ms, 0.5):.1f} / {percentile(llm_latencies_ms, 0.99):.1f} ms")
+        print(f"llm latency mean      : {statistics.mean(llm_latencies_ms):.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(DATA_DIR, "tool_router_corpus.jsonl"))
+    parser.add_argument("--tools", default=os.path.join(DATA_DIR, "gsuite_tools.json"))
+    parser.add_argument("--router", default="bm25")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    run(args.corpus, args.tools, args.router, args.repeat, args.verbose)
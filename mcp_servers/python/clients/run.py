@@ -1,9 +1,11 @@
 from quart import Quart, request, jsonify, make_response, Response
 import json
 import asyncio
+import argparse
 import sys
 import os
 import logging
+import socket
 import time
 from typing import Optional, Dict, Any
 import pandas as pd
@@ -11,8 +13,16 @@ from asyncio import Lock
 from hypercorn.asyncio import serve
 from hypercorn.config import Config
 from contextlib import AsyncExitStack
+from functools import partial
 from src.llm.azureopenai import azure_openai_processor
-from src.server_connection import initialize_all_mcp, MCPServers
+from src.llm.http_client import close_llm_http_clients
+from src.llm.rate_limiter import LlmRateLimits
+from src.server_connection import initialize_all_mcp, server_stats, MCPServers
+from src.tool_catalog import MCPToolCatalog
+from src.metrics import GatewayMetrics
+from src.client_and_server_config import StreamingConfig, GatewayConfig
+from src.gateway_workers import GatewayWorkerSupervisor, reuse_port_socket
+from src.admission_control import AdmissionControl, AdmissionRejected, admission_tenant
 from src.client_and_server_validation import client_and_server_validation
 from src.client_and_server_execution import client_and_server_execution
 import logging
@@ -40,10 +50,14 @@ async def log_request_start():
 @app.after_request
 async def log_request_complete(response):
     request_time = time.time() - request.start_time
-    logger.info(f"{request.method} {request.path} - {response.status_code} - {request_time:.3f}s")
+    queue_wait = getattr(request, "admission_wait", None)
+    queue_info = f" (queued {queue_wait:.3f}s)" if queue_wait else ""
+    logger.info(f"{request.method} {request.path} - {response.status_code} - {request_time:.3f}s{queue_info}")
     return response
 
 app.mcp_exit_stack = None
+# Set by the pre-fork launcher, signalled once this worker's MCP servers are initialized
+app.worker_ready = None
 # Initialize the clients when the app starts
 @app.before_serving
 async def startup():
@@ -61,6 +75,18 @@ async def startup():
     except Exception as err:
         print(f"Error initializing MCP clients =========>>>> {err}")
 
+    if app.worker_ready is not None:
+        app.worker_ready.set()
+
+
+def too_many_requests(rejected: AdmissionRejected):
+    """Fast 429 for a request shed by admission control"""
+    return jsonify({
+        "Data": None,
+        "Error": str(rejected),
+        "Status": False
+    }), 429, {"Retry-After": "1"}
+
 
 @app.route("/api/v1/mcp/process_message", methods=["POST"])
 async def process_message():
@@ -84,9 +110,19 @@ async def process_message():
         # print(validation_result)
         print(f"\n✅ Execution Started")
         
+        # Admission control, the request waits for a slot or is shed with a 429
+        tenant = admission_tenant(data, request.headers.get("X-Tenant-Id"), request.remote_addr)
+        try:
+            request.admission_wait = await AdmissionControl.acquire(tenant)
+        except AdmissionRejected as rejected:
+            return too_many_requests(rejected)
+
         # Execution
         generated_payload = validation_result["payload"]
-        execution_response = await client_and_server_execution(generated_payload, {"streamCallbacks": None, "is_stream": False})
+        try:
+            execution_response = await client_and_server_execution(generated_payload, {"streamCallbacks": None, "is_stream": False})
+        finally:
+            AdmissionControl.release(tenant)
         
         print(f"\n✅ Execution Completed")
         response_dict = {
@@ -132,26 +168,39 @@ class CustomStreamHandler:
         await self.response_queue.put(f"data: {json.dumps(error_data)}\n\n")
         await self.response_queue.put(None)  # Signal end of stream
 
-async def stream_generator(response_queue: asyncio.Queue):
-    """Generator function for streaming responses"""
-    while True:
-        try:
-            # Wait for data with a timeout to prevent hanging
-            data = await asyncio.wait_for(response_queue.get(), timeout=30.0)
+def cancel_execution(execution_task: asyncio.Task, *args: Any):
+    """Cancel a streamed execution whose client went away, along with its LLM calls and in-flight MCP tool calls"""
+    if not execution_task.done():
+        print("Stream client disconnected, cancelling execution")
+        GatewayMetrics.inc("stream_requests_cancelled_total")
+        execution_task.cancel()
+
+async def stream_generator(response_queue: asyncio.Queue, execution_task: asyncio.Task):
+    """
+    Generator function for streaming responses. Idle periods get SSE keepalive comments.
+    Closing the generator cancels the execution task. The request task cancels it too,
+    for a client that disconnects before the generator is first iterated.
+    """
+    keepalive_seconds = StreamingConfig.get("keepalive_seconds", 15)
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(response_queue.get(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
             if data is None:  # End of stream signal
+                # Let the execution return, so ending the request does not count as a cancellation
+                await execution_task
                 break
             yield data
-        except asyncio.TimeoutError:
-            # Send keepalive or break on timeout
-            break
-        except Exception as e:
-            print(f"Stream generator error: {e}")
-            break
+    finally:
+        cancel_execution(execution_task)
 
 @app.route('/api/v1/mcp/process_message_stream', methods=['POST'])
 async def process_message_stream():
-    # Create a queue for streaming responses
-    response_queue = asyncio.Queue()
+    # Create a bounded queue for streaming responses, producers wait while it is full
+    response_queue = asyncio.Queue(maxsize=StreamingConfig.get("queue_size", 64))
     custom_stream_handler = CustomStreamHandler(response_queue)
     
     try:
@@ -160,10 +209,17 @@ async def process_message_stream():
         if not data:
             data = {}
         
-        # Modify client details
+        # Modify client details, the LLM adapters stream tokens and forward text deltas as MESSAGE-DELTA events
         if 'client_details' not in data:
             data['client_details'] = {}
-        data['client_details']['is_stream'] = False
+        data['client_details']['is_stream'] = True
+
+        # Admission control before the stream starts, so a shed request gets a plain 429
+        tenant = admission_tenant(data, request.headers.get("X-Tenant-Id"), request.remote_addr)
+        try:
+            request.admission_wait = await AdmissionControl.acquire(tenant)
+        except AdmissionRejected as rejected:
+            return too_many_requests(rejected)
         
         # Start streaming response
         async def generate_response():
@@ -235,11 +291,17 @@ async def process_message_stream():
                 await custom_stream_handler.on_end()
         
         # Start the response generation in the background
-        asyncio.create_task(generate_response())
+        execution_task = asyncio.create_task(generate_response())
+        # Done callbacks also run for a task cancelled before its first step, so the slot is always returned
+        execution_task.add_done_callback(lambda task: AdmissionControl.release(tenant))
+        # Quart cancels the request task when the client disconnects, at any point of the response
+        request_task = asyncio.current_task()
+        if request_task is not None:
+            request_task.add_done_callback(partial(cancel_execution, execution_task))
         
         # Return streaming response
-        return Response(
-            stream_generator(response_queue),
+        response = Response(
+            stream_generator(response_queue, execution_task),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
@@ -248,6 +310,9 @@ async def process_message_stream():
                 'Access-Control-Allow-Headers': 'Content-Type'
             }
         )
+        # Quart's RESPONSE_TIMEOUT would cut long streams, the execution budget bounds them instead
+        response.timeout = None
+        return response
         
     except Exception as error:
         print(f"Error ========>>>>> {error}")
@@ -274,18 +339,130 @@ async def process_message_stream():
         )
 
 
+@app.route("/api/v1/mcp/metrics", methods=["GET"])
+async def gateway_metrics():
+    if request.args.get("format") == "prometheus":
+        return Response(GatewayMetrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+    return jsonify({
+        "Data": GatewayMetrics.snapshot(),
+        "Error": None,
+        "Status": True
+    }), 200
+
+
+@app.route("/api/v1/mcp/admin/admission", methods=["GET"])
+async def admission_stats():
+    return jsonify({
+        "Data": AdmissionControl.stats(),
+        "Error": None,
+        "Status": True
+    }), 200
+
+
+@app.route("/api/v1/mcp/admin/llm_rate_limits", methods=["GET"])
+async def llm_rate_limit_stats():
+    return jsonify({
+        "Data": LlmRateLimits.stats(),
+        "Error": None,
+        "Status": True
+    }), 200
+
+
+@app.route("/api/v1/mcp/admin/tool_catalog", methods=["GET"])
+async def tool_catalog_stats():
+    return jsonify({
+        "Data": MCPToolCatalog.stats(),
+        "Error": None,
+        "Status": True
+    }), 200
+
+
+@app.route("/api/v1/mcp/admin/servers", methods=["GET"])
+async def mcp_server_stats():
+    return jsonify({
+        "Data": server_stats(),
+        "Error": None,
+        "Status": True
+    }), 200
+
+
+@app.route("/api/v1/mcp/admin/refresh_tools", methods=["POST"])
+async def refresh_tools():
+    try:
+        data = await request.get_json(silent=True) or {}
+        server_name = data.get("server_name")
+
+        if server_name and server_name not in MCPServers:
+            return jsonify({
+                "Data": None,
+                "Error": "Invalid Server",
+                "Status": False
+            }), 200
+
+        # Rebuild eagerly so the next request is served from the cache
+        for server in ([server_name] if server_name else list(MCPServers.keys())):
+            MCPToolCatalog.invalidate(server)
+            await MCPToolCatalog.build(server, MCPServers[server])
+
+        return jsonify({
+            "Data": MCPToolCatalog.stats(),
+            "Error": None,
+            "Status": True
+        }), 200
+
+    except Exception as error:
+        print(f"Error ========>>>>> {error}")
+        return jsonify({
+            "Data": None,
+            "Error": str(error),
+            "Status": False
+        }), 500
+
+
 @app.after_serving
 async def shutdown():
     if app.mcp_exit_stack:
         await app.mcp_exit_stack.__aexit__(None, None, None)
         app.mcp_exit_stack = None
         print("\n✅ MCP servers cleaned up on shutdown.\n")
+    await close_llm_http_clients()
+    print("\n✅ LLM http clients closed on shutdown.\n")
     
+
+def serve_worker(worker_id: int, ready_event: Any, shutdown_event: Any, bind: str):
+    """Entry point of one pre-fork worker process"""
+    app.worker_ready = ready_event
+
+    # Each worker binds its own socket on the shared port, the kernel balances connections between them
+    sock = reuse_port_socket(bind)
+    config = Config()
+    # Hypercorn owns the descriptor from here on, detach() keeps the socket object from closing it too
+    config.bind = [f"fd://{sock.detach()}"]
+    config.graceful_timeout = GatewayConfig.get("graceful_timeout", 30)
+
+    async def shutdown_trigger():
+        while not shutdown_event.is_set():
+            await asyncio.sleep(0.5)
+        print(f"\n✅ Gateway worker {worker_id} stopping.\n")
+
+    asyncio.run(serve(app, config, shutdown_trigger=shutdown_trigger))
+
+
+def get_gateway_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=GatewayConfig.get("workers", 1), help="Gateway worker processes")
+    parser.add_argument("--bind", type=str, default=GatewayConfig.get("bind", "0.0.0.0:5001"), help="host:port to listen on")
+    args, _ = parser.parse_known_args()
+    return args
+
+
 if __name__ == "__main__":
+    gateway_args = get_gateway_args()
+
     # Create a config instance
     config = Config()
     # Configure bind address and port 
-    config.bind = [f"0.0.0.0:5001"]
+    config.bind = [gateway_args.bind]
 
     # Print welcome banner
     print("╔═══════════════════════════════════════════════════════════════════════════════════════════╗")
@@ -298,5 +475,18 @@ if __name__ == "__main__":
     print("║                                                                                           ║") 
     print("╚═══════════════════════════════════════════════════════════════════════════════════════════╝")
 
-    # Start the Quart app
-    asyncio.run(serve(app, config))
\ No newline at end of file
+    # Start the Quart app, in one process or as pre-fork workers sharing the port
+    if gateway_args.workers > 1 and hasattr(socket, "SO_REUSEPORT"):
+        print(f"Starting {gateway_args.workers} gateway workers on {gateway_args.bind}")
+        supervisor = GatewayWorkerSupervisor(
+            serve_worker,
+            gateway_args.workers,
+            start_timeout=GatewayConfig.get("worker_start_timeout", 120),
+            graceful_timeout=GatewayConfig.get("graceful_timeout", 30),
+            target_args=(gateway_args.bind,)
+        )
+        sys.exit(supervisor.run())
+    else:
+        if gateway_args.workers > 1:
+            print("SO_REUSEPORT is not available on this platform, running a single gateway worker")
+        asyncio.run(serve(app, config))
\ No newline at end of file
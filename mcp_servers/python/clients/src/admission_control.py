@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import ipaddress
+import time
+from typing import Dict, Any, Optional, List
+
+from src.client_and_server_config import AdmissionConfig
+from src.metrics import GatewayMetrics
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued, answered with a 429"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def is_trusted_proxy(remote_addr: Optional[str]) -> bool:
+    """Whether remote_addr is in AdmissionConfig["trusted_proxies"] (addresses or CIDR networks)"""
+    if not remote_addr:
+        return False
+    try:
+        address = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+    for proxy in AdmissionConfig.get("trusted_proxies", []):
+        try:
+            if address in ipaddress.ip_network(proxy, strict=False):
+                return True
+        except ValueError:
+            print(f"Error in AdmissionConfig trusted_proxies =========>>>> invalid entry {proxy}")
+    return False
+
+
+def admission_tenant(payload: Dict[str, Any], tenant_header: Optional[str] = None, remote_addr: Optional[str] = None) -> str:
+    """
+    Tenant of a request: a hash of the LLM API key it brings. The X-Tenant-Id header is only
+    taken from a trusted proxy, any other caller could pick a new tenant per request.
+    """
+    if tenant_header and is_trusted_proxy(remote_addr):
+        return tenant_header
+    api_key = (payload.get("client_details") or {}).get("api_key") or ""
+    if not api_key:
+        return "anonymous"
+    return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class AdmissionController:
+    """
+    Concurrency limits in front of client_and_server_execution: a global limit and one per tenant.
+    Requests over a limit wait in a bounded queue until their deadline, a request arriving to a full
+    queue, or still waiting at its deadline, is rejected right away so the client can back off.
+    """
+
+    def __init__(self, max_concurrent: int, max_concurrent_per_tenant: int, max_queue: int, queue_timeout_seconds: float):
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_per_tenant = max_concurrent_per_tenant
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._global = asyncio.Semaphore(max_concurrent)
+        # tenant -> [semaphore, requests holding or waiting for it]
+        self._tenants: Dict[str, List[Any]] = {}
+        self.active = 0
+        self.queued = 0
+
+    def _tenant_state(self, tenant: str) -> List[Any]:
+        state = self._tenants.get(tenant)
+        if state is None:
+            state = [asyncio.Semaphore(self.max_concurrent_per_tenant), 0]
+            self._tenants[tenant] = state
+        state[1] += 1
+        return state
+
+    def _drop_tenant_ref(self, tenant: str):
+        state = self._tenants[tenant]
+        state[1] -= 1
+        if state[1] == 0:
+            del self._tenants[tenant]
+
+    def _update_gauges(self):
+        GatewayMetrics.set_gauge("admission_active_requests", self.active)
+        GatewayMetrics.set_gauge("admission_queued_requests", self.queued)
+
+    def _reject(self, tenant: str, reason: str, message: str):
+        self._drop_tenant_ref(tenant)
+        GatewayMetrics.inc("admission_rejected_total", labels={"reason": reason})
+        raise AdmissionRejected(reason, message)
+
+    async def acquire(self, tenant: str) -> float:
+        """
+        Wait for a tenant slot, then a global slot.
+
+        Returns:
+            float: Seconds spent queued
+        """
+        start_time = time.perf_counter()
+        state = self._tenant_state(tenant)
+        tenant_slot = state[0]
+
+        must_wait = tenant_slot.locked() or self._global.locked()
+        if must_wait:
+            if self.queued >= self.max_queue:
+                self._reject(tenant, "queue_full", f"Too many requests, {self.queued} requests already queued")
+            self.queued += 1
+            self._update_gauges()
+
+        acquired = []
+        try:
+            # The tenant slot comes first so a tenant at its limit never holds a global slot while waiting
+            for slot in (tenant_slot, self._global):
+                if slot.locked():
+                    remaining = self.queue_timeout_seconds - (time.perf_counter() - start_time)
+                    await asyncio.wait_for(slot.acquire(), timeout=max(0.0, remaining))
+                else:
+                    # A free slot is taken without suspending, so a burst sees it as taken at once
+                    await slot.acquire()
+                acquired.append(slot)
+        except asyncio.TimeoutError:
+            for slot in acquired:
+                slot.release()
+            self._reject(tenant, "queue_timeout", f"Too many requests, no capacity within {self.queue_timeout_seconds}s")
+        except BaseException:
+            for slot in acquired:
+                slot.release()
+            self._drop_tenant_ref(tenant)
+            raise
+        finally:
+            if must_wait:
+                self.queued -= 1
+                self._update_gauges()
+
+        self.active += 1
+        self._update_gauges()
+        queue_wait = time.perf_counter() - start_time
+        GatewayMetrics.observe("admission_queue_wait_seconds", queue_wait)
+        return queue_wait
+
+    def release(self, tenant: str):
+        self._global.release()
+        self._tenants[tenant][0].release()
+        self._drop_tenant_ref(tenant)
+        self.active -= 1
+        self._update_gauges()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_concurrent_per_tenant": self.max_concurrent_per_tenant,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout_seconds,
+            "active": self.active,
+            "queued": self.queued,
+            "tenants": len(self._tenants)
+        }
+
+
+# Global admission controller, one per gateway worker process
+AdmissionControl = AdmissionController(
+    AdmissionConfig.get("max_concurrent", 64),
+    AdmissionConfig.get("max_concurrent_per_tenant", 8),
+    AdmissionConfig.get("max_queue", 256),
+    AdmissionConfig.get("queue_timeout_seconds", 10)
+)
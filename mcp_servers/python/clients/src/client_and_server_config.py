@@ -3,6 +3,9 @@ ClientsConfig =[
     "MCP_CLIENT_OPENAI",
 	"MCP_CLIENT_GEMINI"
 ]
+# "replicas" stdio processes are started per server, tool calls go to the least-busy one.
+# Replicas are pinged every "health_check_interval" seconds and respawned when they die or stop answering.
+# A "lazy" server is spawned by its first request instead of at startup, and stopped after "idle_timeout" seconds unused.
 ServersConfig = [
 	{
 		"server_name": "MCP-GSUITE",
@@ -12,6 +15,143 @@ ServersConfig = [
 			"../servers/MCP-GSUITE/mcp-gsuite",
 			"run",
 			"mcp-gsuite"
+		],
+		"startup_timeout": 60,
+		"replicas": 1,
+		"health_check_interval": 15,
+		"lazy": False,
+		"idle_timeout": 600
+	}
+]
+# Shared async HTTP client settings for the LLM adapters, one connection pool per provider
+LlmHttpConfig = {
+	"MCP_CLIENT_AZURE_AI": {
+		"http2": True,
+		"max_connections": 200,
+		"max_keepalive_connections": 50,
+		"keepalive_expiry": 30,
+		"connect_timeout": 10,
+		"timeout": 60
+	},
+	"MCP_CLIENT_OPENAI": {
+		"http2": True,
+		"max_connections": 200,
+		"max_keepalive_connections": 50,
+		"keepalive_expiry": 30,
+		"connect_timeout": 10,
+		"timeout": 60
+	},
+	"MCP_CLIENT_GEMINI": {
+		"http2": True,
+		"max_connections": 200,
+		"max_keepalive_connections": 50,
+		"keepalive_expiry": 30,
+		"connect_timeout": 10,
+		"timeout": 60
+	}
+}
+
+# Agent loop execution settings, every value can be overridden per request in client_details.
+# The limits end the loop with a partial response when reached, None disables a limit.
+ExecutionConfig = {
+	"max_parallel_tool_calls": 5,
+	"max_llm_calls": 10,
+	"max_execution_seconds": 120,
+	"max_input_tokens": 200000,
+	"max_output_tokens": 20000
+}
+
+# Local tool router used in place of the "Optimized Token LLM call" when it is confident.
+# router: "llm" (always use the LLM router) or "bm25", can be overridden per request with client_details["tool_router"].
+# Keep "llm" until bm25 is calibrated on a corpus recorded from real traffic (record_corpus_path, benchmarks/tool_router_accuracy.py)
+ToolRouterConfig = {
+	"router": "llm",
+	"min_confidence": 0.6,
+	"score_scale": 2.0,
+	"relative_cutoff": 0.6,
+	# Previous chat_history messages added to the routed text, and the weight of their term scores
+	"history_messages": 2,
+	"history_weight": 0.5,
+	"max_selected_tools": 3,
+	# Append LLM router decisions as JSON lines to build a benchmark corpus, None disables recording
+	"record_corpus_path": None,
+	# Per-server keyword rules, a rule selects its tools when any keyword phrase appears as whole words in the input
+	"keyword_rules": {
+		"MCP-GSUITE": [
+			{"keywords": ["inbox", "unread"], "tools": ["query_gmail_emails"]},
+			{"keywords": ["attachment"], "tools": ["get_gmail_attachment"]},
+			{"keywords": ["google meet", "meet link"], "tools": ["create_meet_meeting"]},
+			{"keywords": ["am i free", "availability", "available"], "tools": ["check_calendar_availability"]}
 		]
 	}
-]
\ No newline at end of file
+}
+
+# Per-request chat_history budget for the agent loop, values can be overridden per request in client_details
+HistoryConfig = {
+	"max_history_tokens": 8000,
+	"max_tool_result_tokens": 1500,
+	"keep_recent_messages": 4
+}
+
+# Server-sent events pipeline of /api/v1/mcp/process_message_stream
+StreamingConfig = {
+	# Events buffered per request, the execution waits when a slow client lets the buffer fill up
+	"queue_size": 64,
+	# An SSE comment is sent after this many idle seconds so proxies keep the connection open
+	"keepalive_seconds": 15
+}
+
+# Gateway process settings. With "workers" above 1, run.py starts that many worker processes on the same
+# port (SO_REUSEPORT), each with its own MCP server replicas, and SIGHUP restarts them one at a time.
+GatewayConfig = {
+	"bind": "0.0.0.0:5001",
+	"workers": 1,
+	# Seconds a new worker gets to initialize its MCP servers before a rolling restart gives up on it
+	"worker_start_timeout": 120,
+	# Seconds in-flight requests get to finish when a worker stops
+	"graceful_timeout": 30
+}
+
+# Admission control in front of client_and_server_execution, per gateway worker.
+# Tenants are identified by the LLM api_key of the request, or by the X-Tenant-Id header when it comes from a trusted proxy.
+AdmissionConfig = {
+	# Addresses or CIDR networks (e.g. "10.0.0.0/8") of proxies allowed to set X-Tenant-Id
+	"trusted_proxies": [],
+	"max_concurrent": 64,
+	"max_concurrent_per_tenant": 8,
+	# Requests waiting for a slot, a request arriving to a full queue gets a 429 right away
+	"max_queue": 256,
+	# Seconds a queued request may wait for a slot before it gets a 429
+	"queue_timeout_seconds": 10
+}
+
+# Client-side rate limits and retries of the LLM adapters, per gateway worker.
+# Budgets are per deployment (Azure deployment, OpenAI/Gemini model), None leaves a budget to the provider.
+# "deployments" overrides the provider values for one deployment, e.g. {"gpt-4o": {"tokens_per_minute": 450000}}
+# 429s (honoring Retry-After) and 5xx responses are retried up to "max_retries" times with jittered exponential backoff.
+LlmRateLimitConfig = {
+	"MCP_CLIENT_AZURE_AI": {
+		"requests_per_minute": None,
+		"tokens_per_minute": None,
+		"max_retries": 3,
+		"initial_backoff": 1,
+		"max_backoff": 30,
+		"deployments": {}
+	},
+	"MCP_CLIENT_OPENAI": {
+		"requests_per_minute": None,
+		"tokens_per_minute": None,
+		"max_retries": 3,
+		"initial_backoff": 1,
+		"max_backoff": 30,
+		"deployments": {}
+	},
+	"MCP_CLIENT_GEMINI": {
+		"requests_per_minute": None,
+		"tokens_per_minute": None,
+		"max_retries": 3,
+		"initial_backoff": 1,
+		"max_backoff": 30,
+		"deployments": {}
+	}
+}
@@ -1,12 +1,17 @@
+import asyncio
 import json
 import logging
+import time
 from typing import Any, Dict, List, Optional
 
-# Assuming these are your imported modules/classes for MCP clients and Azure LLM calls
-from src.llm.azureopenai import azure_openai_processor  # your async LLM call function
-from src.llm.openai import openai_processor  # your async LLM call function
-from src.server_connection import MCPServers  # MCP clients dict or class with call_tool method
-from src.llm.gemini import gemini_processor 
+from src.llm.providers import LlmProviders, LlmProvider
+from src.llm.azureopenai import LlmResponseStruct
+from src.server_connection import MCPServers, ensure_mcp_server  # MCP clients dict or class with call_tool method
+from src.client_and_server_config import ExecutionConfig
+from src.tool_router import route_tools_locally, record_routing_sample
+from src.history_manager import HistoryManager
+from src.execution_budget import ExecutionBudget, ExecutionLimitReached, BUDGET_LIMITS
+from src.metrics import GatewayMetrics
 
 
 class ClientAndServerExecutionResponse:
@@ -27,33 +32,96 @@ class ClientAndServerExecutionResponse:
 
 
 async def client_and_server_execution(payload: Dict[str, Any], streaming_callback: Optional[Any] = None) -> ClientAndServerExecutionResponse:
+    result = ClientAndServerExecutionResponse()
+    budget = ExecutionBudget(payload.get("client_details", {}))
     try:
-        result = ClientAndServerExecutionResponse()
-
-        selected_server_credentials = payload.get("selected_server_credentials")
-        client_details = payload.get("client_details", {})
-        selected_client = payload.get("selected_client", "")
-        selected_servers = payload.get("selected_servers", [])
-        selected_server = selected_servers[0] if selected_servers else ""
-
-        # Prepare chat history
-        input_content = client_details.get("input", "")
-        if "chat_history" in client_details:
-            client_details["chat_history"].append({"role": "user", "content": input_content})
-        else:
-            client_details["chat_history"] = [{"role": "user", "content": input_content}]
-
-        temp_tools = json.dumps(client_details.get("tools", []))
-        temp_prompt = client_details.get("prompt", "")
-
-        # Extract tool call details for prompt
-        tool_call_details_arr = []
-        for tool in client_details.get("tools", []):
-            tool_call_details_arr.append({
-                "function_name": tool.get("function", {}).get("name", ""),
-                "function_description": tool.get("function", {}).get("description", ""),
-            })
+        response = await run_agent_loop(result, payload, budget, streaming_callback)
+
+    except ExecutionLimitReached as limit:
+        # Graceful partial response with everything gathered so far
+        logging.warning(f"client_and_server_execution stopped early: {limit}")
+        GatewayMetrics.inc("agent_loop_limit_reached_total", labels={"limit": limit.limit})
+        result.Data["limit_reached"] = limit.limit
+        result.Error = str(limit)
+        result.Status = True
+        if streaming_callback and streaming_callback.get("is_stream"):
+            await send_stream_event(streaming_callback, str(limit), "NOTIFICATION", streaming_status="LIMIT-REACHED")
+        response = result
+
+    except Exception as e:
+        logging.error(f"Exception in client_and_server_execution: {e}")
+        response = ClientAndServerExecutionResponse()
+        response.Error = str(e)
+        response.Status = False
+
+    record_execution_metrics(payload.get("selected_client", ""), response, budget)
+    return response
+
+
+def record_execution_metrics(selected_client: str, response: ClientAndServerExecutionResponse, budget: ExecutionBudget) -> None:
+    """Export per-request budget consumption and the configured limits, for capacity sizing."""
+    labels = {"client": selected_client}
+    GatewayMetrics.inc("agent_loop_requests_total", labels={**labels, "status": str(response.Status).lower()})
+    usage = budget.usage(response.Data)
+    GatewayMetrics.observe("agent_loop_llm_calls", usage["max_llm_calls"], labels=labels, buckets=[1, 2, 3, 4, 5, 7, 10, 15, 20, 30])
+    GatewayMetrics.observe("agent_loop_duration_seconds", usage["max_execution_seconds"], labels=labels)
+    GatewayMetrics.observe("agent_loop_input_tokens", usage["max_input_tokens"], labels=labels, buckets=[500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 200000])
+    GatewayMetrics.observe("agent_loop_output_tokens", usage["max_output_tokens"], labels=labels, buckets=[100, 250, 500, 1000, 2500, 5000, 10000, 20000])
+    for limit in BUDGET_LIMITS:
+        if ExecutionConfig.get(limit) is not None:
+            GatewayMetrics.set_gauge("agent_loop_budget_limit", ExecutionConfig[limit], labels={"limit": limit})
+
+
+async def run_agent_loop(
+    result: ClientAndServerExecutionResponse,
+    payload: Dict[str, Any],
+    budget: ExecutionBudget,
+    streaming_callback: Optional[Any] = None
+) -> ClientAndServerExecutionResponse:
+    selected_server_credentials = payload.get("selected_server_credentials")
+    client_details = payload.get("client_details", {})
+    selected_client = payload.get("selected_client", "")
+    selected_servers = payload.get("selected_servers", [])
+    selected_server = selected_servers[0] if selected_servers else ""
+
+    provider = LlmProviders.get(selected_client)
+    if provider is None:
+        result.Error = "Invalid Client"
+        return result
 
+    # Prepare chat history
+    input_content = client_details.get("input", "")
+    if "chat_history" in client_details:
+        client_details["chat_history"].append({"role": "user", "content": input_content})
+    else:
+        client_details["chat_history"] = [{"role": "user", "content": input_content}]
+
+    # Keep the re-sent history within the per-request token budget
+    history = HistoryManager(client_details)
+    history.compact(client_details["chat_history"])
+
+    temp_tools = json.dumps(client_details.get("tools", []))
+    temp_prompt = client_details.get("prompt", "")
+
+    # Extract tool call details for prompt
+    tool_call_details_arr = []
+    for tool in client_details.get("tools", []):
+        tool_call_details_arr.append({
+            "function_name": tool.get("function", {}).get("name", ""),
+            "function_description": tool.get("function", {}).get("description", ""),
+        })
+
+    # Try the in-process router first, the LLM router only runs when it is not confident
+    extracted_result = route_tools_locally(
+        input_content,
+        client_details.get("tools", []),
+        selected_server,
+        client_details.get("tool_router"),
+        client_details["chat_history"]
+    )
+    if extracted_result is not None:
+        await send_stream_event(streaming_callback, "Local tool routing Successfully Completed", "NOTIFICATION")
+    else:
         tools_getting_agent_prompt = f"""
         You are an {selected_server} AI assistant that analyzes user requests and determines the require tool calls from available tools.
         Available tools: {json.dumps(tool_call_details_arr)}
@@ -69,798 +137,147 @@ async def client_and_server_execution(payload: Dict[str, Any], streaming_callbac
         client_details["prompt"] = tools_getting_agent_prompt
         client_details["tools"] = []
 
-        if selected_client == "MCP_CLIENT_AZURE_AI":
-
-            # Initial LLM call
-            initial_llm_response = await azure_openai_processor(client_details)
-            if not initial_llm_response.Status:
-                result.Error = initial_llm_response.Error
-                result.Status = initial_llm_response.Status
-                return result
-            extracted_result = extract_data_from_response(initial_llm_response.Data.get("messages", [{}])[0] if initial_llm_response.Data else "")
-            
-            result.Data["total_llm_calls"] += 1
-            result.Data["total_tokens"] += initial_llm_response.Data.get("total_tokens", 0)
-            result.Data["total_input_tokens"] += initial_llm_response.Data.get("total_input_tokens", 0)
-            result.Data["total_output_tokens"] += initial_llm_response.Data.get("total_output_tokens", 0)
-            result.Data["final_llm_response"] = initial_llm_response.Data.get("final_llm_response")
-            result.Data["llm_responses_arr"].append(initial_llm_response.Data.get("final_llm_response"))
-
-            if streaming_callback and streaming_callback.get("is_stream"):
-                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                    "Data": "Optimized Token LLM call Successfully Completed",
-                    "Error": None,
-                    "Status": True,
-                    "StreamingStatus": "IN-PROGRESS",
-                    "Action": "NOTIFICATION"
-                }))
-            
-            if extracted_result["isFunctionCall"]:
-                final_tool_calls = []
-                selected_tools = extracted_result["selectedTools"]
-                parsed_tools = json.loads(temp_tools)
-
-                for tool_name in selected_tools:
-                    matching_tool = next((t for t in parsed_tools if t.get("function", {}).get("name") == tool_name), None)
-                    if matching_tool:
-                        final_tool_calls.append(matching_tool)
-
-                client_details["prompt"] = temp_prompt
-                client_details["tools"] = final_tool_calls
-                
-
-                # Loop to handle multiple LLM calls and tool executions
-                while True:
-                    response = await azure_openai_processor(client_details)
-                    if not response.Status:
-                        result.Error = response.Error
-                        result.Status = response.Status
-                        return result
-
-                    result.Data["total_llm_calls"] += 1
-                    result.Data["total_tokens"] += response.Data.get("total_tokens", 0)
-                    result.Data["total_input_tokens"] += response.Data.get("total_input_tokens", 0)
-                    result.Data["total_output_tokens"] += response.Data.get("total_output_tokens", 0)
-                    result.Data["final_llm_response"] = response.Data.get("final_llm_response")
-                    result.Data["llm_responses_arr"].append(response.Data.get("final_llm_response"))
-
-                    if response.Data.get("output_type") == "text":
-                        result.Data["messages"].extend(response.Data.get("messages", []))
-                        result.Data["output_type"] = response.Data.get("output_type", "")
-                        result.Error = response.Error
-                        result.Status = response.Status
-
-                        for message in response.Data.get("messages", []):
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": message,
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "MESSAGE"
-                                }))
-                        return result
-
-                    if streaming_callback and streaming_callback.get("is_stream"):
-                        await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                            "Data": "Tool Calls Started",
-                            "Error": None,
-                            "Status": True,
-                            "StreamingStatus": "IN-PROGRESS",
-                            "Action": "NOTIFICATION"
-                        }))
-
-                    for tool in response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("tool_calls", []):
-                        
-                        tool_name = tool.get("function", {}).get("name")
-                        args = json.loads(tool.get("function", {}).get("arguments", "{}"))
-
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": f"{selected_server} MCP server {tool_name} call initiated",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        tool_call_result = await call_and_execute_tool(selected_server, selected_server_credentials, tool_name, args)
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": f"{selected_server} MCP server {tool_name} call result  : {json.dumps(tool_call_result)}",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        result.Data["executed_tool_calls"].append({
-                            "id": tool.get("id"),
-                            "name": tool_name,
-                            "arguments": args,
-                            "result": tool_call_result,
-                        })
-
-                        tool_call_content_data = f"Executed tool: {tool_name} and the result is: {json.dumps(tool_call_result)}"
-                        client_details["chat_history"].append({
-                            "role": "assistant",
-                            "content": tool_call_content_data,
-                        })
-
-            else:
-                # No function call, normal response case
-                client_details["prompt"] = f"{temp_prompt}. Available tools: {json.dumps(tool_call_details_arr)}"
-                client_details["tools"] = []
-
-                normal_response = await azure_openai_processor(client_details)
-                result.Data["total_llm_calls"] += 1
-                result.Data["total_tokens"] += normal_response.Data.get("total_tokens", 0)
-                result.Data["total_input_tokens"] += normal_response.Data.get("total_input_tokens", 0)
-                result.Data["total_output_tokens"] += normal_response.Data.get("total_output_tokens", 0)
-                result.Data["final_llm_response"] = normal_response.Data.get("final_llm_response")
-                result.Data["llm_responses_arr"].append(normal_response.Data.get("final_llm_response"))
-
-                result.Data["output_type"] = normal_response.Data.get("output_type", "")
-                result.Error = normal_response.Error
-                result.Status = normal_response.Status
-
-                content = normal_response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("content")
-                if not normal_response.Status or (content is not None and content != ""):
-                    result.Data["messages"] = normal_response.Data.get("messages", [])
-                    for message in normal_response.Data.get("messages", []):
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": message,
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "MESSAGE"
-                            }))
-                    return result
-
-                if len(normal_response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("tool_calls", [])) > 0:
-                    # Repeat the tool calling loop as in the TS code
-                    final_tool_calls = []
-                    selected_tools = extracted_result["selectedTools"]
-                    parsed_tools = json.loads(temp_tools)
-                    for tool_name in selected_tools:
-                        matching_tool = next((t for t in parsed_tools if t.get("function", {}).get("name") == tool_name), None)
-                        if matching_tool:
-                            final_tool_calls.append(matching_tool)
-
-                    client_details["prompt"] = temp_prompt
-                    client_details["tools"] = final_tool_calls
-
-                    while True:
-                        response = await azure_openai_processor(client_details)
-                        if not response.Status:
-                            result.Error = response.Error
-                            result.Status = response.Status
-                            return result
-
-                        result.Data["total_llm_calls"] += 1
-                        result.Data["total_tokens"] += response.Data.get("total_tokens", 0)
-                        result.Data["total_input_tokens"] += response.Data.get("total_input_tokens", 0)
-                        result.Data["total_output_tokens"] += response.Data.get("total_output_tokens", 0)
-                        result.Data["final_llm_response"] = response.Data.get("final_llm_response")
-                        result.Data["llm_responses_arr"].append(response.Data.get("final_llm_response"))
-
-                        if response.Data.get("output_type") == "text":
-                            result.Data["messages"].extend(response.Data.get("messages", []))
-                            result.Data["output_type"] = response.Data.get("output_type", "")
-                            result.Error = response.Error
-                            result.Status = response.Status
-
-                            for message in response.Data.get("messages", []):
-                                if streaming_callback and streaming_callback.get("is_stream"):
-                                    await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                        "Data": message,
-                                        "Error": None,
-                                        "Status": True,
-                                        "StreamingStatus": "IN-PROGRESS",
-                                        "Action": "MESSAGE"
-                                    }))
-                            return result
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": "Tool Calls Started",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        for tool in response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("tool_calls", []):
-                            tool_name = tool.get("function", {}).get("name")
-                            args = json.loads(tool.get("function", {}).get("arguments", "{}"))
-
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": f"{selected_server} MCP server {tool_name} call initiated",
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "NOTIFICATION"
-                                }))
-
-                            tool_call_result = await call_and_execute_tool(selected_server, selected_server_credentials, tool_name, args)
-
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": f"{selected_server} MCP server {tool_name} call result  : {json.dumps(tool_call_result)}",
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "NOTIFICATION"
-                                }))
-
-                            result.Data["executed_tool_calls"].append({
-                                "id": tool.get("id"),
-                                "name": tool_name,
-                                "arguments": args,
-                                "result": tool_call_result,
-                            })
-
-                            tool_call_content_data = f"Executed tool: {tool_name} and the result is: {json.dumps(tool_call_result)}"
-                            client_details["chat_history"].append({
-                                "role": "assistant",
-                                "content": tool_call_content_data,
-                            })
-        
-        elif selected_client == "MCP_CLIENT_OPENAI":
-
-            # Initial LLM call
-            initial_llm_response = await openai_processor(client_details)
-            if not initial_llm_response.Status:
-                result.Error = initial_llm_response.Error
-                result.Status = initial_llm_response.Status
-                return result
-            extracted_result = extract_data_from_response(initial_llm_response.Data.get("messages", [{}])[0] if initial_llm_response.Data else "")
-            
-            result.Data["total_llm_calls"] += 1
-            result.Data["total_tokens"] += initial_llm_response.Data.get("total_tokens", 0)
-            result.Data["total_input_tokens"] += initial_llm_response.Data.get("total_input_tokens", 0)
-            result.Data["total_output_tokens"] += initial_llm_response.Data.get("total_output_tokens", 0)
-            result.Data["final_llm_response"] = initial_llm_response.Data.get("final_llm_response")
-            result.Data["llm_responses_arr"].append(initial_llm_response.Data.get("final_llm_response"))
-
-            if streaming_callback and streaming_callback.get("is_stream"):
-                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                    "Data": "Optimized Token LLM call Successfully Completed",
-                    "Error": None,
-                    "Status": True,
-                    "StreamingStatus": "IN-PROGRESS",
-                    "Action": "NOTIFICATION"
-                }))
-            
-            if extracted_result["isFunctionCall"]:
-                final_tool_calls = []
-                selected_tools = extracted_result["selectedTools"]
-                parsed_tools = json.loads(temp_tools)
-
-                for tool_name in selected_tools:
-                    matching_tool = next((t for t in parsed_tools if t.get("function", {}).get("name") == tool_name), None)
-                    if matching_tool:
-                        final_tool_calls.append(matching_tool)
-
-                client_details["prompt"] = temp_prompt
-                client_details["tools"] = final_tool_calls
-                
-
-                # Loop to handle multiple LLM calls and tool executions
-                while True:
-                    response = await openai_processor(client_details)
-                    if not response.Status:
-                        result.Error = response.Error
-                        result.Status = response.Status
-                        return result
-
-                    result.Data["total_llm_calls"] += 1
-                    result.Data["total_tokens"] += response.Data.get("total_tokens", 0)
-                    result.Data["total_input_tokens"] += response.Data.get("total_input_tokens", 0)
-                    result.Data["total_output_tokens"] += response.Data.get("total_output_tokens", 0)
-                    result.Data["final_llm_response"] = response.Data.get("final_llm_response")
-                    result.Data["llm_responses_arr"].append(response.Data.get("final_llm_response"))
-
-                    if response.Data.get("output_type") == "text":
-                        result.Data["messages"].extend(response.Data.get("messages", []))
-                        result.Data["output_type"] = response.Data.get("output_type", "")
-                        result.Error = response.Error
-                        result.Status = response.Status
-
-                        for message in response.Data.get("messages", []):
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": message,
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "MESSAGE"
-                                }))
-                        return result
-
-                    if streaming_callback and streaming_callback.get("is_stream"):
-                        await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                            "Data": "Tool Calls Started",
-                            "Error": None,
-                            "Status": True,
-                            "StreamingStatus": "IN-PROGRESS",
-                            "Action": "NOTIFICATION"
-                        }))
-
-                    for tool in response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("tool_calls", []):
-                        
-                        tool_name = tool.get("function", {}).get("name")
-                        args = json.loads(tool.get("function", {}).get("arguments", "{}"))
-
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": f"{selected_server} MCP server {tool_name} call initiated",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        tool_call_result = await call_and_execute_tool(selected_server, selected_server_credentials, tool_name, args)
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": f"{selected_server} MCP server {tool_name} call result  : {json.dumps(tool_call_result)}",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        result.Data["executed_tool_calls"].append({
-                            "id": tool.get("id"),
-                            "name": tool_name,
-                            "arguments": args,
-                            "result": tool_call_result,
-                        })
-
-                        tool_call_content_data = f"Executed tool: {tool_name} and the result is: {json.dumps(tool_call_result)}"
-                        client_details["chat_history"].append({
-                            "role": "assistant",
-                            "content": tool_call_content_data,
-                        })
-
-            else:
-                # No function call, normal response case
-                client_details["prompt"] = f"{temp_prompt}. Available tools: {json.dumps(tool_call_details_arr)}"
-                client_details["tools"] = []
-
-                normal_response = await openai_processor(client_details)
-                result.Data["total_llm_calls"] += 1
-                result.Data["total_tokens"] += normal_response.Data.get("total_tokens", 0)
-                result.Data["total_input_tokens"] += normal_response.Data.get("total_input_tokens", 0)
-                result.Data["total_output_tokens"] += normal_response.Data.get("total_output_tokens", 0)
-                result.Data["final_llm_response"] = normal_response.Data.get("final_llm_response")
-                result.Data["llm_responses_arr"].append(normal_response.Data.get("final_llm_response"))
-
-                result.Data["output_type"] = normal_response.Data.get("output_type", "")
-                result.Error = normal_response.Error
-                result.Status = normal_response.Status
-
-                content = normal_response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("content")
-                if not normal_response.Status or (content is not None and content != ""):
-                    result.Data["messages"] = normal_response.Data.get("messages", [])
-                    for message in normal_response.Data.get("messages", []):
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": message,
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "MESSAGE"
-                            }))
-                    return result
-
-                if len(normal_response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("tool_calls", [])) > 0:
-                    # Repeat the tool calling loop as in the TS code
-                    final_tool_calls = []
-                    selected_tools = extracted_result["selectedTools"]
-                    parsed_tools = json.loads(temp_tools)
-                    for tool_name in selected_tools:
-                        matching_tool = next((t for t in parsed_tools if t.get("function", {}).get("name") == tool_name), None)
-                        if matching_tool:
-                            final_tool_calls.append(matching_tool)
-
-                    client_details["prompt"] = temp_prompt
-                    client_details["tools"] = final_tool_calls
-
-                    while True:
-                        response = await openai_processor(client_details)
-                        if not response.Status:
-                            result.Error = response.Error
-                            result.Status = response.Status
-                            return result
-
-                        result.Data["total_llm_calls"] += 1
-                        result.Data["total_tokens"] += response.Data.get("total_tokens", 0)
-                        result.Data["total_input_tokens"] += response.Data.get("total_input_tokens", 0)
-                        result.Data["total_output_tokens"] += response.Data.get("total_output_tokens", 0)
-                        result.Data["final_llm_response"] = response.Data.get("final_llm_response")
-                        result.Data["llm_responses_arr"].append(response.Data.get("final_llm_response"))
-
-                        if response.Data.get("output_type") == "text":
-                            result.Data["messages"].extend(response.Data.get("messages", []))
-                            result.Data["output_type"] = response.Data.get("output_type", "")
-                            result.Error = response.Error
-                            result.Status = response.Status
-
-                            for message in response.Data.get("messages", []):
-                                if streaming_callback and streaming_callback.get("is_stream"):
-                                    await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                        "Data": message,
-                                        "Error": None,
-                                        "Status": True,
-                                        "StreamingStatus": "IN-PROGRESS",
-                                        "Action": "MESSAGE"
-                                    }))
-                            return result
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": "Tool Calls Started",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        for tool in response.Data.get("final_llm_response", {}).get("choices", [{}])[0].get("message", {}).get("tool_calls", []):
-                            tool_name = tool.get("function", {}).get("name")
-                            args = json.loads(tool.get("function", {}).get("arguments", "{}"))
-
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": f"{selected_server} MCP server {tool_name} call initiated",
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "NOTIFICATION"
-                                }))
-
-                            tool_call_result = await call_and_execute_tool(selected_server, selected_server_credentials, tool_name, args)
-
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": f"{selected_server} MCP server {tool_name} call result  : {json.dumps(tool_call_result)}",
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "NOTIFICATION"
-                                }))
-
-                            result.Data["executed_tool_calls"].append({
-                                "id": tool.get("id"),
-                                "name": tool_name,
-                                "arguments": args,
-                                "result": tool_call_result,
-                            })
-
-                            tool_call_content_data = f"Executed tool: {tool_name} and the result is: {json.dumps(tool_call_result)}"
-                            client_details["chat_history"].append({
-                                "role": "assistant",
-                                "content": tool_call_content_data,
-                            })
-        
-        elif selected_client == "MCP_CLIENT_GEMINI":
-
-            # Initial LLM call
-            initial_llm_response = await gemini_processor(client_details)
-            print("Initial LLM response:", initial_llm_response)
-            if not initial_llm_response.Status:
-                result.Error = initial_llm_response.Error
-                result.Status = initial_llm_response.Status
-                return result
-            extracted_result = extract_data_from_response(initial_llm_response.Data.get("messages", [{}])[0] if initial_llm_response.Data else "")
-            
-            result.Data["total_llm_calls"] += 1
-            result.Data["total_tokens"] += initial_llm_response.Data.get("total_tokens", 0)
-            result.Data["total_input_tokens"] += initial_llm_response.Data.get("total_input_tokens", 0)
-            result.Data["total_output_tokens"] += initial_llm_response.Data.get("total_output_tokens", 0)
-            result.Data["final_llm_response"] = initial_llm_response.Data.get("final_llm_response")
-            result.Data["llm_responses_arr"].append(initial_llm_response.Data.get("final_llm_response"))
-
-            if streaming_callback and streaming_callback.get("is_stream"):
-                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                    "Data": "Optimized Token LLM call Successfully Completed",
-                    "Error": None,
-                    "Status": True,
-                    "StreamingStatus": "IN-PROGRESS",
-                    "Action": "NOTIFICATION"
-                }))
-            
-            if extracted_result["isFunctionCall"]:
-                final_tool_calls = []
-                selected_tools = extracted_result["selectedTools"]
-                parsed_tools = json.loads(temp_tools)
-
-                for tool_name in selected_tools:
-                    matching_tool = next((t for t in parsed_tools if t.get("function", {}).get("name") == tool_name), None)
-                    if matching_tool:
-                        final_tool_calls.append(matching_tool)
-
-                client_details["prompt"] = temp_prompt
-                client_details["tools"] = final_tool_calls
-             
-
-                # Loop to handle multiple LLM calls and tool executions
-                count=1
-                while True:
-                    if count==3:
-                        result.Error = "Maximum LLM calls went into halucination"
-                        result.Status = response.Status
-                        return result
-                    
-                    if count != 1:
-                         client_details["tools"] = []
-                    
-                    response = await gemini_processor(client_details)
-                    print(response)
-                    if not response.Status:
-                        result.Error = response.Error
-                        result.Status = response.Status
-                        return result
-
-                    result.Data["total_llm_calls"] += 1
-                    result.Data["total_tokens"] += response.Data.get("total_tokens", 0)
-                    result.Data["total_input_tokens"] += response.Data.get("total_input_tokens", 0)
-                    result.Data["total_output_tokens"] += response.Data.get("total_output_tokens", 0)
-                    result.Data["final_llm_response"] = response.Data.get("final_llm_response")
-                    result.Data["llm_responses_arr"].append(response.Data.get("final_llm_response"))
-
-                    if response.Data.get("output_type") == "text":
-                        result.Data["messages"].extend(response.Data.get("messages", []))
-                        result.Data["output_type"] = response.Data.get("output_type", "")
-                        result.Error = response.Error
-                        result.Status = response.Status
-
-                        for message in response.Data.get("messages", []):
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": message,
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "MESSAGE"
-                                }))
-                        return result
-
-                    if streaming_callback and streaming_callback.get("is_stream"):
-                        await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                            "Data": "Tool Calls Started",
-                            "Error": None,
-                            "Status": True,
-                            "StreamingStatus": "IN-PROGRESS",
-                            "Action": "NOTIFICATION"
-                        }))
-
-                    final_llm_response = response.Data.get("final_llm_response") if response.Data else None
-                    candidates = final_llm_response.get("candidates", []) if final_llm_response else []
-                    first_candidate = candidates[0] if candidates and len(candidates) > 0 else {}
-                    content = first_candidate.get("content", {}) if isinstance(first_candidate, dict) else {}
-                    parts = content.get("parts", []) if isinstance(content, dict) else []
-
-                    for tool in parts:
-
-                        tool_name = tool.get("functionCall", {}).get("name")
-                        args_raw = tool.get("functionCall", {}).get("args", {})
-
-                        if isinstance(args_raw, str):
-                            try:
-                                 args = json.loads(args_raw)
-                            except json.JSONDecodeError as e:
-                                 args = {}
-                        else:
-                            args = args_raw
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": f"{selected_server} MCP server {tool_name} call initiated",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        tool_call_result = await call_and_execute_tool(selected_server, selected_server_credentials, tool_name, args)
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": f"{selected_server} MCP server {tool_name} call result  : {json.dumps(tool_call_result)}",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-
-                        result.Data["executed_tool_calls"].append({
-                            "id": tool.get("id"),
-                            "name": tool_name,
-                            "arguments": args,
-                            "result": tool_call_result,
-                        })
-
-                        tool_call_content_data = f"Executed tool: {tool_name} and the result is: {json.dumps(tool_call_result)}"
-                        client_details["chat_history"].append({
-                            "role": "model",
-                            "content": tool_call_content_data,
-                        })
-
-                    count+=1
-            else:
-                # No function call, normal response case
-                client_details["prompt"] = f"{temp_prompt}. Available tools: {json.dumps(tool_call_details_arr)}"
-                client_details["tools"] = []
-
-                normal_response = await gemini_processor(client_details)
-                result.Data["total_llm_calls"] += 1
-                result.Data["total_tokens"] += normal_response.Data.get("total_tokens", 0)
-                result.Data["total_input_tokens"] += normal_response.Data.get("total_input_tokens", 0)
-                result.Data["total_output_tokens"] += normal_response.Data.get("total_output_tokens", 0)
-                result.Data["final_llm_response"] = normal_response.Data.get("final_llm_response")
-                result.Data["llm_responses_arr"].append(normal_response.Data.get("final_llm_response"))
-
-                result.Data["output_type"] = normal_response.Data.get("output_type", "")
-                result.Error = normal_response.Error
-                result.Status = normal_response.Status
-
-                final_llm_response = normal_response.Data.get("final_llm_response") if normal_response.Data else None
-                candidates = final_llm_response.get("candidates", []) if final_llm_response else []
-                first_candidate = candidates[0] if candidates and len(candidates) > 0 else {}
-                content = first_candidate.get("content", {}) if isinstance(first_candidate, dict) else {}
-                parts = content.get("parts", []) if isinstance(content, dict) else []
-
-                text_content = content.get("text")
-
-                if not normal_response.Status or (text_content is not None and text_content != ""):
-                    result.Data["messages"] = normal_response.Data.get("messages", [])
-                    for message in normal_response.Data.get("messages", []):
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": message,
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "MESSAGE"
-                            }))
-                    return result
-
-                if len(parts) > 0:
-                    # Repeat the tool calling loop as in the TS code
-                    final_tool_calls = []
-                    selected_tools = extracted_result["selectedTools"]
-                    parsed_tools = json.loads(temp_tools)
-                    for tool_name in selected_tools:
-                        matching_tool = next((t for t in parsed_tools if t.get("function", {}).get("name") == tool_name), None)
-                        if matching_tool:
-                            final_tool_calls.append(matching_tool)
-
-                    client_details["prompt"] = temp_prompt
-                    client_details["tools"] = final_tool_calls
-
-                    count=1
-                    while True:
-                        if count==3:
-                            result.Error = "Maximum LLM calls went into halucination"
-                            result.Status = False
-                            return result
-                    
-                        if count != 1:
-                            client_details["tools"] = []
-
-                        response = await gemini_processor(client_details)
-                        if not response.Status:
-                            result.Error = response.Error
-                            result.Status = response.Status
-                            return result
-
-                        result.Data["total_llm_calls"] += 1
-                        result.Data["total_tokens"] += response.Data.get("total_tokens", 0)
-                        result.Data["total_input_tokens"] += response.Data.get("total_input_tokens", 0)
-                        result.Data["total_output_tokens"] += response.Data.get("total_output_tokens", 0)
-                        result.Data["final_llm_response"] = response.Data.get("final_llm_response")
-                        result.Data["llm_responses_arr"].append(response.Data.get("final_llm_response"))
-
-                        if response.Data.get("output_type") == "text":
-                            result.Data["messages"].extend(response.Data.get("messages", []))
-                            result.Data["output_type"] = response.Data.get("output_type", "")
-                            result.Error = response.Error
-                            result.Status = response.Status
-
-                            for message in response.Data.get("messages", []):
-                                if streaming_callback and streaming_callback.get("is_stream"):
-                                    await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                        "Data": message,
-                                        "Error": None,
-                                        "Status": True,
-                                        "StreamingStatus": "IN-PROGRESS",
-                                        "Action": "MESSAGE"
-                                    }))
-                            return result
-
-                        if streaming_callback and streaming_callback.get("is_stream"):
-                            await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                "Data": "Tool Calls Started",
-                                "Error": None,
-                                "Status": True,
-                                "StreamingStatus": "IN-PROGRESS",
-                                "Action": "NOTIFICATION"
-                            }))
-
-                        final_llm_response = response.Data.get("final_llm_response") if response.Data else None
-                        candidates = final_llm_response.get("candidates", []) if final_llm_response else []
-                        first_candidate = candidates[0] if candidates and len(candidates) > 0 else {}
-                        content = first_candidate.get("content", {}) if isinstance(first_candidate, dict) else {}
-                        parts = content.get("parts", []) if isinstance(content, dict) else []
-
-                        for tool in parts:
-
-                            tool_name = tool.get("functionCall", {}).get("name")
-                            args_raw = tool.get("functionCall", {}).get("args", {})
-
-                            if isinstance(args_raw, str):
-                                try:
-                                    args = json.loads(args_raw)
-                                except json.JSONDecodeError as e:
-                                    args = {}
-                            else:
-                                args = args_raw
-
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": f"{selected_server} MCP server {tool_name} call initiated",
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "NOTIFICATION"
-                                }))
-
-                            tool_call_result = await call_and_execute_tool(selected_server, selected_server_credentials, tool_name, args)
-
-                            if streaming_callback and streaming_callback.get("is_stream"):
-                                await streaming_callback["streamCallbacks"].on_data(json.dumps({
-                                    "Data": f"{selected_server} MCP server {tool_name} call result  : {json.dumps(tool_call_result)}",
-                                    "Error": None,
-                                    "Status": True,
-                                    "StreamingStatus": "IN-PROGRESS",
-                                    "Action": "NOTIFICATION"
-                                }))
-
-
-                            result.Data["executed_tool_calls"].append({
-                                "id": tool.get("id"),
-                                "name": tool_name,
-                                "arguments": args,
-                                "result": tool_call_result,
-                            })
-
-                            tool_call_content_data = f"Executed tool: {tool_name} and the result is: {json.dumps(tool_call_result)}"
-                            client_details["chat_history"].append({
-                                "role": "model",
-                                "content": tool_call_content_data,
-                            })
-
-                        count+=1    
+        # Initial LLM call
+        router_start_time = time.perf_counter()
+        # Under the same deadline as the loop, rate limit waits and retries count against it
+        budget.check(result.Data)
+        initial_llm_response = await budget.run(provider.complete(client_details))
+        if not initial_llm_response.Status:
+            result.Error = initial_llm_response.Error
+            result.Status = initial_llm_response.Status
+            return result
+        extracted_result = extract_data_from_response(initial_llm_response.Data.get("messages", [{}])[0] if initial_llm_response.Data else "")
+        record_llm_response(result, provider, initial_llm_response)
+        record_routing_sample(selected_server, input_content, json.loads(temp_tools), extracted_result, time.perf_counter() - router_start_time)
+
+        await send_stream_event(streaming_callback, "Optimized Token LLM call Successfully Completed", "NOTIFICATION")
+
+    if extracted_result["isFunctionCall"]:
+        client_details["prompt"] = temp_prompt
+        client_details["tools"] = select_tools(json.loads(temp_tools), extracted_result["selectedTools"])
+        return await run_tool_loop(result, provider, client_details, selected_server, selected_server_credentials, history, budget, streaming_callback)
+
+    # No function call, normal response case
+    client_details["prompt"] = f"{temp_prompt}. Available tools: {json.dumps(tool_call_details_arr)}"
+    client_details["tools"] = []
+
+    budget.check(result.Data)
+    normal_response = await budget.run(provider.complete(client_details, stream_text_deltas(streaming_callback)))
+    if not normal_response.Status:
+        result.Error = normal_response.Error
+        result.Status = normal_response.Status
+        return result
 
-        result.Status = True
+    record_llm_response(result, provider, normal_response)
+    result.Data["output_type"] = normal_response.Data.get("output_type", "")
+    result.Error = normal_response.Error
+    result.Status = normal_response.Status
+
+    content = provider.text_content(normal_response)
+    if content is not None and content != "":
+        result.Data["messages"] = normal_response.Data.get("messages", [])
+        for message in normal_response.Data.get("messages", []):
+            await send_stream_event(streaming_callback, message, "MESSAGE")
         return result
 
-    except Exception as e:
-        logging.error(f"Exception in client_and_server_execution: {e}")
-        res = ClientAndServerExecutionResponse()
-        res.Error = str(e)
-        res.Status = False
-        return res
+    if len(provider.parse_tool_calls(normal_response)) > 0:
+        # Repeat the tool calling loop as in the TS code
+        client_details["prompt"] = temp_prompt
+        client_details["tools"] = select_tools(json.loads(temp_tools), extracted_result["selectedTools"])
+        return await run_tool_loop(result, provider, client_details, selected_server, selected_server_credentials, history, budget, streaming_callback)
+
+    result.Status = True
+    return result
+
+
+async def run_tool_loop(
+    result: ClientAndServerExecutionResponse,
+    provider: LlmProvider,
+    client_details: Dict[str, Any],
+    selected_server: str,
+    credentials: Any,
+    history: HistoryManager,
+    budget: ExecutionBudget,
+    streaming_callback: Optional[Any] = None
+) -> ClientAndServerExecutionResponse:
+    """Provider-agnostic loop: call the LLM, execute its tool calls, repeat until it answers with text."""
+    loop_llm_calls = 0
+    while True:
+        if provider.max_tool_loop_calls is not None and loop_llm_calls >= provider.max_tool_loop_calls:
+            result.Error = "Maximum LLM calls went into halucination"
+            result.Status = False
+            return result
+
+        if provider.tools_on_first_call_only and loop_llm_calls > 0:
+            client_details["tools"] = []
+
+        budget.check(result.Data)
+        history.compact(client_details["chat_history"])
+        response = await budget.run(provider.complete(client_details, stream_text_deltas(streaming_callback)))
+        loop_llm_calls += 1
+        if not response.Status:
+            result.Error = response.Error
+            result.Status = response.Status
+            return result
+
+        record_llm_response(result, provider, response)
+
+        if response.Data.get("output_type") == "text":
+            result.Data["messages"].extend(response.Data.get("messages", []))
+            result.Data["output_type"] = response.Data.get("output_type", "")
+            result.Error = response.Error
+            result.Status = response.Status
+
+            for message in response.Data.get("messages", []):
+                await send_stream_event(streaming_callback, message, "MESSAGE")
+            return result
+
+        await send_stream_event(streaming_callback, "Tool Calls Started", "NOTIFICATION")
+
+        tool_calls = provider.parse_tool_calls(response)
+        await budget.run(execute_tool_calls(result, client_details, tool_calls, selected_server, credentials, provider.tool_result_role, history, streaming_callback))
+
+
+def record_llm_response(result: ClientAndServerExecutionResponse, provider: LlmProvider, response: LlmResponseStruct) -> None:
+    """Add the usage of one LLM call to the running totals."""
+    usage = provider.usage(response)
+    result.Data["total_llm_calls"] += 1
+    result.Data["total_tokens"] += usage["total_tokens"]
+    result.Data["total_input_tokens"] += usage["total_input_tokens"]
+    result.Data["total_output_tokens"] += usage["total_output_tokens"]
+    result.Data["final_llm_response"] = response.Data.get("final_llm_response")
+    result.Data["llm_responses_arr"].append(response.Data.get("final_llm_response"))
+
+
+def select_tools(parsed_tools: List[Dict[str, Any]], selected_tools: List[str]) -> List[Dict[str, Any]]:
+    """Pick the router-selected tools from the full tool list, keeping the router's order."""
+    final_tool_calls = []
+    for tool_name in selected_tools:
+        matching_tool = next((t for t in parsed_tools if t.get("function", {}).get("name") == tool_name), None)
+        if matching_tool:
+            final_tool_calls.append(matching_tool)
+    return final_tool_calls
+
+
+async def send_stream_event(streaming_callback: Optional[Any], data: Any, action: str, streaming_status: str = "IN-PROGRESS") -> None:
+    if streaming_callback and streaming_callback.get("is_stream"):
+        await streaming_callback["streamCallbacks"].on_data(json.dumps({
+            "Data": data,
+            "Error": None,
+            "Status": True,
+            "StreamingStatus": streaming_status,
+            "Action": action
+        }))
+
+
+def stream_text_deltas(streaming_callback: Optional[Any]) -> Optional[Any]:
+    """Text delta callback for provider.complete, forwarding each delta as a MESSAGE-DELTA event on streamed requests"""
+    if not (streaming_callback and streaming_callback.get("is_stream")):
+        return None
+
+    async def on_text(delta: str) -> None:
+        await send_stream_event(streaming_callback, delta, "MESSAGE-DELTA")
+    return on_text
 
 
 def extract_data_from_response(message: Any) -> Dict[str, Any]:
@@ -890,6 +307,47 @@ def extract_data_from_response(message: Any) -> Dict[str, Any]:
     }
 
 
+async def execute_tool_calls(
+    result: ClientAndServerExecutionResponse,
+    client_details: Dict[str, Any],
+    tool_calls: List[Dict[str, Any]],
+    selected_server: str,
+    credentials: Any,
+    history_role: str,
+    history: HistoryManager,
+    streaming_callback: Optional[Any] = None
+) -> None:
+    """Run the tool calls of one LLM turn concurrently, bounded by the per-request fan-out limit,
+       then record the results in the original call order."""
+    max_parallel = client_details.get("max_parallel_tool_calls", ExecutionConfig.get("max_parallel_tool_calls", 5))
+    semaphore = asyncio.Semaphore(max(1, int(max_parallel)))
+
+    async def run_tool_call(tool_call: Dict[str, Any]) -> Any:
+        async with semaphore:
+            await send_stream_event(streaming_callback, f"{selected_server} MCP server {tool_call['name']} call initiated", "NOTIFICATION")
+            tool_call_result = await call_and_execute_tool(selected_server, credentials, tool_call["name"], tool_call["arguments"])
+            await send_stream_event(streaming_callback, f"{selected_server} MCP server {tool_call['name']} call result  : {json.dumps(tool_call_result)}", "NOTIFICATION")
+            return tool_call_result
+
+    tool_call_results = await asyncio.gather(*(run_tool_call(tool_call) for tool_call in tool_calls))
+
+    for tool_call, tool_call_result in zip(tool_calls, tool_call_results):
+        # Large results are truncated in the history, the full result stays in executed_tool_calls
+        tool_call_content = history.tool_result_content(tool_call["name"], tool_call_result)
+        result.Data["executed_tool_calls"].append({
+            "id": tool_call["id"],
+            "name": tool_call["name"],
+            "arguments": tool_call["arguments"],
+            "result": tool_call_result,
+            "truncated_in_history": tool_call_content["truncated"],
+        })
+
+        client_details["chat_history"].append({
+            "role": history_role,
+            "content": tool_call_content["content"],
+        })
+
+
 async def call_and_execute_tool(
     selected_server: str,
     credentials: Any,
@@ -898,7 +356,7 @@ async def call_and_execute_tool(
 ) -> Any:
     """Call the MCP client tool with args and credentials, with JS-style try/catch
        and JSON-serializable output fallback."""
-    if selected_server not in MCPServers:
+    if not await ensure_mcp_server(selected_server):
         raise ValueError(f"Server {selected_server} not found in MCPServers")
     
     # pull per-server creds, defaulting to {}
@@ -1,6 +1,7 @@
 from typing import Dict, Any, Callable, Optional
 
-from src.server_connection import MCPServers
+from src.server_connection import MCPServers, ensure_mcp_server
+from src.tool_catalog import MCPToolCatalog
 from src.client_and_server_config import ServersConfig, ClientsConfig
 
 
@@ -20,7 +21,7 @@ async def client_and_server_validation(payload: Dict[str, Any], streaming_callba
             }
 
         for server in selected_servers:
-            if server not in MCPServers:
+            if not await ensure_mcp_server(server):
                 print("Invalid Server")
                 return {
                     "payload": None,
@@ -38,23 +39,7 @@ async def client_and_server_validation(payload: Dict[str, Any], streaming_callba
 
         tools_arr = []
         for server in selected_servers:
-   
-            resource = await MCPServers[server].list_tools()
-            if resource:
-                for tool in resource.tools:
-                    tool_dict = {
-                        "type": "function",
-                        "function": {
-                            "name": tool.name,
-                            "description": getattr(tool, "description", f"Tool for {tool.name}"),
-                            "parameters": getattr(tool, "inputSchema", {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            })
-                        }
-                    }
-                    tools_arr.append(tool_dict)
+            tools_arr.extend(await MCPToolCatalog.get_tools(server, MCPServers[server]))
 
         client_details["tools"] = tools_arr
 
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional, Awaitable
+
+from src.client_and_server_config import ExecutionConfig
+
+BUDGET_LIMITS = ["max_llm_calls", "max_execution_seconds", "max_input_tokens", "max_output_tokens"]
+
+
+class ExecutionLimitReached(Exception):
+    """Raised inside the agent loop when one of the per-request limits is hit"""
+
+    def __init__(self, limit: str, value: Any):
+        super().__init__(f"Execution limit reached: {limit} ({value})")
+        self.limit = limit
+        self.value = value
+
+
+class ExecutionBudget:
+    """Per-request ceilings on LLM calls, wall-clock time and cumulative tokens"""
+
+    def __init__(self, client_details: Optional[Dict[str, Any]] = None):
+        client_details = client_details or {}
+        self.limits = {limit: client_details.get(limit, ExecutionConfig.get(limit)) for limit in BUDGET_LIMITS}
+        self.start_time = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.limits["max_execution_seconds"] is None:
+            return None
+        return self.limits["max_execution_seconds"] - self.elapsed()
+
+    def check(self, data: Dict[str, Any]):
+        """Raise before the next LLM call if any budget is already spent"""
+        if self.limits["max_llm_calls"] is not None and data["total_llm_calls"] >= self.limits["max_llm_calls"]:
+            raise ExecutionLimitReached("max_llm_calls", self.limits["max_llm_calls"])
+        remaining = self.remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            raise ExecutionLimitReached("max_execution_seconds", self.limits["max_execution_seconds"])
+        if self.limits["max_input_tokens"] is not None and data["total_input_tokens"] >= self.limits["max_input_tokens"]:
+            raise ExecutionLimitReached("max_input_tokens", self.limits["max_input_tokens"])
+        if self.limits["max_output_tokens"] is not None and data["total_output_tokens"] >= self.limits["max_output_tokens"]:
+            raise ExecutionLimitReached("max_output_tokens", self.limits["max_output_tokens"])
+
+    async def run(self, awaitable: Awaitable) -> Any:
+        """Await an LLM or tool step, cut short at the request deadline"""
+        remaining = self.remaining_seconds()
+        if remaining is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, timeout=max(0.0, remaining))
+        except asyncio.TimeoutError:
+            raise ExecutionLimitReached("max_execution_seconds", self.limits["max_execution_seconds"])
+
+    def usage(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "max_llm_calls": data["total_llm_calls"],
+            "max_execution_seconds": self.elapsed(),
+            "max_input_tokens": data["total_input_tokens"],
+            "max_output_tokens": data["total_output_tokens"]
+        }
@@ -0,0 +1,167 @@
+import multiprocessing
+import signal
+import socket
+import time
+from typing import Any, Callable, List, Optional
+
+# Seconds between checks for dead workers and pending signals
+SUPERVISE_INTERVAL = 1.0
+
+# Delay before a crashed worker is started again, doubled per consecutive crash
+RESPAWN_INITIAL_BACKOFF = 1.0
+RESPAWN_MAX_BACKOFF = 60.0
+
+# A worker that ran this long before dying starts a new crash count
+WORKER_STABLE_SECONDS = 60
+
+# Consecutive crashes after which a worker slot is given up
+MAX_CONSECUTIVE_CRASHES = 5
+
+
+def reuse_port_socket(bind: str) -> socket.socket:
+    """Bind a TCP socket with SO_REUSEPORT, so every worker listens on the same port and the kernel spreads connections"""
+    host, port = bind.replace("[", "").replace("]", "").rsplit(":", 1)
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind((host, int(port)))
+    return sock
+
+
+class GatewayWorker:
+    """One worker process with its readiness and shutdown events"""
+
+    def __init__(self, worker_id: int, process: Any, ready: Any, shutdown: Any):
+        self.worker_id = worker_id
+        self.process = process
+        self.ready = ready
+        self.shutdown = shutdown
+        self.started_at = time.time()
+
+
+class GatewayWorkerSupervisor:
+    """
+    Pre-fork launcher for the gateway. Every worker is a separate interpreter with its own event loop,
+    MCP server pool and LLM http clients, listening on the shared port through SO_REUSEPORT.
+
+    SIGHUP restarts the workers one at a time: a replacement is started and must report ready before the
+    old worker is asked to stop, so the port always has a listener. SIGINT and SIGTERM stop every worker,
+    giving in-flight requests graceful_timeout seconds. A worker that dies is started again after an
+    exponential backoff, and its slot is given up after MAX_CONSECUTIVE_CRASHES crashes in a row.
+    """
+
+    def __init__(self, target: Callable, workers: int, start_timeout: float, graceful_timeout: float, target_args: tuple = ()):
+        self.target = target
+        self.target_args = target_args
+        self.workers = workers
+        self.start_timeout = start_timeout
+        self.graceful_timeout = graceful_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.slots: List[Optional[GatewayWorker]] = [None] * workers
+        self.crashes = [0] * workers
+        # Monotonic time at which an empty slot gets a new worker, None for a slot given up
+        self.respawn_at: List[Optional[float]] = [None] * workers
+        self.restart_requested = False
+        self.stop_requested = False
+
+    def _spawn(self, worker_id: int) -> GatewayWorker:
+        ready = self.context.Event()
+        shutdown = self.context.Event()
+        process = self.context.Process(target=self.target, args=(worker_id, ready, shutdown) + self.target_args, name=f"gateway-worker-{worker_id}")
+        process.start()
+        print(f"Started gateway worker {worker_id} (pid {process.pid})")
+        return GatewayWorker(worker_id, process, ready, shutdown)
+
+    def _wait_ready(self, worker: GatewayWorker) -> bool:
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if worker.ready.wait(timeout=0.5):
+                return True
+            if not worker.process.is_alive():
+                return False
+        return False
+
+    def _stop(self, worker: GatewayWorker):
+        worker.shutdown.set()
+        # Hypercorn drains in-flight requests for graceful_timeout, then the MCP servers are closed
+        worker.process.join(self.graceful_timeout + 30)
+        if worker.process.is_alive():
+            print(f"Gateway worker {worker.worker_id} (pid {worker.process.pid}) did not stop, terminating")
+            worker.process.terminate()
+            worker.process.join(5)
+
+    def rolling_restart(self):
+        print("Rolling restart of gateway workers")
+        for worker_id, old_worker in enumerate(self.slots):
+            if self.stop_requested:
+                return
+            new_worker = self._spawn(worker_id)
+            if not self._wait_ready(new_worker):
+                print(f"Error restarting gateway worker {worker_id} =========>>>> replacement not ready, keeping the old worker")
+                self._stop(new_worker)
+                continue
+            self.slots[worker_id] = new_worker
+            self.crashes[worker_id] = 0
+            self.respawn_at[worker_id] = None
+            if old_worker is not None:
+                self._stop(old_worker)
+
+    def _replace_dead_workers(self):
+        now = time.monotonic()
+        for worker_id, worker in enumerate(self.slots):
+            if worker is None:
+                if self.respawn_at[worker_id] is not None and now >= self.respawn_at[worker_id]:
+                    self.respawn_at[worker_id] = None
+                    self.slots[worker_id] = self._spawn(worker_id)
+                continue
+            if worker.process.is_alive():
+                continue
+
+            if time.time() - worker.started_at >= WORKER_STABLE_SECONDS:
+                self.crashes[worker_id] = 0
+            self.crashes[worker_id] += 1
+            self.slots[worker_id] = None
+            if self.crashes[worker_id] >= MAX_CONSECUTIVE_CRASHES:
+                print(f"Error in gateway worker {worker_id} =========>>>> exited {self.crashes[worker_id]} times in a row (code {worker.process.exitcode}), not starting it again")
+                continue
+            delay = min(RESPAWN_MAX_BACKOFF, RESPAWN_INITIAL_BACKOFF * 2 ** (self.crashes[worker_id] - 1))
+            self.respawn_at[worker_id] = now + delay
+            print(f"Gateway worker {worker_id} (pid {worker.process.pid}) exited with code {worker.process.exitcode}, starting it again in {delay:.1f}s")
+
+    def _all_given_up(self) -> bool:
+        return all(worker is None and respawn_at is None for worker, respawn_at in zip(self.slots, self.respawn_at))
+
+    def run(self) -> int:
+        def request_restart(*args: Any):
+            self.restart_requested = True
+
+        def request_stop(*args: Any):
+            self.stop_requested = True
+
+        # Workers start together, each one initializing its own MCP servers
+        for worker_id in range(self.workers):
+            self.slots[worker_id] = self._spawn(worker_id)
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, request_restart)
+
+        while not self.stop_requested:
+            time.sleep(SUPERVISE_INTERVAL)
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            self._replace_dead_workers()
+            if self._all_given_up():
+                print("Error in gateway supervisor =========>>>> every worker is crash looping, exiting")
+                return 1
+
+        print("Stopping gateway workers")
+        workers = [worker for worker in self.slots if worker is not None]
+        for worker in workers:
+            worker.shutdown.set()
+        for worker in workers:
+            self._stop(worker)
+        return 0
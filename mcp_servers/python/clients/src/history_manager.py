@@ -0,0 +1,74 @@
+import json
+from typing import Dict, Any, List, Optional
+
+from src.client_and_server_config import HistoryConfig
+from src.metrics import GatewayMetrics
+
+# Rough average for English text and JSON with BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: Any) -> int:
+    """Fast local token estimate, good enough for budgeting without a tokenizer round-trip"""
+    if not isinstance(text, str):
+        text = json.dumps(text)
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class HistoryManager:
+    """
+    Keeps the chat_history of one agent-loop request within a token budget.
+    Large tool results are truncated in the history (the response keeps them in full in
+    executed_tool_calls), and the oldest turns are dropped first when the budget is exceeded.
+    """
+
+    def __init__(self, client_details: Optional[Dict[str, Any]] = None):
+        client_details = client_details or {}
+        self.max_history_tokens = client_details.get("max_history_tokens", HistoryConfig.get("max_history_tokens", 8000))
+        self.max_tool_result_tokens = client_details.get("max_tool_result_tokens", HistoryConfig.get("max_tool_result_tokens", 1500))
+        self.keep_recent_messages = client_details.get("keep_recent_messages", HistoryConfig.get("keep_recent_messages", 4))
+
+    def tool_result_content(self, tool_name: str, tool_call_result: Any) -> Dict[str, Any]:
+        """
+        Build the chat_history content for a tool result.
+        Returns {"content", "truncated"}.
+        """
+        serialized = json.dumps(tool_call_result)
+        content = f"Executed tool: {tool_name} and the result is: {serialized}"
+        if estimate_tokens(content) <= self.max_tool_result_tokens:
+            return {"content": content, "truncated": False}
+
+        GatewayMetrics.inc("history_truncated_tool_results_total")
+
+        keep_chars = max(0, self.max_tool_result_tokens * CHARS_PER_TOKEN - 200)
+        content = (
+            f"Executed tool: {tool_name} and the result is: {serialized[:keep_chars]}"
+            f" ... [truncated, {len(serialized) - keep_chars} of {len(serialized)} characters omitted]"
+        )
+        return {"content": content, "truncated": True}
+
+    def compact(self, chat_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop the oldest messages in place until the history fits the budget"""
+        message_tokens = [estimate_tokens(message.get("content", "")) for message in chat_history]
+        total_tokens = sum(message_tokens)
+        if total_tokens <= self.max_history_tokens:
+            return chat_history
+
+        # The latest user input and the most recent turns are never dropped
+        protected = set(range(max(0, len(chat_history) - self.keep_recent_messages), len(chat_history)))
+        last_user_index = next((i for i in range(len(chat_history) - 1, -1, -1) if chat_history[i].get("role") == "user"), None)
+        if last_user_index is not None:
+            protected.add(last_user_index)
+
+        keep = [True] * len(chat_history)
+        for index in range(len(chat_history)):
+            if total_tokens <= self.max_history_tokens:
+                break
+            if index in protected:
+                continue
+            keep[index] = False
+            total_tokens -= message_tokens[index]
+            GatewayMetrics.inc("history_dropped_messages_total")
+
+        chat_history[:] = [message for index, message in enumerate(chat_history) if keep[index]]
+        return chat_history
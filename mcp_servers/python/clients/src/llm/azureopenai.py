@@ -1,8 +1,20 @@
-import requests
+import httpx
 import json
 from typing import Dict, List, Any, Optional, Union
 from dataclasses import dataclass, field, asdict
 
+from src.llm.http_client import get_llm_http_client
+from src.llm.rate_limiter import LlmRateLimits
+from src.llm.streaming import OnTextDelta, stream_chat_completion
+
+# Oldest Azure OpenAI api-version accepting stream_options, older versions reject the request with a 400
+STREAM_OPTIONS_MIN_API_VERSION = "2024-09-01"
+
+
+def supports_stream_usage(api_version: str) -> bool:
+    """Whether an api-version (e.g. "2024-10-21", "2025-01-01-preview") accepts stream_options.include_usage"""
+    return api_version[:10] >= STREAM_OPTIONS_MIN_API_VERSION
+
 @dataclass
 class ChatMessage:
     role: str
@@ -44,7 +56,7 @@ class AzureAndOpenAiChatCompletionParams:
     forced_tool_calls: Optional[Any] = None
     tool_choice: str = 'auto'
 
-async def azure_openai_processor(data: Dict[str, Any]) -> LlmResponseStruct:
+async def azure_openai_processor(data: Dict[str, Any], on_text: OnTextDelta = None) -> LlmResponseStruct:
     """ 
     Main Azure OpenAI Processor function
     """
@@ -92,24 +104,46 @@ async def azure_openai_processor(data: Dict[str, Any]) -> LlmResponseStruct:
             # "model": selected_model,
             "messages": messages_arr,
             "max_tokens": params.max_tokens,
-            "stream": False,
+            "stream": params.is_stream,
             "tools": params.tools,
             "tool_choice": params.tool_choice,
             "temperature": params.temperature,
         }
-        
+
         # print(f"payload: {payload}")
 
         # Send request
         endpoint = data.get('endpoint', '')
         deployment_id = data.get('deployment_id', '')
         api_version = data.get('api_version', '')
+        if params.is_stream and supports_stream_usage(api_version):
+            # Usage only comes with the stream when asked for, in a last chunk without choices
+            payload["stream_options"] = {"include_usage": True}
         url = f"{endpoint}/openai/deployments/{deployment_id}/chat/completions?api-version={api_version}"
         headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {params.api_key}'}
 
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
-        resp.raise_for_status()
-        response_data = resp.json()
+        http_client = get_llm_http_client("MCP_CLIENT_AZURE_AI")
+
+        async def send_request() -> Dict[str, Any]:
+            if params.is_stream:
+                # Text deltas reach on_text as they arrive, the chunks are assembled into a normal response
+                try:
+                    return await stream_chat_completion(http_client, url, headers, payload, on_text)
+                except httpx.HTTPStatusError as err:
+                    if err.response.status_code != 400 or "stream_options" not in payload or "stream_options" not in err.response.text:
+                        raise
+                    # The deployment does not know stream_options, stream without usage
+                    payload.pop("stream_options")
+                    return await stream_chat_completion(http_client, url, headers, payload, on_text)
+            resp = await http_client.post(url, headers=headers, json=payload)
+            resp.raise_for_status()
+            return resp.json()
+
+        # Queued within the deployment's budgets, 429s and 5xx responses are retried.
+        # Budgets are per endpoint and deployment, the config overrides are keyed by deployment name
+        response_data = await LlmRateLimits.call(
+            "MCP_CLIENT_AZURE_AI", f"{endpoint}/{deployment_id}", payload, send_request, deployment_name=deployment_id
+        )
 
         # Detect tool calls
         choices = response_data.get('choices', [])
@@ -137,7 +171,7 @@ async def azure_openai_processor(data: Dict[str, Any]) -> LlmResponseStruct:
         # Return as dict to avoid subscript errors
         return LlmResponseStruct(Data=asdict(final_format), Error=None, Status=True)
 
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPError as req_err:
         err_data = None
         if hasattr(req_err, 'response') and req_err.response is not None:
             try:
@@ -1,8 +1,12 @@
-import requests
+import httpx
 import json
 from typing import Dict, List, Any, Optional, Union
 from dataclasses import dataclass, field, asdict
 
+from src.llm.http_client import get_llm_http_client
+from src.llm.rate_limiter import LlmRateLimits
+from src.llm.streaming import OnTextDelta, stream_generate_content
+
 @dataclass
 class ChatMessage:
     role: str
@@ -43,7 +47,7 @@ class GeminiChatCompletionParams:
     forced_tool_calls: Optional[Any] = None
     tool_choice: str = 'auto'
 
-async def gemini_processor(data: Dict[str, Any]) -> LlmResponseStruct:
+async def gemini_processor(data: Dict[str, Any], on_text: OnTextDelta = None) -> LlmResponseStruct:
     """Gemini LLM Processor"""
     try:
         # Parse parameters
@@ -141,12 +145,21 @@ async def gemini_processor(data: Dict[str, Any]) -> LlmResponseStruct:
             payload["tools"] = [{"functionDeclarations": function_declarations}]
 
         # Send request
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{selected_model}:generateContent?key={params.api_key}"
         headers = {'Content-Type': 'application/json'}
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
+        http_client = get_llm_http_client("MCP_CLIENT_GEMINI")
+
+        async def send_request() -> Dict[str, Any]:
+            if params.is_stream:
+                # Text deltas reach on_text as they arrive, the chunks are merged into a generateContent response
+                url = f"https://generativelanguage.googleapis.com/v1beta/models/{selected_model}:streamGenerateContent?alt=sse&key={params.api_key}"
+                return await stream_generate_content(http_client, url, headers, payload, on_text)
+            url = f"https://generativelanguage.googleapis.com/v1beta/models/{selected_model}:generateContent?key={params.api_key}"
+            response = await http_client.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            return response.json()
 
-        response_data = response.json()
+        # Queued within the model's budgets, RESOURCE_EXHAUSTED (429) and 5xx responses are retried
+        response_data = await LlmRateLimits.call("MCP_CLIENT_GEMINI", selected_model, payload, send_request)
 
         message_content = response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
         tool_call = response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("functionCall", None)
@@ -167,7 +180,7 @@ async def gemini_processor(data: Dict[str, Any]) -> LlmResponseStruct:
 
         return LlmResponseStruct(Data=asdict(final_format), Error=None, Status=True)
 
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPError as req_err:
         err_data = None
         if hasattr(req_err, 'response') and req_err.response is not None:
             try:
@@ -0,0 +1,47 @@
+import httpx
+from typing import Dict
+
+from src.client_and_server_config import LlmHttpConfig
+
+# HTTP/2 needs the optional `h2` package (installed with httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Global client store, one pooled client per provider
+LlmHttpClients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_llm_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Return the shared async HTTP client for a provider, creating it on first use.
+    Connections are kept alive and pooled per endpoint inside the client.
+    """
+    client = LlmHttpClients.get(provider)
+    if client is not None and not client.is_closed:
+        return client
+
+    config = LlmHttpConfig.get(provider, {})
+    client = httpx.AsyncClient(
+        http2=config.get("http2", True) and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=config.get("max_connections", 100),
+            max_keepalive_connections=config.get("max_keepalive_connections", 20),
+            keepalive_expiry=config.get("keepalive_expiry", 30),
+        ),
+        timeout=httpx.Timeout(config.get("timeout", 60), connect=config.get("connect_timeout", 10)),
+    )
+    LlmHttpClients[provider] = client
+    return client
+
+
+async def close_llm_http_clients():
+    """Close every pooled client, called from the app shutdown hook"""
+    for provider, client in list(LlmHttpClients.items()):
+        try:
+            await client.aclose()
+        except Exception as err:
+            print(f"Error closing {provider} http client =========>>>> {err}")
+    LlmHttpClients.clear()
@@ -1,8 +1,12 @@
-import requests
+import httpx
 import json
 from typing import Dict, List, Any, Optional, Union
 from dataclasses import dataclass, field, asdict
 
+from src.llm.http_client import get_llm_http_client
+from src.llm.rate_limiter import LlmRateLimits
+from src.llm.streaming import OnTextDelta, stream_chat_completion
+
 @dataclass
 class ChatMessage:
     role: str
@@ -44,7 +48,7 @@ class AzureAndOpenAiChatCompletionParams:
     forced_tool_calls: Optional[Any] = None
     tool_choice: str = 'auto'
 
-async def openai_processor(data: Dict[str, Any]) -> LlmResponseStruct:
+async def openai_processor(data: Dict[str, Any], on_text: OnTextDelta = None) -> LlmResponseStruct:
     """ 
     Main OpenAI Processor function
     """
@@ -92,11 +96,14 @@ async def openai_processor(data: Dict[str, Any]) -> LlmResponseStruct:
             "model": selected_model,
             "messages": messages_arr,
             "max_tokens": params.max_tokens,
-            "stream": False,
+            "stream": params.is_stream,
             "tools": params.tools,
             "tool_choice": params.tool_choice,
             "temperature": params.temperature,
         }
+        if params.is_stream:
+            # Usage only comes with the stream when asked for, in a last chunk without choices
+            payload["stream_options"] = {"include_usage": True}
         
         # print(f"payload: {payload}")
 
@@ -104,9 +111,18 @@ async def openai_processor(data: Dict[str, Any]) -> LlmResponseStruct:
         url = f"https://api.openai.com/v1/chat/completions"
         headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {params.api_key}'}
 
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
-        resp.raise_for_status()
-        response_data = resp.json()
+        http_client = get_llm_http_client("MCP_CLIENT_OPENAI")
+
+        async def send_request() -> Dict[str, Any]:
+            if params.is_stream:
+                # Text deltas reach on_text as they arrive, the chunks are assembled into a normal response
+                return await stream_chat_completion(http_client, url, headers, payload, on_text)
+            resp = await http_client.post(url, headers=headers, json=payload)
+            resp.raise_for_status()
+            return resp.json()
+
+        # Queued within the deployment's budgets, 429s and 5xx responses are retried
+        response_data = await LlmRateLimits.call("MCP_CLIENT_OPENAI", selected_model, payload, send_request)
 
         # Detect tool calls
         choices = response_data.get('choices', [])
@@ -134,7 +150,7 @@ async def openai_processor(data: Dict[str, Any]) -> LlmResponseStruct:
         # Return as dict to avoid subscript errors
         return LlmResponseStruct(Data=asdict(final_format), Error=None, Status=True)
 
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPError as req_err:
         err_data = None
         if hasattr(req_err, 'response') and req_err.response is not None:
             try:
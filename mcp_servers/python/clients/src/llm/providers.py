@@ -0,0 +1,125 @@
+import json
+from typing import Dict, List, Any, Optional
+
+from src.llm.azureopenai import azure_openai_processor, LlmResponseStruct
+from src.llm.openai import openai_processor
+from src.llm.gemini import gemini_processor
+from src.llm.streaming import OnTextDelta
+
+
+class LlmProvider():
+    """
+    Provider interface used by the agent loop engine.
+    Each provider adapts one *_processor function and knows how to read its raw response.
+    """
+    name = ""
+    # Role used when tool results are written back into chat_history
+    tool_result_role = "assistant"
+    # Cap on LLM calls inside the tool loop, None means unbounded
+    max_tool_loop_calls: Optional[int] = None
+    # Only offer the selected tools on the first call of the tool loop
+    tools_on_first_call_only = False
+
+    async def complete(self, client_details: Dict[str, Any], on_text: OnTextDelta = None) -> LlmResponseStruct:
+        """One LLM call. With client_details["is_stream"] the provider streams and passes text deltas to on_text"""
+        raise NotImplementedError()
+
+    def parse_tool_calls(self, response: LlmResponseStruct) -> List[Dict[str, Any]]:
+        """Return the tool calls of a response as [{"id", "name", "arguments"}]"""
+        raise NotImplementedError()
+
+    def text_content(self, response: LlmResponseStruct) -> Optional[str]:
+        raise NotImplementedError()
+
+    def usage(self, response: LlmResponseStruct) -> Dict[str, int]:
+        data = response.Data or {}
+        return {
+            "total_tokens": data.get("total_tokens", 0),
+            "total_input_tokens": data.get("total_input_tokens", 0),
+            "total_output_tokens": data.get("total_output_tokens", 0)
+        }
+
+
+class OpenAICompatibleProvider(LlmProvider):
+    """Shared response parsing for chat/completions style providers"""
+
+    def _first_message(self, response: LlmResponseStruct) -> Dict[str, Any]:
+        final_llm_response = (response.Data or {}).get("final_llm_response") or {}
+        choices = final_llm_response.get("choices") or [{}]
+        return choices[0].get("message") or {}
+
+    def parse_tool_calls(self, response: LlmResponseStruct) -> List[Dict[str, Any]]:
+        tool_calls = []
+        for tool in self._first_message(response).get("tool_calls") or []:
+            tool_calls.append({
+                "id": tool.get("id"),
+                "name": tool.get("function", {}).get("name"),
+                "arguments": json.loads(tool.get("function", {}).get("arguments") or "{}"),
+            })
+        return tool_calls
+
+    def text_content(self, response: LlmResponseStruct) -> Optional[str]:
+        return self._first_message(response).get("content")
+
+
+class AzureOpenAIProvider(OpenAICompatibleProvider):
+    name = "MCP_CLIENT_AZURE_AI"
+
+    async def complete(self, client_details: Dict[str, Any], on_text: OnTextDelta = None) -> LlmResponseStruct:
+        return await azure_openai_processor(client_details, on_text)
+
+
+class OpenAIProvider(OpenAICompatibleProvider):
+    name = "MCP_CLIENT_OPENAI"
+
+    async def complete(self, client_details: Dict[str, Any], on_text: OnTextDelta = None) -> LlmResponseStruct:
+        return await openai_processor(client_details, on_text)
+
+
+class GeminiProvider(LlmProvider):
+    name = "MCP_CLIENT_GEMINI"
+    tool_result_role = "model"
+    max_tool_loop_calls = 2
+    tools_on_first_call_only = True
+
+    async def complete(self, client_details: Dict[str, Any], on_text: OnTextDelta = None) -> LlmResponseStruct:
+        return await gemini_processor(client_details, on_text)
+
+    def _parts(self, response: LlmResponseStruct) -> List[Dict[str, Any]]:
+        final_llm_response = (response.Data or {}).get("final_llm_response") or {}
+        candidates = final_llm_response.get("candidates") or [{}]
+        content = candidates[0].get("content", {}) if isinstance(candidates[0], dict) else {}
+        return content.get("parts", []) if isinstance(content, dict) else []
+
+    def parse_tool_calls(self, response: LlmResponseStruct) -> List[Dict[str, Any]]:
+        tool_calls = []
+        for part in self._parts(response):
+            if "functionCall" not in part:
+                continue
+
+            args_raw = part.get("functionCall", {}).get("args", {})
+            if isinstance(args_raw, str):
+                try:
+                    args = json.loads(args_raw)
+                except json.JSONDecodeError:
+                    args = {}
+            else:
+                args = args_raw
+
+            tool_calls.append({
+                "id": part.get("id"),
+                "name": part.get("functionCall", {}).get("name"),
+                "arguments": args,
+            })
+        return tool_calls
+
+    def text_content(self, response: LlmResponseStruct) -> Optional[str]:
+        texts = [part.get("text") for part in self._parts(response) if part.get("text")]
+        return "".join(texts) if texts else None
+
+
+LlmProviders: Dict[str, LlmProvider] = {
+    "MCP_CLIENT_AZURE_AI": AzureOpenAIProvider(),
+    "MCP_CLIENT_OPENAI": OpenAIProvider(),
+    "MCP_CLIENT_GEMINI": GeminiProvider(),
+}
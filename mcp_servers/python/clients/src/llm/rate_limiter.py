@@ -0,0 +1,204 @@
+import asyncio
+import httpx
+import json
+import random
+import re
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from src.client_and_server_config import LlmRateLimitConfig
+from src.metrics import GatewayMetrics
+
+# Budgets are tracked over a sliding window of this many seconds
+WINDOW_SECONDS = 60
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Failures before the request reached the provider, safe to retry even for a streamed call
+RETRYABLE_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+GEMINI_RETRY_DELAY_PATTERN = re.compile(r"^([\d.]+)s$")
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Rough token cost of a request before it is sent: ~4 characters per prompt token plus the output cap"""
+    generation_config = payload.get("generationConfig") or {}
+    max_output = payload.get("max_tokens") or generation_config.get("maxOutputTokens") or 0
+    return len(json.dumps(payload)) // 4 + int(max_output)
+
+
+def usage_tokens(response_data: Dict[str, Any]) -> Optional[int]:
+    """Total tokens reported by a chat/completions or Gemini response"""
+    usage = response_data.get("usage") or {}
+    if usage.get("total_tokens") is not None:
+        return usage["total_tokens"]
+    usage_metadata = response_data.get("usageMetadata") or {}
+    return usage_metadata.get("totalTokenCount")
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Delay asked for by the provider: retry-after-ms, Retry-After (seconds or date) or a Gemini RetryInfo"""
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # Gemini RESOURCE_EXHAUSTED errors carry {"@type": ".../google.rpc.RetryInfo", "retryDelay": "23s"}
+    try:
+        details = response.json().get("error", {}).get("details", [])
+    except Exception:
+        return None
+    for detail in details if isinstance(details, list) else []:
+        match = GEMINI_RETRY_DELAY_PATTERN.match(str(detail.get("retryDelay", "")))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class LlmRateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute budgets per provider and deployment,
+    plus retries of rate limited and transient failures.
+
+    A call waits until its estimated tokens fit the sliding window, so a saturated deployment
+    queues calls here instead of collecting 429s. The estimate is replaced by the reported usage
+    once the call returns. A 429 pauses every call to that deployment for the provider's Retry-After.
+    """
+
+    def __init__(self):
+        # (provider, deployment) -> deque of [timestamp, tokens]
+        self._windows: Dict[Tuple[str, str], deque] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._blocked_until: Dict[Tuple[str, str], float] = {}
+
+    def _prune(self, window: deque, now: float):
+        while window and now - window[0][0] >= WINDOW_SECONDS:
+            window.popleft()
+
+    def _wait_seconds(self, key: Tuple[str, str], config: Dict[str, Any], tokens: int, now: float) -> float:
+        window = self._windows.setdefault(key, deque())
+        self._prune(window, now)
+        wait = max(0.0, self._blocked_until.get(key, 0.0) - now)
+
+        requests_per_minute = config.get("requests_per_minute")
+        if requests_per_minute and len(window) >= requests_per_minute:
+            wait = max(wait, window[len(window) - requests_per_minute][0] + WINDOW_SECONDS - now)
+
+        tokens_per_minute = config.get("tokens_per_minute")
+        if tokens_per_minute and window:
+            # Wait for the oldest entries to expire until the new call fits, an oversized call runs alone
+            used = sum(entry[1] for entry in window)
+            for timestamp, entry_tokens in window:
+                if used + tokens <= tokens_per_minute:
+                    break
+                used -= entry_tokens
+                wait = max(wait, timestamp + WINDOW_SECONDS - now)
+        return wait
+
+    async def _reserve(self, key: Tuple[str, str], config: Dict[str, Any], tokens: int) -> list:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        start_time = time.monotonic()
+        # Calls to one deployment reserve in arrival order
+        async with lock:
+            while True:
+                now = time.monotonic()
+                wait = self._wait_seconds(key, config, tokens, now)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            entry = [now, tokens]
+            self._windows[key].append(entry)
+        waited = time.monotonic() - start_time
+        if waited > 0.001:
+            GatewayMetrics.observe("llm_rate_limit_wait_seconds", waited, labels={"provider": key[0]})
+        return entry
+
+    async def call(
+        self,
+        provider: str,
+        deployment: str,
+        payload: Dict[str, Any],
+        send: Callable[[], Awaitable[Dict[str, Any]]],
+        deployment_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Run send() within the budgets of provider/deployment, retrying retryable failures with
+        jittered exponential backoff. The last error is raised once the retries are spent.
+        deployment_name is the key of the "deployments" overrides when deployment is qualified
+        further (an Azure deployment name is only unique per endpoint), it defaults to deployment.
+        """
+        provider_config = LlmRateLimitConfig.get(provider, {})
+        overrides = provider_config.get("deployments", {}).get(deployment_name or deployment, {})
+        config = {**provider_config, **overrides}
+        key = (provider, deployment or "")
+        max_retries = config.get("max_retries", 3)
+        initial_backoff = config.get("initial_backoff", 1)
+        max_backoff = config.get("max_backoff", 30)
+        tokens = estimate_tokens(payload)
+
+        attempt = 0
+        while True:
+            entry = await self._reserve(key, config, tokens)
+            try:
+                response_data = await send()
+                reported = usage_tokens(response_data)
+                entry[1] = reported if reported is not None else tokens
+                return response_data
+
+            except httpx.HTTPStatusError as err:
+                entry[1] = 0
+                status = err.response.status_code
+                if status not in RETRYABLE_STATUS_CODES or attempt >= max_retries:
+                    raise
+                retry_after = retry_after_seconds(err.response)
+                if status == 429 and retry_after is not None:
+                    # Hold back every call to this deployment, not only the one that was refused
+                    self._blocked_until[key] = max(self._blocked_until.get(key, 0.0), time.monotonic() + retry_after)
+                reason = str(status)
+
+            except RETRYABLE_TRANSPORT_ERRORS as err:
+                entry[1] = 0
+                if attempt >= max_retries:
+                    raise
+                retry_after = None
+                reason = type(err).__name__
+
+            # Full jitter, never sooner than the provider asked for
+            backoff = random.uniform(0, min(max_backoff, initial_backoff * 2 ** attempt))
+            delay = max(backoff, retry_after or 0.0)
+            attempt += 1
+            GatewayMetrics.inc("llm_retries_total", labels={"provider": provider, "reason": reason})
+            print(f"Retrying {provider} call in {delay:.2f}s after {reason} (attempt {attempt}/{max_retries})")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        deployments = []
+        for (provider, deployment), window in self._windows.items():
+            self._prune(window, now)
+            deployments.append({
+                "provider": provider,
+                "deployment": deployment,
+                "requests_last_minute": len(window),
+                "tokens_last_minute": sum(entry[1] for entry in window),
+                "blocked_seconds": round(max(0.0, self._blocked_until.get((provider, deployment), 0.0) - now), 3)
+            })
+        return {"deployments": deployments}
+
+
+# Shared by every LLM adapter in this gateway worker
+LlmRateLimits = LlmRateLimiter()
@@ -0,0 +1,142 @@
+import httpx
+import json
+from typing import Dict, List, Any, Optional, Callable, Awaitable, AsyncIterator
+
+# Called with each text delta as it arrives from the provider
+OnTextDelta = Optional[Callable[[str], Awaitable[None]]]
+
+
+async def iter_sse_json(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the JSON payload of every `data:` line of a server-sent events response"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        yield json.loads(data)
+
+
+async def open_stream(http_client: httpx.AsyncClient, url: str, headers: Dict[str, str], payload: Dict[str, Any]):
+    """Send a streaming POST, raising httpx.HTTPStatusError with a readable body on an error status"""
+    response = await http_client.send(http_client.build_request("POST", url, headers=headers, json=payload), stream=True)
+    if response.is_error:
+        await response.aread()
+        await response.aclose()
+        response.raise_for_status()
+    return response
+
+
+def merge_tool_call_delta(tool_calls: List[Dict[str, Any]], delta: Dict[str, Any]) -> None:
+    """Append one streamed tool call fragment to the tool call at its index"""
+    index = delta.get("index", len(tool_calls))
+    while len(tool_calls) <= index:
+        tool_calls.append({"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+    tool_call = tool_calls[index]
+    if delta.get("id"):
+        tool_call["id"] = delta["id"]
+    if delta.get("type"):
+        tool_call["type"] = delta["type"]
+    function = delta.get("function") or {}
+    if function.get("name"):
+        tool_call["function"]["name"] += function["name"]
+    if function.get("arguments"):
+        tool_call["function"]["arguments"] += function["arguments"]
+
+
+async def stream_chat_completion(
+    http_client: httpx.AsyncClient,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    on_text: OnTextDelta = None
+) -> Dict[str, Any]:
+    """
+    Run a chat/completions request with "stream": true and assemble the chunks into the
+    same shape as a non-streamed response. Text deltas are passed to on_text as they arrive,
+    tool call argument fragments are concatenated per tool call index.
+    """
+    response_data: Dict[str, Any] = {"choices": [], "usage": {}}
+    content_parts: List[str] = []
+    tool_calls: List[Dict[str, Any]] = []
+    finish_reason = None
+
+    response = await open_stream(http_client, url, headers, payload)
+    try:
+        async for chunk in iter_sse_json(response):
+            for key in ("id", "object", "created", "model", "system_fingerprint"):
+                if key in chunk:
+                    response_data[key] = chunk[key]
+            # With stream_options.include_usage the last chunk carries the usage and no choices
+            if chunk.get("usage"):
+                response_data["usage"] = chunk["usage"]
+
+            for choice in chunk.get("choices") or []:
+                if choice.get("index", 0) != 0:
+                    continue
+                delta = choice.get("delta") or {}
+                if delta.get("content"):
+                    content_parts.append(delta["content"])
+                    if on_text is not None:
+                        await on_text(delta["content"])
+                for tool_call_delta in delta.get("tool_calls") or []:
+                    merge_tool_call_delta(tool_calls, tool_call_delta)
+                finish_reason = choice.get("finish_reason") or finish_reason
+    finally:
+        await response.aclose()
+
+    message: Dict[str, Any] = {"role": "assistant", "content": "".join(content_parts) if content_parts else None}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    response_data["object"] = "chat.completion"
+    response_data["choices"] = [{"index": 0, "message": message, "finish_reason": finish_reason}]
+    return response_data
+
+
+async def stream_generate_content(
+    http_client: httpx.AsyncClient,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    on_text: OnTextDelta = None
+) -> Dict[str, Any]:
+    """
+    Run a Gemini streamGenerateContent request (alt=sse) and merge the chunks into one
+    generateContent style response. Consecutive text parts are joined, function calls
+    arrive whole and are kept as separate parts.
+    """
+    parts: List[Dict[str, Any]] = []
+    usage: Dict[str, Any] = {}
+    candidate: Dict[str, Any] = {}
+    model_version = None
+
+    response = await open_stream(http_client, url, headers, payload)
+    try:
+        async for chunk in iter_sse_json(response):
+            usage = chunk.get("usageMetadata") or usage
+            model_version = chunk.get("modelVersion") or model_version
+            candidates = chunk.get("candidates") or []
+            if not candidates:
+                continue
+            for key, value in candidates[0].items():
+                if key != "content":
+                    candidate[key] = value
+
+            for part in (candidates[0].get("content") or {}).get("parts") or []:
+                if "text" in part and len(part) == 1:
+                    if part["text"] and on_text is not None:
+                        await on_text(part["text"])
+                    if parts and set(parts[-1]) == {"text"}:
+                        parts[-1]["text"] += part["text"]
+                        continue
+                parts.append(dict(part))
+    finally:
+        await response.aclose()
+
+    response_data: Dict[str, Any] = {
+        "candidates": [{**candidate, "content": {"role": "model", "parts": parts or [{"text": ""}]}}],
+        "usageMetadata": usage
+    }
+    if model_version:
+        response_data["modelVersion"] = model_version
+    return response_data
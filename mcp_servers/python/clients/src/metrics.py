@@ -0,0 +1,92 @@
+import bisect
+import threading
+from typing import Dict, Any, Optional, Tuple, List
+
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+LabelsKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels_key(labels: Optional[Dict[str, Any]]) -> LabelsKey:
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+class MetricsRegistry:
+    """Minimal in-process counters, gauges and histograms, exported as JSON or Prometheus text"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelsKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelsKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelsKey, Dict[str, Any]]] = {}
+        self.histogram_buckets: Dict[str, List[float]] = {}
+
+    def inc(self, name: str, value: float = 1, labels: Optional[Dict[str, Any]] = None):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self.gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None, buckets: Optional[List[float]] = None):
+        key = _labels_key(labels)
+        with self._lock:
+            bucket_bounds = self.histogram_buckets.setdefault(name, sorted(buckets or DEFAULT_BUCKETS))
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(bucket_bounds) + 1)}
+                series[key] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["buckets"][bisect.bisect_left(bucket_bounds, value)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {name: [{"labels": dict(key), "value": value} for key, value in series.items()] for name, series in self.counters.items()},
+                "gauges": {name: [{"labels": dict(key), "value": value} for key, value in series.items()] for name, series in self.gauges.items()},
+                "histograms": {
+                    name: [{
+                        "labels": dict(key),
+                        "count": histogram["count"],
+                        "sum": histogram["sum"],
+                        "max": histogram["max"],
+                        "mean": histogram["sum"] / histogram["count"] if histogram["count"] else 0.0
+                    } for key, histogram in series.items()]
+                    for name, series in self.histograms.items()
+                }
+            }
+
+    def render_prometheus(self) -> str:
+        def format_labels(key: LabelsKey, extra: Optional[Tuple[str, str]] = None) -> str:
+            pairs = list(key) + ([extra] if extra else [])
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for name, series in self.counters.items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{format_labels(key)} {value}" for key, value in series.items())
+            for name, series in self.gauges.items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{format_labels(key)} {value}" for key, value in series.items())
+            for name, series in self.histograms.items():
+                lines.append(f"# TYPE {name} histogram")
+                bucket_bounds = self.histogram_buckets[name]
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(bucket_bounds + ["+Inf"], histogram["buckets"]):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{format_labels(key, ('le', str(bound)))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(key)} {histogram['sum']}")
+                    lines.append(f"{name}_count{format_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# Global registry, exported by the /api/v1/mcp/metrics route
+GatewayMetrics = MetricsRegistry()
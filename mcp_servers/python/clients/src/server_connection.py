@@ -1,12 +1,17 @@
 import os
 import asyncio
+import time
 import warnings
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 
+import anyio
 from contextlib import AsyncExitStack
 from src.client_and_server_config import ServersConfig
+from src.tool_catalog import MCPToolCatalog
+from src.metrics import GatewayMetrics
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp import types
 from mcp import ClientSession, StdioServerParameters
 
 # Suppress warnings about unclosed transports
@@ -16,50 +21,428 @@ warnings.filterwarnings("ignore", category=ResourceWarning, message="unclosed tr
 # Suppress specific ResourceWarning related to unclosed transport
 warnings.filterwarnings("ignore", category=ResourceWarning, message="unclosed transport .*")
 
-# Global session store
-MCPServers: Dict[str, ClientSession] = {}
+# Seconds a server gets to spawn, handshake and list its tools, overridable per server with "startup_timeout"
+DEFAULT_STARTUP_TIMEOUT = 60
 
+# Seconds between pings of an idle replica, overridable per server with "health_check_interval"
+DEFAULT_HEALTH_CHECK_INTERVAL = 15
+HEALTH_CHECK_TIMEOUT = 10
 
-async def initialize_all_mcp(exit_stack):
-    """Initialize all MCP clients based on server configuration"""
-    for server in ServersConfig:
-        try:
-            print(f"\n================= Initializing {server['server_name']} mcp server start ===============")
-            print(f"Server name        : {server['server_name']}")
-            print(f"Server command     : {server['command']}")
-            print(f"Server args        : {server['args']}")
-            print(f"cwd                : {os.getcwd()}")
-
-            # Optional directory existence check
-            if "--directory" in server["args"]:
-                dir_index = server["args"].index("--directory")
-                if dir_index + 1 < len(server["args"]):
-                    relative_path = server["args"][dir_index + 1]
-                    absolute_path = os.path.abspath(relative_path)
-                    print(f"Relative path      : {relative_path}")
-                    print(f"Absolute path      : {absolute_path}")
-                    print(f"Path exists        : {os.path.exists(absolute_path)}")
-
-            # Start stdio client
+# Seconds a lazy server may sit unused before its processes are stopped, overridable per server with "idle_timeout"
+DEFAULT_IDLE_TIMEOUT = 600
+
+# Respawn delay after a replica died or failed to start, doubled on every failure up to the maximum
+RESPAWN_INITIAL_BACKOFF = 1
+RESPAWN_MAX_BACKOFF = 60
+# A replica that stayed up this long resets the backoff
+RESPAWN_STABLE_SECONDS = 60
+
+# Errors meaning the replica's stdio connection is gone, rather than a failed tool
+CONNECTION_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+def is_connection_error(err: BaseException) -> bool:
+    if isinstance(err, CONNECTION_ERRORS):
+        return True
+    return getattr(getattr(err, "error", err), "code", None) == types.CONNECTION_CLOSED
+
+
+def replica_label(server: Dict[str, Any], index: int) -> str:
+    return f"{server['server_name']} mcp server" + (f" replica {index}" if server.get("replicas", 1) > 1 else "")
+
+
+class MCPServerReplica:
+    """One stdio subprocess and session of a server, with its in-flight call count"""
+
+    def __init__(self, server_name: str, index: int, session: ClientSession, stop: asyncio.Event):
+        self.server_name = server_name
+        self.index = index
+        self.session = session
+        self.stop = stop
+        self.healthy = True
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.started_at = time.time()
+
+    def _set_in_flight(self, delta: int):
+        self.in_flight += delta
+        GatewayMetrics.set_gauge("mcp_replica_in_flight", self.in_flight, labels={"server": self.server_name, "replica": self.index})
+
+
+class MCPServerPool:
+    """
+    Replicas of one MCP server. Tool calls go to the least-busy healthy replica, ties to the one
+    with the fewest calls so far, which spreads sequential traffic round robin.
+    While no replica is healthy, calls wait up to the server's startup timeout for a respawn.
+    """
+
+    def __init__(self, server: Dict[str, Any]):
+        self.server_name = server["server_name"]
+        self.wait_timeout = server.get("startup_timeout", DEFAULT_STARTUP_TIMEOUT)
+        self.replicas: List[MCPServerReplica] = []
+        self.restarts: Dict[int, int] = {}
+        self.last_used = time.monotonic()
+        self._available = asyncio.Event()
+
+    def _update_available(self):
+        if any(replica.healthy for replica in self.replicas):
+            self._available.set()
+        else:
+            self._available.clear()
+
+    def add(self, replica: MCPServerReplica):
+        self.replicas = sorted(self.replicas + [replica], key=lambda r: r.index)
+        self._update_available()
+
+    def remove(self, replica: MCPServerReplica):
+        self.replicas = [r for r in self.replicas if r is not replica]
+        self._update_available()
+
+    def mark_unhealthy(self, replica: MCPServerReplica, reason: Any):
+        """Take a replica out of rotation and stop it, its supervisor respawns it"""
+        if not replica.healthy:
+            return
+        print(f"Error in {self.server_name} mcp server replica {replica.index} =========>>>> {reason}")
+        replica.healthy = False
+        replica.stop.set()
+        self._update_available()
+
+    async def acquire(self) -> MCPServerReplica:
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if healthy:
+                self.last_used = time.monotonic()
+                return min(healthy, key=lambda replica: (replica.in_flight, replica.calls))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"No healthy replica of {self.server_name} mcp server")
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any] | None = None, **kwargs) -> Any:
+        # A call lost with its subprocess is retried once, on another replica or the respawned one
+        for attempt in range(2):
+            replica = await self.acquire()
+            replica.calls += 1
+            replica._set_in_flight(1)
+            GatewayMetrics.inc("mcp_replica_calls_total", labels={"server": self.server_name, "replica": replica.index})
+            try:
+                return await replica.session.call_tool(name, arguments, **kwargs)
+            except Exception as err:
+                replica.failures += 1
+                if not is_connection_error(err):
+                    raise
+                self.mark_unhealthy(replica, err)
+                if attempt:
+                    raise
+                print(f"Retrying {name} on {self.server_name} mcp server")
+            finally:
+                replica._set_in_flight(-1)
+                self.last_used = time.monotonic()
+
+    async def list_tools(self, *args, **kwargs) -> Any:
+        replica = await self.acquire()
+        return await replica.session.list_tools(*args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": [
+                {
+                    "replica": replica.index,
+                    "healthy": replica.healthy,
+                    "in_flight": replica.in_flight,
+                    "calls": replica.calls,
+                    "failures": replica.failures,
+                    "started_at": replica.started_at
+                }
+                for replica in self.replicas
+            ],
+            "in_flight": sum(replica.in_flight for replica in self.replicas),
+            "restarts": sum(self.restarts.values()),
+            "idle_seconds": time.monotonic() - self.last_used
+        }
+
+
+# Global session store, one replica pool per server name
+MCPServers: Dict[str, MCPServerPool] = {}
+
+# Supervisor task of each replica, keyed by (server name, replica index), with the event that shuts it down
+MCPServerTasks: Dict[Tuple[str, int], Tuple[asyncio.Task, asyncio.Event]] = {}
+
+# Spawn in progress of each lazy server, shared by concurrent first requests
+LazyServerStarts: Dict[str, asyncio.Future] = {}
+
+# Idle reaper task of each running lazy server
+IdleReapers: Dict[str, asyncio.Task] = {}
+
+
+def server_stats() -> Dict[str, Any]:
+    """Replica health, in-flight calls and restarts of every running server"""
+    return {server_name: pool.stats() for server_name, pool in MCPServers.items()}
+
+
+def tool_list_changed_handler(server_name: str):
+    """Build a session message handler that invalidates the cached tool listing on tools/list_changed"""
+    async def message_handler(message: Any):
+        notification = getattr(message, "root", message)
+        if isinstance(notification, types.ToolListChangedNotification):
+            print(f"Tool list changed for {server_name} mcp server, invalidating tool catalog")
+            MCPToolCatalog.invalidate(server_name)
+    return message_handler
+
+
+async def run_mcp_server(server: Dict[str, Any], index: int, ready: asyncio.Future, stop: asyncio.Event):
+    """
+    Own one MCP server replica for its whole lifetime: spawn, handshake, tool listing, then wait for stop.
+    The stdio and session contexts are anyio task groups, so they are entered and exited in this one task.
+    """
+    server_name = server["server_name"]
+    timings = {}
+    try:
+        async with AsyncExitStack() as server_stack:
+            start_time = time.perf_counter()
             server_params = StdioServerParameters(command=server["command"], args=server["args"])
-            stdio_transport = await exit_stack.enter_async_context(stdio_client(server_params))
-            stdio, write = stdio_transport
+            stdio, write = await server_stack.enter_async_context(stdio_client(server_params))
+            timings["spawn"] = time.perf_counter() - start_time
 
-            session = await exit_stack.enter_async_context(ClientSession(stdio, write))
+            start_time = time.perf_counter()
+            session = await server_stack.enter_async_context(
+                ClientSession(stdio, write, message_handler=tool_list_changed_handler(server_name))
+            )
             await session.initialize()
+            timings["handshake"] = time.perf_counter() - start_time
 
+            start_time = time.perf_counter()
+            tools_arr = await MCPToolCatalog.build(server_name, session)
+            timings["list_tools"] = time.perf_counter() - start_time
 
-            # Save session globally
-            MCPServers[server["server_name"]] = session
+            ready.set_result((session, tools_arr, timings))
+            await stop.wait()
+    except Exception as err:
+        # anyio wraps a failing subprocess or handshake in task groups, report the underlying error
+        while isinstance(err, BaseExceptionGroup) and len(err.exceptions) == 1:
+            err = err.exceptions[0]
+        if not ready.done():
+            ready.set_exception(err)
+        else:
+            print(f"Error in {server_name} mcp server replica {index} =========>>>> {err}")
 
-            # Confirm connection
-            tools_response = await session.list_tools()
-            tool_names = [tool.name for tool in tools_response.tools]
-            print(f"Connected to {server['server_name']} with tools: {tool_names}")
-            print(f"\n================= Initializing {server['server_name']} mcp server end ===============")
 
-        except Exception as err:
-            print(f"Error initializing {server['server_name']} mcp server =========>>>> {err}")
+async def spawn_replica(server: Dict[str, Any], index: int) -> Tuple[asyncio.Task, MCPServerReplica] | None:
+    """Start one replica and wait for it within its startup timeout, None if it failed"""
+    server_name = server["server_name"]
+    label = replica_label(server, index)
+    startup_timeout = server.get("startup_timeout", DEFAULT_STARTUP_TIMEOUT)
+    ready = asyncio.get_running_loop().create_future()
+    stop = asyncio.Event()
+    task = asyncio.create_task(run_mcp_server(server, index, ready, stop))
+    start_time = time.perf_counter()
+
+    try:
+        session, tools_arr, timings = await asyncio.wait_for(asyncio.shield(ready), timeout=startup_timeout)
+    except asyncio.TimeoutError:
+        task.cancel()
+        print(f"Error initializing {label} =========>>>> startup timed out after {startup_timeout}s")
+        return None
+    except Exception as err:
+        print(f"Error initializing {label} =========>>>> {err}")
+        return None
+
+    tool_names = [tool["function"]["name"] for tool in tools_arr]
+    print(f"Connected to {label} with tools: {tool_names}")
+    print(
+        f"Started {label} in {time.perf_counter() - start_time:.2f}s "
+        f"(spawn {timings['spawn']:.2f}s, handshake {timings['handshake']:.2f}s, list_tools {timings['list_tools']:.2f}s)"
+    )
+    return task, MCPServerReplica(server_name, index, session, stop)
+
+
+async def watch_replica(server: Dict[str, Any], pool: MCPServerPool, replica: MCPServerReplica, task: asyncio.Task):
+    """Ping the replica every health check interval until its task ends, stopping it when a ping fails"""
+    interval = server.get("health_check_interval", DEFAULT_HEALTH_CHECK_INTERVAL)
+    while not task.done():
+        await asyncio.wait([task], timeout=interval)
+        if task.done() or not replica.healthy:
             continue
+        try:
+            await asyncio.wait_for(replica.session.send_ping(), timeout=HEALTH_CHECK_TIMEOUT)
+        except Exception as err:
+            pool.mark_unhealthy(replica, f"health check failed: {err!r}")
+
+
+async def supervise_mcp_server(server: Dict[str, Any], index: int, first_start: asyncio.Future, shutdown: asyncio.Event):
+    """
+    Keep one replica running until shutdown: spawn it, health-check it, and respawn it with exponential
+    backoff when its process dies, its ping fails or it cannot start. The new session replaces the old one
+    in the pool only once it has finished its handshake and tool listing.
+    """
+    server_name = server["server_name"]
+    label = replica_label(server, index)
+    backoff = RESPAWN_INITIAL_BACKOFF
+    try:
+        while not shutdown.is_set():
+            spawned = await spawn_replica(server, index)
+            if not first_start.done():
+                first_start.set_result(spawned is not None)
+
+            if spawned is not None:
+                task, replica = spawned
+                if shutdown.is_set():
+                    replica.stop.set()
+                    await asyncio.gather(task, return_exceptions=True)
+                    break
+
+                if server_name not in MCPServers:
+                    MCPServers[server_name] = MCPServerPool(server)
+                pool = MCPServers[server_name]
+                pool.add(replica)
+                started_at = time.monotonic()
+
+                await watch_replica(server, pool, replica, task)
+                replica.healthy = False
+                pool.remove(replica)
+                if shutdown.is_set():
+                    break
+
+                pool.restarts[index] = pool.restarts.get(index, 0) + 1
+                GatewayMetrics.inc("mcp_replica_restarts_total", labels={"server": server_name, "replica": index})
+                if time.monotonic() - started_at >= RESPAWN_STABLE_SECONDS:
+                    backoff = RESPAWN_INITIAL_BACKOFF
+
+            print(f"Respawning {label} in {backoff}s")
+            try:
+                await asyncio.wait_for(shutdown.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, RESPAWN_MAX_BACKOFF)
+
+    except Exception as err:
+        print(f"Error supervising {label} =========>>>> {err}")
+    finally:
+        if not first_start.done():
+            first_start.set_result(False)
+
+
+async def start_mcp_server(server: Dict[str, Any], index: int = 0) -> bool:
+    """Start the supervisor of one replica and wait for its first start, False if that failed"""
+    first_start = asyncio.get_running_loop().create_future()
+    shutdown = asyncio.Event()
+    task = asyncio.create_task(supervise_mcp_server(server, index, first_start, shutdown))
+    MCPServerTasks[(server["server_name"], index)] = (task, shutdown)
+    return await first_start
+
+
+async def stop_mcp_server(server_name: str):
+    """Stop the supervisors and replicas of one server and drop its pool"""
+    keys = [key for key in MCPServerTasks if key[0] == server_name]
+    for key in keys:
+        MCPServerTasks[key][1].set()
+    pool = MCPServers.pop(server_name, None)
+    for replica in (pool.replicas if pool else []):
+        replica.stop.set()
+    await asyncio.gather(*[MCPServerTasks.pop(key)[0] for key in keys], return_exceptions=True)
+
+
+async def reap_idle_server(server: Dict[str, Any]):
+    """Stop a lazy server once it has had no calls for its idle timeout"""
+    server_name = server["server_name"]
+    idle_timeout = server.get("idle_timeout", DEFAULT_IDLE_TIMEOUT)
+    while True:
+        pool = MCPServers.get(server_name)
+        if pool is None:
+            return
+        idle_seconds = time.monotonic() - pool.last_used
+        busy = any(replica.in_flight for replica in pool.replicas)
+        if not busy and idle_seconds >= idle_timeout:
+            break
+        await asyncio.sleep(idle_timeout if busy else idle_timeout - idle_seconds)
+
+    print(f"Stopping {server_name} mcp server after {idle_seconds:.0f}s idle")
+    IdleReapers.pop(server_name, None)
+    await stop_mcp_server(server_name)
+
+
+async def start_lazy_server(server: Dict[str, Any]) -> bool:
+    server_name = server["server_name"]
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*[start_mcp_server(server, index) for index in range(max(1, server.get("replicas", 1)))])
+    if not any(results):
+        # Leave the retry to the next request instead of respawning an unused server in the background
+        await stop_mcp_server(server_name)
+        return False
+
+    IdleReapers[server_name] = asyncio.create_task(reap_idle_server(server))
+    print(f"Started lazy {server_name} mcp server on first use in {time.perf_counter() - start_time:.2f}s")
+    return True
+
+
+async def ensure_mcp_server(server_name: str) -> bool:
+    """True when server_name is running, spawning a lazy server on its first use"""
+    pool = MCPServers.get(server_name)
+    if pool is not None:
+        pool.last_used = time.monotonic()
+        return True
+
+    server = next((server for server in ServersConfig if server["server_name"] == server_name and server.get("lazy")), None)
+    if server is None:
+        return False
+
+    # Concurrent first requests wait on one spawn
+    start = LazyServerStarts.get(server_name)
+    if start is None:
+        start = asyncio.ensure_future(start_lazy_server(server))
+        LazyServerStarts[server_name] = start
+        start.add_done_callback(lambda _: LazyServerStarts.pop(server_name, None))
+    return await asyncio.shield(start)
+
+
+async def close_all_mcp():
+    """Stop every supervisor and replica and wait for their sessions and processes to close"""
+    await asyncio.gather(*LazyServerStarts.values(), return_exceptions=True)
+    for reaper in IdleReapers.values():
+        reaper.cancel()
+    IdleReapers.clear()
+    await asyncio.gather(*[stop_mcp_server(server_name) for server_name in {key[0] for key in MCPServerTasks}])
+    MCPServers.clear()
+
+
+async def initialize_all_mcp(exit_stack):
+    """Initialize all MCP clients based on server configuration, concurrently"""
+    for server in ServersConfig:
+        print(f"\n================= Initializing {server['server_name']} mcp server start ===============")
+        print(f"Server name        : {server['server_name']}")
+        print(f"Server command     : {server['command']}")
+        print(f"Server args        : {server['args']}")
+        print(f"Replicas           : {server.get('replicas', 1)}")
+        print(f"Lazy               : {bool(server.get('lazy'))}")
+        print(f"cwd                : {os.getcwd()}")
+
+        # Optional directory existence check
+        if "--directory" in server["args"]:
+            dir_index = server["args"].index("--directory")
+            if dir_index + 1 < len(server["args"]):
+                relative_path = server["args"][dir_index + 1]
+                absolute_path = os.path.abspath(relative_path)
+                print(f"Relative path      : {relative_path}")
+                print(f"Absolute path      : {absolute_path}")
+                print(f"Path exists        : {os.path.exists(absolute_path)}")
+
+    # Sessions are closed with the gateway's exit stack
+    exit_stack.push_async_callback(close_all_mcp)
+
+    # Startup time is the slowest server instead of the sum, a replica that failed to start is retried in the background.
+    # Lazy servers are spawned by ensure_mcp_server on their first request.
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*[
+        start_mcp_server(server, index)
+        for server in ServersConfig
+        if not server.get("lazy")
+        for index in range(max(1, server.get("replicas", 1)))
+    ])
+    print(f"\n================= Initialized {sum(results)}/{len(results)} mcp server replicas in {time.perf_counter() - start_time:.2f}s ===============")
 
-    return True
\ No newline at end of file
+    return True
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Dict, Any, List, Optional
+
+
+def convert_mcp_tool(tool: Any) -> Dict[str, Any]:
+    """Convert an MCP tool definition into the OpenAI-style function schema used by the LLM adapters"""
+    return {
+        "type": "function",
+        "function": {
+            "name": tool.name,
+            "description": getattr(tool, "description", f"Tool for {tool.name}"),
+            "parameters": getattr(tool, "inputSchema", {
+                "type": "object",
+                "properties": {},
+                "required": []
+            })
+        }
+    }
+
+
+class ToolCatalog:
+    """
+    Per-server cache of MCP tool listings, holding the pre-converted function schemas.
+    Entries are filled at startup and rebuilt lazily after an invalidation.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._build_locks: Dict[str, asyncio.Lock] = {}
+
+    async def build(self, server_name: str, session: Any) -> List[Dict[str, Any]]:
+        """List the tools of a server session and store the converted schemas"""
+        start_time = time.perf_counter()
+        resource = await session.list_tools()
+        tools_arr = [convert_mcp_tool(tool) for tool in resource.tools] if resource else []
+        self.entries[server_name] = {
+            "tools": tools_arr,
+            "built_at": time.time(),
+            "build_time": time.perf_counter() - start_time
+        }
+        return tools_arr
+
+    async def get_tools(self, server_name: str, session: Any) -> List[Dict[str, Any]]:
+        """Return the cached tool schemas for a server, building them on a miss"""
+        entry = self.entries.get(server_name)
+        if entry is not None:
+            self.hits += 1
+            return list(entry["tools"])
+
+        self.misses += 1
+        lock = self._build_locks.setdefault(server_name, asyncio.Lock())
+        async with lock:
+            # Another request may have rebuilt the entry while we waited
+            entry = self.entries.get(server_name)
+            if entry is not None:
+                return list(entry["tools"])
+            return list(await self.build(server_name, session))
+
+    def invalidate(self, server_name: Optional[str] = None):
+        """Drop the cached listing of one server, or of every server when no name is given"""
+        if server_name is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(server_name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total_lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total_lookups if total_lookups else 0.0,
+            "servers": {
+                server_name: {
+                    "tool_count": len(entry["tools"]),
+                    "built_at": entry["built_at"],
+                    "build_time": entry["build_time"]
+                }
+                for server_name, entry in self.entries.items()
+            }
+        }
+
+
+# Global tool catalog shared by validation and the admin endpoints
+MCPToolCatalog = ToolCatalog()
@@ -0,0 +1,204 @@
+import json
+import math
+import re
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.client_and_server_config import ToolRouterConfig
+
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "from", "with", "by", "at", "as",
+    "is", "are", "was", "be", "it", "this", "that", "these", "those", "my", "me", "i", "you", "your",
+    "please", "can", "could", "would", "will", "do", "does", "what", "which", "all", "any", "some",
+    "if", "not", "no", "use", "tool", "user", "s"
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_token(token: str) -> str:
+    """Tiny suffix stripper so 'emails'/'email' and 'scheduled'/'schedule' share a term"""
+    for suffix in ("ing", "ed", "es", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    if token.endswith("e") and len(token) > 4:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [normalize_token(token) for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a small, fixed set of documents"""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(document) for document in documents]
+        self.doc_lengths = [len(document) for document in documents]
+        self.avg_doc_length = (sum(self.doc_lengths) / len(documents)) if documents else 0.0
+
+        doc_freqs = Counter(term for term_freq in self.term_freqs for term in term_freq)
+        total_docs = len(documents)
+        self.idf = {
+            term: math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            for term, doc_freq in doc_freqs.items()
+        }
+
+    def scores(self, query_terms: List[str]) -> List[float]:
+        scores = [0.0] * len(self.term_freqs)
+        for term in set(query_terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, term_freq in enumerate(self.term_freqs):
+                freq = term_freq.get(term)
+                if not freq:
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[index] / (self.avg_doc_length or 1)
+                scores[index] += idf * freq * (self.k1 + 1) / (freq + self.k1 * length_norm)
+        return scores
+
+
+def history_text(chat_history: Optional[List[Dict[str, Any]]], max_messages: int) -> str:
+    """Text of the last max_messages user and assistant messages before the current request (the last chat_history entry)"""
+    if not chat_history or max_messages <= 0:
+        return ""
+    previous = [
+        message.get("content") for message in chat_history[:-1]
+        if message.get("role") in ("user", "assistant") and isinstance(message.get("content"), str)
+    ]
+    return " ".join(previous[-max_messages:])
+
+
+class ToolRouter():
+    """
+    Offline, in-process replacement for the LLM routing call.
+    route() returns {"isFunctionCall", "selectedTools", "confidence"} or None when the
+    router is not confident and the LLM router should decide instead.
+    """
+    name = ""
+
+    def route(self, query: str, tools: List[Dict[str, Any]], server_name: str = "", history: str = "") -> Optional[Dict[str, Any]]:
+        raise NotImplementedError()
+
+
+class BM25ToolRouter(ToolRouter):
+    name = "bm25"
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else ToolRouterConfig
+        self._indexes: Dict[Tuple[str, ...], Tuple[BM25Index, List[str]]] = {}
+
+    def _get_index(self, tools: List[Dict[str, Any]]) -> Tuple[BM25Index, List[str]]:
+        tool_names = tuple(tool.get("function", {}).get("name", "") for tool in tools)
+        cached = self._indexes.get(tool_names)
+        if cached is not None:
+            return cached
+
+        documents = []
+        for tool in tools:
+            function = tool.get("function", {})
+            # Tool names are the strongest signal, count their terms twice
+            name_terms = tokenize(function.get("name", ""))
+            documents.append(name_terms * 2 + tokenize(function.get("description", "")))
+
+        cached = (BM25Index(documents), list(tool_names))
+        self._indexes[tool_names] = cached
+        return cached
+
+    def _keyword_rule_tools(self, query: str, tool_names: List[str], server_name: str) -> List[str]:
+        padded_query = f" {' '.join(TOKEN_PATTERN.findall((query or '').lower()))} "
+        selected = []
+        for rule in self.config.get("keyword_rules", {}).get(server_name, []):
+            if any(f" {keyword} " in padded_query for keyword in rule.get("keywords", [])):
+                selected.extend(tool for tool in rule.get("tools", []) if tool in tool_names and tool not in selected)
+        return selected
+
+    def route(self, query: str, tools: List[Dict[str, Any]], server_name: str = "", history: str = "") -> Optional[Dict[str, Any]]:
+        query_terms = tokenize(query)
+        if not tools or not query_terms:
+            return None
+
+        index, tool_names = self._get_index(tools)
+        scores = index.scores(query_terms)
+        # Follow-ups ("yes, go ahead") name their tools in the previous turns, which count for less
+        history_terms = tokenize(history)
+        if history_terms:
+            history_weight = self.config.get("history_weight", 0.5)
+            scores = [score + history_weight * history_score for score, history_score in zip(scores, index.scores(history_terms))]
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        top_score = scores[ranked[0]]
+        max_selected = self.config.get("max_selected_tools", 3)
+
+        rule_tools = self._keyword_rule_tools(query, tool_names, server_name)
+        if rule_tools:
+            ranked_tools = [tool_names[i] for i in ranked if scores[i] > 0 and scores[i] >= top_score * self.config.get("relative_cutoff", 0.6)]
+            selected_tools = rule_tools + [tool for tool in ranked_tools if tool not in rule_tools]
+            return {"isFunctionCall": True, "selectedTools": selected_tools[:max(max_selected, len(rule_tools))], "confidence": 1.0}
+
+        if top_score <= 0:
+            # No shared terms says nothing about paraphrases ("what is on my schedule"), the LLM decides
+            return None
+
+        confidence = 1 - math.exp(-top_score / self.config.get("score_scale", 2.0))
+        if confidence < self.config.get("min_confidence", 0.6):
+            return None
+
+        cutoff = top_score * self.config.get("relative_cutoff", 0.6)
+        selected_tools = [tool_names[i] for i in ranked if scores[i] >= cutoff][:max_selected]
+        return {"isFunctionCall": True, "selectedTools": selected_tools, "confidence": confidence}
+
+
+ToolRouters: Dict[str, ToolRouter] = {
+    "bm25": BM25ToolRouter(),
+}
+
+
+def route_tools_locally(
+    query: str,
+    tools: List[Dict[str, Any]],
+    server_name: str,
+    router_name: Optional[str] = None,
+    chat_history: Optional[List[Dict[str, Any]]] = None
+) -> Optional[Dict[str, Any]]:
+    """Run the configured local router, None means fall back to the LLM router"""
+    router = ToolRouters.get(router_name or ToolRouterConfig.get("router", "llm"))
+    if router is None:
+        return None
+
+    start_time = time.perf_counter()
+    try:
+        history = history_text(chat_history, ToolRouterConfig.get("history_messages", 2))
+        decision = router.route(query, tools, server_name, history)
+    except Exception as err:
+        print(f"Error in {router.name} tool router =========>>>> {err}")
+        return None
+
+    if decision is not None:
+        decision["router"] = router.name
+        decision["route_time"] = time.perf_counter() - start_time
+    return decision
+
+
+def record_routing_sample(server_name: str, query: str, tools: List[Dict[str, Any]], llm_decision: Dict[str, Any], latency: float) -> None:
+    """Append an LLM router decision to the benchmark corpus, when recording is enabled"""
+    corpus_path = ToolRouterConfig.get("record_corpus_path")
+    if not corpus_path:
+        return
+    try:
+        with open(corpus_path, "a") as f:
+            f.write(json.dumps({
+                "server_name": server_name,
+                "input": query,
+                "tools": [tool.get("function", {}).get("name", "") for tool in tools],
+                "isFunctionCall": llm_decision.get("isFunctionCall", False),
+                "selectedTools": llm_decision.get("selectedTools", []),
+                "llm_latency_ms": latency * 1000
+            }) + "\n")
+    except Exception as err:
+        print(f"Error recording tool routing sample =========>>>> {err}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the gateway modules as src.*, the same way run.py does
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
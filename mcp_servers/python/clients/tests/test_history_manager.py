@@ -0,0 +1,33 @@
+from src.history_manager import HistoryManager
+
+
+def history(count):
+    return [{"role": "user" if index % 2 == 0 else "assistant", "content": f"message {index} " + "x" * 40} for index in range(count)]
+
+
+def test_compact_keeps_recent_messages_from_config():
+    chat_history = history(10)
+    HistoryManager({"max_history_tokens": 1}).compact(chat_history)
+    assert [message["content"][:10] for message in chat_history] == ["message 6 ", "message 7 ", "message 8 ", "message 9 "]
+
+
+def test_compact_keep_recent_messages_per_request():
+    chat_history = history(10)
+    HistoryManager({"max_history_tokens": 1, "keep_recent_messages": 2}).compact(chat_history)
+    assert [message["content"][:10] for message in chat_history] == ["message 8 ", "message 9 "]
+
+
+def test_compact_within_budget_keeps_everything():
+    chat_history = history(10)
+    assert len(HistoryManager({"max_history_tokens": 10000}).compact(chat_history)) == 10
+
+
+def test_tool_result_content_truncates_large_results():
+    manager = HistoryManager({"max_tool_result_tokens": 100})
+    small = manager.tool_result_content("list_calendars", {"items": [1, 2]})
+    assert small == {"content": 'Executed tool: list_calendars and the result is: {"items": [1, 2]}', "truncated": False}
+
+    large = manager.tool_result_content("query_gmail_emails", {"emails": "x" * 5000})
+    assert large["truncated"] is True
+    assert "characters omitted]" in large["content"]
+    assert len(large["content"]) < 100 * 4
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from collections import deque
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from src.llm import rate_limiter
+from src.llm.rate_limiter import (
+    WINDOW_SECONDS, LlmRateLimiter, estimate_tokens, retry_after_seconds, usage_tokens
+)
+
+KEY = ("openai", "gpt-4o")
+
+
+def error_response(status_code, headers=None, json_body=None):
+    request = httpx.Request("POST", "https://llm.test/v1/chat")
+    return httpx.Response(status_code, headers=headers, json=json_body, request=request)
+
+
+def status_error(status_code, headers=None, json_body=None):
+    response = error_response(status_code, headers, json_body)
+    return httpx.HTTPStatusError(f"{status_code}", request=response.request, response=response)
+
+
+@pytest.fixture
+def limiter_config(monkeypatch):
+    """Budgets for the "test" provider, with no backoff so retries run immediately"""
+    config = {"max_retries": 2, "initial_backoff": 0, "max_backoff": 0}
+    monkeypatch.setitem(rate_limiter.LlmRateLimitConfig, "test", config)
+    return config
+
+
+def test_estimate_tokens_counts_prompt_and_output_cap():
+    payload = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100}
+    assert estimate_tokens(payload) == len(rate_limiter.json.dumps(payload)) // 4 + 100
+    gemini_payload = {"contents": [], "generationConfig": {"maxOutputTokens": 50}}
+    assert estimate_tokens(gemini_payload) >= 50
+
+
+def test_usage_tokens_reads_openai_and_gemini_usage():
+    assert usage_tokens({"usage": {"total_tokens": 42}}) == 42
+    assert usage_tokens({"usageMetadata": {"totalTokenCount": 17}}) == 17
+    assert usage_tokens({"usage": {}}) is None
+    assert usage_tokens({}) is None
+
+
+def test_retry_after_seconds_header_variants():
+    assert retry_after_seconds(error_response(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(error_response(429, {"retry-after-ms": "soon", "retry-after": "3"})) == 3.0
+    assert retry_after_seconds(error_response(429, {"retry-after": "2.5"})) == 2.5
+
+    http_date = formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after_seconds(error_response(429, {"retry-after": http_date})) <= 30
+    past_date = formatdate(time.time() - 30, usegmt=True)
+    assert retry_after_seconds(error_response(429, {"retry-after": past_date})) == 0.0
+
+
+def test_retry_after_seconds_gemini_retry_info():
+    body = {"error": {"code": 429, "details": [
+        {"@type": "type.googleapis.com/google.rpc.QuotaFailure"},
+        {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "23s"}
+    ]}}
+    assert retry_after_seconds(error_response(429, json_body=body)) == 23.0
+
+
+def test_retry_after_seconds_without_hint():
+    assert retry_after_seconds(error_response(429)) is None
+    assert retry_after_seconds(error_response(429, {"retry-after": "not a date"})) is None
+    assert retry_after_seconds(error_response(503, json_body={"error": {"details": "none"}})) is None
+
+
+def test_wait_seconds_requests_per_minute():
+    limiter = LlmRateLimiter()
+    config = {"requests_per_minute": 2}
+    limiter._windows[KEY] = deque([[100.0, 0], [110.0, 0]])
+
+    # The third call waits for the first to leave the window
+    assert limiter._wait_seconds(KEY, config, 0, 120.0) == pytest.approx(100.0 + WINDOW_SECONDS - 120.0)
+    # Once it has, the window is pruned and the call fits
+    assert limiter._wait_seconds(KEY, config, 0, 100.0 + WINDOW_SECONDS) == 0.0
+    assert len(limiter._windows[KEY]) == 1
+
+
+def test_wait_seconds_tokens_per_minute():
+    limiter = LlmRateLimiter()
+    config = {"tokens_per_minute": 1000}
+    limiter._windows[KEY] = deque([[100.0, 600], [110.0, 300]])
+
+    assert limiter._wait_seconds(KEY, config, 100, 120.0) == 0.0
+    # 200 tokens only fit once the 600 token entry expires
+    assert limiter._wait_seconds(KEY, config, 200, 120.0) == pytest.approx(100.0 + WINDOW_SECONDS - 120.0)
+    # 800 tokens need both entries gone
+    assert limiter._wait_seconds(KEY, config, 800, 120.0) == pytest.approx(110.0 + WINDOW_SECONDS - 120.0)
+    # A call larger than the whole budget runs alone instead of waiting forever
+    assert limiter._wait_seconds(KEY, config, 5000, 120.0) == pytest.approx(110.0 + WINDOW_SECONDS - 120.0)
+
+
+def test_wait_seconds_honors_blocked_deployment():
+    limiter = LlmRateLimiter()
+    limiter._blocked_until[KEY] = 130.0
+    assert limiter._wait_seconds(KEY, {}, 0, 120.0) == pytest.approx(10.0)
+    assert limiter._wait_seconds(KEY, {}, 0, 131.0) == 0.0
+
+
+def test_call_records_reported_usage(limiter_config):
+    limiter = LlmRateLimiter()
+
+    async def send():
+        return {"usage": {"total_tokens": 7}}
+
+    response_data = asyncio.run(limiter.call("test", "small", {"max_tokens": 1000}, send))
+
+    assert response_data == {"usage": {"total_tokens": 7}}
+    stats = limiter.stats()["deployments"]
+    assert stats == [{"provider": "test", "deployment": "small", "requests_last_minute": 1, "tokens_last_minute": 7, "blocked_seconds": 0.0}]
+
+
+def test_call_retries_429_after_retry_after(limiter_config):
+    limiter = LlmRateLimiter()
+    attempts = []
+
+    async def send():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise status_error(429, {"retry-after-ms": "50"})
+        return {"usage": {"total_tokens": 3}}
+
+    assert asyncio.run(limiter.call("test", "small", {}, send)) == {"usage": {"total_tokens": 3}}
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.05
+    # The refused call does not count against the token budget
+    assert [entry[1] for entry in limiter._windows[("test", "small")]] == [0, 3]
+
+
+def test_call_does_not_retry_client_errors(limiter_config):
+    limiter = LlmRateLimiter()
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        raise status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(limiter.call("test", "small", {}, send))
+    assert len(attempts) == 1
+
+
+def test_call_raises_after_max_retries(limiter_config):
+    limiter = LlmRateLimiter()
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        raise httpx.ConnectError("connection refused")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(limiter.call("test", "small", {}, send))
+    assert len(attempts) == limiter_config["max_retries"] + 1
+
+
+def test_call_uses_deployment_override(limiter_config):
+    limiter_config["deployments"] = {"small": {"max_retries": 0}}
+    limiter = LlmRateLimiter()
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        raise status_error(503)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(limiter.call("test", "small", {}, send))
+    assert len(attempts) == 1
+
+
+def test_azure_deployment_override_is_honored(monkeypatch):
+    from src.llm import azureopenai
+
+    azure_config = {**rate_limiter.LlmRateLimitConfig["MCP_CLIENT_AZURE_AI"], "max_retries": 3, "initial_backoff": 0, "max_backoff": 0,
+                    "deployments": {"gpt-4o": {"max_retries": 0, "tokens_per_minute": 100000}}}
+    monkeypatch.setitem(rate_limiter.LlmRateLimitConfig, "MCP_CLIENT_AZURE_AI", azure_config)
+    limiter = LlmRateLimiter()
+    monkeypatch.setattr(azureopenai, "LlmRateLimits", limiter)
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        return httpx.Response(503, json={"error": {"message": "overloaded"}})
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(azureopenai, "get_llm_http_client", lambda provider: http_client)
+
+    async def run(deployment_id):
+        try:
+            return await azureopenai.azure_openai_processor({
+                "api_key": "key", "endpoint": "https://example.openai.azure.com", "deployment_id": deployment_id,
+                "api_version": "2024-10-21", "chat_history": [{"role": "user", "content": "hi"}]
+            })
+        finally:
+            await http_client.aclose()
+
+    response = asyncio.run(run("gpt-4o"))
+    assert response.Status is False
+    # The override's max_retries 0 applies, not the provider's 3
+    assert attempts == ["/openai/deployments/gpt-4o/chat/completions"]
+    # Budgets stay per endpoint and deployment
+    assert [entry["deployment"] for entry in limiter.stats()["deployments"]] == ["https://example.openai.azure.com/gpt-4o"]
+
+    attempts.clear()
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    asyncio.run(run("gpt-35-turbo"))
+    assert len(attempts) == 4
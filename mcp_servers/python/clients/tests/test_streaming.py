@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.llm.streaming import merge_tool_call_delta, stream_chat_completion, stream_generate_content
+
+
+def sse_body(chunks, done=True):
+    lines = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+    if done:
+        lines.append("data: [DONE]\n\n")
+    return ": keep-alive\n\n" + "".join(lines)
+
+
+def run_stream(stream_function, body, status_code=200, on_text=None):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(status_code, text=body, headers={"content-type": "text/event-stream"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+            return await stream_function(http_client, "https://llm.test/v1/chat", {}, {"stream": True}, on_text)
+
+    return asyncio.run(run()), requests
+
+
+def test_merge_tool_call_delta_concatenates_fragments_per_index():
+    tool_calls = []
+    merge_tool_call_delta(tool_calls, {"index": 0, "id": "call_1", "type": "function", "function": {"name": "get_", "arguments": ""}})
+    merge_tool_call_delta(tool_calls, {"index": 1, "id": "call_2", "function": {"name": "list_calendars", "arguments": "{}"}})
+    merge_tool_call_delta(tool_calls, {"index": 0, "function": {"name": "email", "arguments": "{\"id\": "}})
+    merge_tool_call_delta(tool_calls, {"index": 0, "function": {"arguments": "\"42\"}"}})
+
+    assert tool_calls == [
+        {"id": "call_1", "type": "function", "function": {"name": "get_email", "arguments": "{\"id\": \"42\"}"}},
+        {"id": "call_2", "type": "function", "function": {"name": "list_calendars", "arguments": "{}"}}
+    ]
+
+
+def test_merge_tool_call_delta_without_index_appends():
+    tool_calls = []
+    merge_tool_call_delta(tool_calls, {"id": "a", "function": {"name": "one"}})
+    merge_tool_call_delta(tool_calls, {"id": "b", "function": {"name": "two"}})
+    assert [tool_call["id"] for tool_call in tool_calls] == ["a", "b"]
+
+
+def test_stream_chat_completion_assembles_text_and_usage():
+    text_deltas = []
+
+    async def on_text(text):
+        text_deltas.append(text)
+
+    body = sse_body([
+        {"id": "cmpl-1", "model": "gpt-4o", "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}}]},
+        {"id": "cmpl-1", "choices": [{"index": 0, "delta": {"content": "Hello"}}]},
+        {"id": "cmpl-1", "choices": [{"index": 0, "delta": {"content": " world"}, "finish_reason": "stop"}]},
+        {"id": "cmpl-1", "choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}}
+    ])
+    response_data, requests = run_stream(stream_chat_completion, body, on_text=on_text)
+
+    assert requests == [{"stream": True}]
+    assert text_deltas == ["Hello", " world"]
+    assert response_data["id"] == "cmpl-1"
+    assert response_data["model"] == "gpt-4o"
+    assert response_data["object"] == "chat.completion"
+    assert response_data["usage"]["total_tokens"] == 7
+    assert response_data["choices"] == [
+        {"index": 0, "message": {"role": "assistant", "content": "Hello world"}, "finish_reason": "stop"}
+    ]
+
+
+def test_stream_chat_completion_assembles_tool_calls():
+    body = sse_body([
+        {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "id": "call_1", "type": "function", "function": {"name": "query_gmail_emails", "arguments": ""}}]}}]},
+        {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": "{\"query\":"}}]}}]},
+        {"choices": [{"index": 0, "delta": {"tool_calls": [{"index": 0, "function": {"arguments": " \"is:unread\"}"}}]}}]},
+        {"choices": [{"index": 1, "delta": {"content": "ignored second choice"}}]},
+        {"choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]}
+    ])
+    response_data, _ = run_stream(stream_chat_completion, body)
+
+    choice = response_data["choices"][0]
+    assert choice["finish_reason"] == "tool_calls"
+    assert choice["message"]["content"] is None
+    assert choice["message"]["tool_calls"] == [
+        {"id": "call_1", "type": "function", "function": {"name": "query_gmail_emails", "arguments": "{\"query\": \"is:unread\"}"}}
+    ]
+    assert json.loads(choice["message"]["tool_calls"][0]["function"]["arguments"]) == {"query": "is:unread"}
+    assert response_data["usage"] == {}
+
+
+def test_stream_chat_completion_raises_with_readable_error_body():
+    body = json.dumps({"error": {"message": "bad request"}})
+    with pytest.raises(httpx.HTTPStatusError) as excinfo:
+        run_stream(stream_chat_completion, body, status_code=400)
+    assert excinfo.value.response.status_code == 400
+    assert excinfo.value.response.json()["error"]["message"] == "bad request"
+
+
+def test_stream_generate_content_merges_text_parts():
+    text_deltas = []
+
+    async def on_text(text):
+        text_deltas.append(text)
+
+    body = sse_body([
+        {"candidates": [{"content": {"role": "model", "parts": [{"text": "Your next "}]}}], "modelVersion": "gemini-2.0-flash"},
+        {"candidates": [{"content": {"role": "model", "parts": [{"text": "meeting is at 10"}]}}]},
+        {"candidates": [{"content": {"role": "model", "parts": [{"functionCall": {"name": "list_calendars", "args": {}}}]}, "finishReason": "STOP"}],
+         "usageMetadata": {"promptTokenCount": 12, "candidatesTokenCount": 8, "totalTokenCount": 20}}
+    ], done=False)
+    response_data, _ = run_stream(stream_generate_content, body, on_text=on_text)
+
+    assert text_deltas == ["Your next ", "meeting is at 10"]
+    assert response_data["modelVersion"] == "gemini-2.0-flash"
+    assert response_data["usageMetadata"]["totalTokenCount"] == 20
+    candidate = response_data["candidates"][0]
+    assert candidate["finishReason"] == "STOP"
+    assert candidate["content"]["parts"] == [
+        {"text": "Your next meeting is at 10"},
+        {"functionCall": {"name": "list_calendars", "args": {}}}
+    ]
+
+
+def test_stream_generate_content_without_parts_returns_empty_text():
+    body = sse_body([{"candidates": [{"finishReason": "SAFETY"}]}], done=False)
+    response_data, _ = run_stream(stream_generate_content, body)
+    assert response_data["candidates"][0]["content"]["parts"] == [{"text": ""}]
+    assert response_data["candidates"][0]["finishReason"] == "SAFETY"
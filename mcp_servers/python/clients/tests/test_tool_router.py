@@ -0,0 +1,141 @@
+import json
+import math
+import os
+
+import pytest
+
+from src import tool_router
+from src.tool_router import BM25Index, BM25ToolRouter, history_text, normalize_token, route_tools_locally, tokenize
+
+TOOLS_PATH = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "data", "gsuite_tools.json")
+
+
+@pytest.fixture(scope="module")
+def gsuite_tools():
+    with open(TOOLS_PATH) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def router_config():
+    return {
+        "min_confidence": 0.6,
+        "score_scale": 2.0,
+        "relative_cutoff": 0.6,
+        "max_selected_tools": 3,
+        "history_weight": 0.5,
+        "keyword_rules": {"MCP-GSUITE": [{"keywords": ["am i free"], "tools": ["check_calendar_availability"]}]}
+    }
+
+
+def test_normalize_token_strips_plural_and_verb_suffixes():
+    assert normalize_token("emails") == "email"
+    assert normalize_token("meeting") == "meet"
+    # Only one suffix is stripped, 'meetings' stays apart from the 'meet' in tool names
+    assert normalize_token("meetings") == "meeting"
+    assert normalize_token("scheduled") == "schedul"
+    assert normalize_token("schedule") == "schedul"
+    # Short words keep their suffix
+    assert normalize_token("bus") == "bus"
+
+
+def test_tokenize_lowercases_and_drops_stop_words():
+    assert tokenize("Please send the Emails to Bob!") == ["send", "email", "bob"]
+    assert tokenize("") == []
+    assert tokenize(None) == []
+
+
+def test_bm25_scores_prefer_matching_and_shorter_documents():
+    index = BM25Index([["email", "send"], ["calendar", "event", "list"], ["email", "draft", "create", "delete", "reply"]])
+
+    scores = index.scores(["email"])
+    assert scores[1] == 0.0
+    # Same term frequency, the shorter document scores higher
+    assert scores[0] > scores[2] > 0
+    # A term unique to one document outweighs a term shared by two
+    assert index.scores(["calendar"])[1] > scores[0]
+    assert index.scores(["unknown"]) == [0.0, 0.0, 0.0]
+
+
+def test_bm25_score_matches_formula():
+    index = BM25Index([["a", "b"], ["b", "c", "c"]], k1=1.5, b=0.75)
+    idf = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+    length_norm = 1 - 0.75 + 0.75 * 3 / 2.5
+    assert index.scores(["c"])[1] == pytest.approx(idf * 2 * 2.5 / (2 + 1.5 * length_norm))
+    # Repeated query terms count once
+    assert index.scores(["c", "c"]) == index.scores(["c"])
+
+
+def test_history_text_uses_previous_user_and_assistant_messages():
+    chat_history = [
+        {"role": "system", "content": "You are helpful"},
+        {"role": "user", "content": "draft a reply to Alice"},
+        {"role": "assistant", "content": "Should I create the gmail draft?"},
+        {"role": "tool", "content": "ignored"},
+        {"role": "user", "content": [{"type": "text", "text": "not a string"}]},
+        {"role": "user", "content": "yes go ahead"}
+    ]
+    assert history_text(chat_history, 2) == "draft a reply to Alice Should I create the gmail draft?"
+    assert history_text(chat_history, 1) == "Should I create the gmail draft?"
+    assert history_text(chat_history, 0) == ""
+    assert history_text(None, 2) == ""
+
+
+def test_route_selects_tools_by_name_and_description(router_config, gsuite_tools):
+    decision = BM25ToolRouter(router_config).route("list my calendars", gsuite_tools, "MCP-GSUITE")
+    assert decision["isFunctionCall"] is True
+    assert decision["selectedTools"][0] == "list_calendars"
+    assert len(decision["selectedTools"]) <= router_config["max_selected_tools"]
+    assert router_config["min_confidence"] <= decision["confidence"] < 1
+
+
+def test_route_returns_none_without_shared_terms(router_config, gsuite_tools):
+    router = BM25ToolRouter(router_config)
+    assert router.route("what is the weather like", gsuite_tools, "MCP-GSUITE") is None
+    assert router.route("", gsuite_tools, "MCP-GSUITE") is None
+    assert router.route("list my calendars", [], "MCP-GSUITE") is None
+
+
+def test_route_keyword_rule_is_confident(router_config, gsuite_tools):
+    decision = BM25ToolRouter(router_config).route("Am I free tomorrow afternoon?", gsuite_tools, "MCP-GSUITE")
+    assert decision["confidence"] == 1.0
+    assert decision["selectedTools"][0] == "check_calendar_availability"
+    # Rules are per server
+    assert BM25ToolRouter(router_config).route("Am I free tomorrow afternoon?", gsuite_tools, "OTHER") is None
+
+
+def test_route_follow_up_uses_history(router_config, gsuite_tools):
+    router = BM25ToolRouter(router_config)
+    assert router.route("yes go ahead", gsuite_tools, "MCP-GSUITE") is None
+
+    decision = router.route("yes go ahead", gsuite_tools, "MCP-GSUITE", history="Should I create a gmail draft for Alice?")
+    assert decision is not None
+    assert decision["selectedTools"][0] == "create_gmail_draft"
+
+
+def test_route_caches_index_per_tool_list(router_config, gsuite_tools):
+    router = BM25ToolRouter(router_config)
+    router.route("list my calendars", gsuite_tools, "MCP-GSUITE")
+    router.route("delete the draft", gsuite_tools, "MCP-GSUITE")
+    router.route("list my calendars", gsuite_tools[:5], "MCP-GSUITE")
+    assert len(router._indexes) == 2
+
+
+def test_route_tools_locally_defaults_to_llm_router(monkeypatch, gsuite_tools):
+    monkeypatch.setitem(tool_router.ToolRouterConfig, "router", "llm")
+    assert route_tools_locally("list my calendars", gsuite_tools, "MCP-GSUITE") is None
+
+    decision = route_tools_locally("list my calendars", gsuite_tools, "MCP-GSUITE", router_name="bm25")
+    assert decision["router"] == "bm25"
+    assert decision["route_time"] >= 0
+    assert decision["selectedTools"][0] == "list_calendars"
+
+
+def test_route_tools_locally_passes_chat_history(monkeypatch, gsuite_tools):
+    monkeypatch.setitem(tool_router.ToolRouterConfig, "history_messages", 1)
+    chat_history = [
+        {"role": "assistant", "content": "Should I create a gmail draft for Alice?"},
+        {"role": "user", "content": "yes go ahead"}
+    ]
+    decision = route_tools_locally("yes go ahead", gsuite_tools, "MCP-GSUITE", router_name="bm25", chat_history=chat_history)
+    assert decision["selectedTools"][0] == "create_gmail_draft"
@@ -0,0 +1,137 @@
+"""
+Build throughput and query latency of the local Gmail full-text index (message_store.MessageStore).
+
+Synthetic messages are indexed the way the sync does it: metadata in pages of 500 (full sync),
+then bodies one message at a time (get_gmail_email).
+
+Usage (from mcp_servers/python/servers/MCP-GSUITE/mcp-gsuite):
+    python benchmarks/local_search.py
+    python benchmarks/local_search.py --messages 100000 --body-fraction 0.2 --db /tmp/search.sqlite3
+"""
+import argparse
+import importlib.util
+import os
+import random
+import tempfile
+import time
+
+# Loaded by path, importing the mcp_gsuite package would start the MCP server dependencies
+MESSAGE_STORE_PATH = os.path.join(os.path.dirname(__file__), "..", "src", "mcp_gsuite", "message_store.py")
+spec = importlib.util.spec_from_file_location("message_store", MESSAGE_STORE_PATH)
+message_store = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(message_store)
+
+ACCOUNT = "benchmark:account"
+PAGE_SIZE = 500
+
+# Topic words the queries use, placed at increasing ranks of a Zipf vocabulary so that
+# query terms range from common to rare, like in a real mailbox
+WORDS = (
+    "invoice payment report quarterly budget meeting schedule project deadline review contract proposal "
+    "client order shipping delivery receipt account password security update release notes design draft "
+    "feedback interview offer travel flight hotel booking conference agenda minutes summary request approval "
+    "expense reimbursement team lunch holiday calendar reminder newsletter subscription webinar launch roadmap"
+).split()
+NAMES = "alice bob carol dave erin frank grace heidi ivan judy mallory niaj olivia peggy rupert sybil trent victor walter".split()
+VOCABULARY_SIZE = 20000
+
+
+def build_vocabulary(rng: random.Random) -> tuple:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = ["".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(VOCABULARY_SIZE)]
+    for index, word in enumerate(WORDS):
+        vocabulary[50 + index * 100] = word
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, VOCABULARY_SIZE + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    return vocabulary, cum_weights
+
+
+QUERIES = [
+    ("single term", "invoice", {}),
+    ("two terms", "quarterly budget", {}),
+    ("prefix", "reimb*", {}),
+    ("phrase", '"project deadline"', {}),
+    ("field filter", "from:alice subject:contract", {}),
+    ("date filter", "meeting", {"after_ms": 1_650_000_000_000, "before_ms": 1_660_000_000_000}),
+    ("newest first", "travel booking", {"newest_first": True}),
+]
+
+
+def make_message(rng: random.Random, vocabulary: tuple, index: int) -> tuple:
+    words, cum_weights = vocabulary
+
+    def text(length):
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=length))
+
+    sender = rng.choice(NAMES)
+    metadata = {
+        "id": f"{index:012x}",
+        "threadId": f"{index // 3:012x}",
+        "internalDate": str(1_600_000_000_000 + index * 600_000),
+        "labelIds": ["INBOX"] + (["UNREAD"] if rng.random() < 0.3 else []),
+        "subject": text(rng.randint(3, 8)).capitalize(),
+        "from": f"{sender.capitalize()} <{sender}@example.com>",
+        "to": f"{rng.choice(NAMES)}@example.com",
+        "snippet": text(20),
+    }
+    return metadata, text(rng.randint(50, 400))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(messages: int, body_fraction: float, repeat: int, db_path: str):
+    rng = random.Random(42)
+    vocabulary = build_vocabulary(rng)
+    store = message_store.MessageStore(db_path)
+
+    # Only the store calls are timed, not the generation of the synthetic text
+    metadata_seconds = 0.0
+    bodies = []
+    for page_start in range(0, messages, PAGE_SIZE):
+        page = [make_message(rng, vocabulary, index) for index in range(page_start, min(messages, page_start + PAGE_SIZE))]
+        start = time.perf_counter()
+        store.upsert_messages(ACCOUNT, [metadata for metadata, _ in page])
+        metadata_seconds += time.perf_counter() - start
+        bodies.extend((metadata, body) for metadata, body in page if rng.random() < body_fraction)
+
+    start = time.perf_counter()
+    for metadata, body in bodies:
+        store.set_full_message(ACCOUNT, metadata["id"], {"email": {**metadata, "body": body}, "attachments": {}})
+    body_seconds = time.perf_counter() - start
+
+    print(f"messages              : {messages} ({len(bodies)} with bodies)")
+    print(f"metadata index build  : {metadata_seconds:.2f} s ({messages / metadata_seconds:,.0f} messages/s)")
+    if bodies:
+        print(f"body index build      : {body_seconds:.2f} s ({len(bodies) / body_seconds:,.0f} bodies/s)")
+    print(f"database size         : {os.path.getsize(db_path) / 1e6:.1f} MB")
+    print()
+    print(f"{'query':14} {'hits':>5} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, text, options in QUERIES:
+        latencies = []
+        results = []
+        for _ in range(repeat):
+            query_start = time.perf_counter()
+            results = store.search(ACCOUNT, text, limit=20, **options)
+            latencies.append((time.perf_counter() - query_start) * 1000)
+        print(f"{name:14} {len(results):>5} {percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.99):>8.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--body-fraction", type=float, default=0.2, help="Share of messages whose body gets indexed")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--db", help="SQLite file to build, a temporary file by default")
+    args = parser.parse_args()
+
+    if args.db:
+        run(args.messages, args.body_fraction, args.repeat, args.db)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            run(args.messages, args.body_fraction, args.repeat, os.path.join(tmp_dir, "search.sqlite3"))
@@ -1,10 +1,167 @@
-from googleapiclient.discovery import build 
+from .service_cache import GoogleServiceCache
 from . import gauth
+from google.auth.exceptions import RefreshError
+import requests
 import logging
 import base64
+import binascii
+import codecs
+import hashlib
+import json
+import os
+import re
 import traceback
 from email.mime.text import MIMEText
-from typing import Tuple
+from typing import Iterator, Tuple
+
+# Gmail accepts up to 100 calls per batch but throttles large batches, 50 is the recommended size
+BATCH_SIZE = 50
+
+# Largest page messages().list returns
+MAX_PAGE_SIZE = 500
+
+# Parsed email fields served from the top level of a message resource
+MESSAGE_FIELDS = ['id', 'threadId', 'historyId', 'internalDate', 'sizeEstimate', 'labelIds', 'snippet']
+
+# Parsed email fields served from headers, with the header name requested through metadataHeaders
+HEADER_FIELDS = {
+    'subject': 'Subject',
+    'from': 'From',
+    'to': 'To',
+    'date': 'Date',
+    'cc': 'Cc',
+    'bcc': 'Bcc',
+    'message_id': 'Message-ID',
+    'in_reply_to': 'In-Reply-To',
+    'references': 'References',
+    'delivered_to': 'Delivered-To',
+}
+
+QUERY_FIELDS = MESSAGE_FIELDS + list(HEADER_FIELDS)
+
+
+def metadata_request_args(fields: list[str] | None = None) -> dict:
+    """
+    messages().get arguments for a metadata-only fetch of the given parsed email fields.
+    The body is never downloaded and the response is trimmed with a field mask.
+    """
+    fields = fields or QUERY_FIELDS
+    message_fields = ['id'] + [field for field in MESSAGE_FIELDS if field in fields and field != 'id']
+    headers = [header for field, header in HEADER_FIELDS.items() if field in fields]
+    if headers:
+        message_fields.append('payload/headers')
+    return {
+        'format': 'metadata',
+        'metadataHeaders': headers,
+        'fields': ','.join(message_fields),
+    }
+
+
+# Bytes read from the socket per step when saving attachments
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+
+ATTACHMENT_URL = "https://gmail.googleapis.com/gmail/v1/users/me/messages/{message_id}/attachments/{attachment_id}"
+
+
+class Base64UrlDecoder():
+    """
+    Incremental urlsafe base64 (padded or not) decoder into a binary file object.
+    Text is decoded in multiples of 4 characters as it is fed, so memory stays flat.
+    """
+
+    def __init__(self, out, sha256: bool = False):
+        self.out = out
+        self.digest = hashlib.sha256() if sha256 else None
+        self.written = 0
+        self._pending = ''
+
+    def _decode(self, chunk: str):
+        decoded = base64.b64decode(chunk, altchars=b'-_', validate=True)
+        self.out.write(decoded)
+        if self.digest:
+            self.digest.update(decoded)
+        self.written += len(decoded)
+
+    def feed(self, text: str):
+        text = self._pending + text
+        whole = len(text) - len(text) % 4
+        if whole:
+            self._decode(text[:whole])
+        self._pending = text[whole:]
+
+    def close(self) -> Tuple[int, str | None]:
+        """
+        Returns:
+            Tuple[int, str | None]: Bytes written and the SHA-256 hex digest of them, if requested
+
+        Raises:
+            binascii.Error: If the data is not valid base64
+        """
+        if self._pending:
+            self._decode(self._pending + '=' * (-len(self._pending) % 4))
+            self._pending = ''
+        return self.written, self.digest.hexdigest() if self.digest else None
+
+
+def iter_json_string_value(chunks: Iterator[bytes], key: str) -> Iterator[str]:
+    """
+    Yield the value of a string member of a streamed JSON object piece by piece, without
+    buffering the document. Meant for values without escapes, such as base64 data.
+
+    Raises:
+        ValueError: If the member is missing or its value is not closed
+    """
+    pattern = re.compile(r'"' + re.escape(key) + r'"\s*:\s*"')
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+
+    # Find the opening quote of the value, keeping a short tail for a key split across chunks
+    buffer = ''
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        match = pattern.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        buffer = buffer[-256:]
+    else:
+        raise ValueError(f"No {key} string in the response")
+
+    while True:
+        end = buffer.find('"')
+        if end >= 0:
+            if end:
+                yield buffer[:end]
+            return
+        if buffer:
+            yield buffer
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError(f"Unterminated {key} string in the response")
+        buffer = decoder.decode(chunk)
+
+
+def encode_cursor(query: str, page_token: str | None, offset: int, page_size: int) -> str:
+    """Opaque continuation cursor: the listing page to resume from and the position within it"""
+    state = {'query': query, 'page_token': page_token, 'offset': offset, 'page_size': page_size}
+    return base64.urlsafe_b64encode(json.dumps(state).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return {
+            'query': str(state['query']),
+            'page_token': state['page_token'],
+            'offset': int(state['offset']),
+            'page_size': int(state['page_size']),
+        }
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 
 class GmailService():
@@ -15,8 +172,9 @@ class GmailService():
         Args:
             credentials: Google OAuth2 credentials object
         """
-        authorized_credentials = gauth.authorize_credentials(credentials)
-        self.service = build('gmail', 'v1', credentials=authorized_credentials)
+        # Warm calls reuse the authorized credentials and built service
+        self.service = GoogleServiceCache.get_service(credentials, 'gmail', 'v1')
+        self.credentials = credentials
 
     def _parse_message(self, txt, parse_body=False) -> dict | None:
         """
@@ -126,48 +284,165 @@ class GmailService():
             logging.error(f"Error extracting body: {str(e)}")
             return None
 
-    def query_emails(self, query=None, max_results=100):
+    def _batch_get_messages(self, message_ids: list[str], errors: dict | None = None, **get_args) -> dict:
         """
-        Query emails from Gmail based on a search query.
+        Fetch many messages with the Gmail batch endpoint, BATCH_SIZE calls per HTTP request.
         
         Args:
-            query (str, optional): Gmail search query (e.g., 'is:unread', 'from:example@gmail.com')
-                                If None, returns all emails
-            max_results (int): Maximum number of emails to retrieve (1-500, default: 100)
+            message_ids (list): Gmail message IDs to retrieve
+            errors (dict, optional): Filled with message ID to exception for the failed batch items
+            **get_args: Extra arguments for messages().get, e.g. format
         
         Returns:
-            list: List of parsed email messages, newest first
+            dict: Message ID to raw message, failed messages are logged and left out
         """
-        try:
-            # Ensure max_results is within API limits
-            max_results = min(max(1, max_results), 500)
-            
-            # Get the list of messages
-            result = self.service.users().messages().list(
-                userId='me',
-                maxResults=max_results,
-                q=query if query else ''
-            ).execute()
+        fetched = {}
+        unique_ids = list(dict.fromkeys(message_ids))
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logging.error(f"Error retrieving email {request_id}: {str(exception)}")
+                if errors is not None:
+                    errors[request_id] = exception
+                return
+            fetched[request_id] = response
+
+        for start in range(0, len(unique_ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for message_id in unique_ids[start:start + BATCH_SIZE]:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=message_id, **get_args),
+                    request_id=message_id
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                logging.error(f"Error executing Gmail batch request: {str(e)}")
+                logging.error(traceback.format_exc())
+
+        return fetched
+
+    def _extract_attachments(self, message: dict) -> dict:
+        attachments = {}
+        for part in message.get("payload", {}).get("parts", []):
+            if "attachmentId" in part.get("body", {}):
+                attachment_id = part["body"]["attachmentId"]
+                part_id = part["partId"]
+                attachment = {
+                    "filename": part.get("filename", ""),
+                    "mimeType": part.get("mimeType", ""),
+                    "attachmentId": attachment_id,
+                    "partId": part_id
+                }
+                attachments[part_id] = attachment
+        return attachments
+
+    def iter_emails(self, query=None, fields: list[str] | None = None, page_size: int = 100, cursor: str | None = None) -> Iterator[Tuple[dict, str | None]]:
+        """
+        Lazily page through the emails matching a query, newest first.
+        Follows nextPageToken on demand and fetches metadata BATCH_SIZE messages at a time,
+        so a caller stopping early does not pay for the rest of the listing page.
+        
+        Args:
+            query (str, optional): Gmail search query, ignored when resuming from a cursor
+            fields (list, optional): Parsed fields to return, see QUERY_FIELDS (default: all)
+            page_size (int): Messages per listing page (1-500, default: 100)
+            cursor (str, optional): Cursor yielded by a previous iteration to resume after
+        
+        Yields:
+            Tuple[dict, str | None]: Parsed email and the cursor resuming after it, None after the last email
+        """
+        if cursor:
+            state = decode_cursor(cursor)
+        else:
+            state = {'query': query or '', 'page_token': None, 'offset': 0, 'page_size': min(max(1, page_size), MAX_PAGE_SIZE)}
+        query, page_token, offset, page_size = state['query'], state['page_token'], state['offset'], state['page_size']
+        get_args = metadata_request_args(fields)
+
+        while True:
+            list_args = {'userId': 'me', 'maxResults': page_size, 'q': query}
+            if page_token:
+                list_args['pageToken'] = page_token
+            result = self.service.users().messages().list(**list_args).execute()
 
             messages = result.get('messages', [])
-            parsed = []
+            next_page_token = result.get('nextPageToken')
 
-            # Fetch full message details for each message
-            for msg in messages:
-                txt = self.service.users().messages().get(
-                    userId='me', 
-                    id=msg['id']
-                ).execute()
+            fetched = {}
+            for position in range(offset, len(messages)):
+                if (position - offset) % BATCH_SIZE == 0:
+                    # Headers only, one batch request per BATCH_SIZE messages as the caller advances
+                    fetched = self._batch_get_messages([msg['id'] for msg in messages[position:position + BATCH_SIZE]], **get_args)
+                txt = fetched.get(messages[position]['id'])
+                if txt is None:
+                    continue
                 parsed_message = self._parse_message(txt=txt, parse_body=False)
-                if parsed_message:
-                    parsed.append(parsed_message)
-                    
-            return parsed
-            
+                if not parsed_message:
+                    continue
+                if fields:
+                    parsed_message = {key: value for key, value in parsed_message.items() if key in fields or key == 'id'}
+
+                if position + 1 < len(messages):
+                    next_cursor = encode_cursor(query, page_token, position + 1, page_size)
+                elif next_page_token:
+                    next_cursor = encode_cursor(query, next_page_token, 0, page_size)
+                else:
+                    next_cursor = None
+                yield parsed_message, next_cursor
+
+            if not next_page_token:
+                return
+            page_token, offset = next_page_token, 0
+
+    def query_emails_page(self, query=None, max_results=100, fields: list[str] | None = None, cursor: str | None = None) -> Tuple[list, str | None]:
+        """
+        Query up to max_results emails and return a cursor to continue the listing.
+        
+        Args:
+            query (str, optional): Gmail search query (e.g., 'is:unread', 'from:example@gmail.com')
+                                If None, returns all emails. Ignored when resuming from a cursor
+            max_results (int): Maximum number of emails to retrieve (default: 100)
+            fields (list, optional): Parsed fields to return, see QUERY_FIELDS (default: all)
+            cursor (str, optional): next_cursor of a previous call
+        
+        Returns:
+            Tuple[list, str | None]: Parsed email messages, newest first, and the cursor for the next call,
+                                     None when there are no more emails
+        """
+        max_results = max(1, max_results)
+        parsed = []
+        next_cursor = None
+        try:
+            for parsed_message, next_cursor in self.iter_emails(query=query, fields=fields, page_size=min(max_results, MAX_PAGE_SIZE), cursor=cursor):
+                parsed.append(parsed_message)
+                if len(parsed) >= max_results:
+                    break
+            else:
+                next_cursor = None
+
+            return parsed, next_cursor
+
         except Exception as e:
             logging.error(f"Error reading emails: {str(e)}")
             logging.error(traceback.format_exc())
-            return []
+            # Keep what was read, the cursor resumes after the last email returned
+            return parsed, next_cursor if parsed else None
+
+    def query_emails(self, query=None, max_results=100, fields: list[str] | None = None):
+        """
+        Query emails from Gmail based on a search query.
+        
+        Args:
+            query (str, optional): Gmail search query (e.g., 'is:unread', 'from:example@gmail.com')
+                                If None, returns all emails
+            max_results (int): Maximum number of emails to retrieve (default: 100)
+            fields (list, optional): Parsed fields to return, see QUERY_FIELDS (default: all)
+        
+        Returns:
+            list: List of parsed email messages, newest first
+        """
+        emails, _ = self.query_emails_page(query=query, max_results=max_results, fields=fields)
+        return emails
         
     def get_email_by_id_with_attachments(self, email_id: str) -> Tuple[dict, dict] | Tuple[None, dict]:
         """
@@ -193,26 +468,54 @@ class GmailService():
             if parsed_email is None:
                 return None, []
 
-            attachments = {}
-            for part in message["payload"]["parts"]:
-                if "attachmentId" in part["body"]:
-                    attachment_id = part["body"]["attachmentId"]
-                    part_id = part["partId"]
-                    attachment = {
-                        "filename": part["filename"],
-                        "mimeType": part["mimeType"],
-                        "attachmentId": attachment_id,
-                        "partId": part_id
-                    }
-                    attachments[part_id] = attachment
-
-
-            return parsed_email, attachments
+            return parsed_email, self._extract_attachments(message)
             
         except Exception as e:
             logging.error(f"Error retrieving email {email_id}: {str(e)}")
             logging.error(traceback.format_exc())
             return None, []
+
+    def get_attachments_by_message_ids(self, message_ids: list[str]) -> dict:
+        """
+        Attachment IDs of many messages, fetched in batches with a parts-only field mask
+        (no body, headers or attachment data is downloaded).
+        
+        Args:
+            message_ids (list): Gmail message IDs
+        
+        Returns:
+            dict: Message ID to {part ID: attachment}, messages that failed are left out
+        """
+        fetched = self._batch_get_messages(
+            message_ids,
+            format='full',
+            fields='id,payload/parts(partId,filename,mimeType,body/attachmentId)'
+        )
+        return {message_id: self._extract_attachments(message) for message_id, message in fetched.items()}
+
+    def get_emails_by_ids_with_attachments(self, email_ids: list[str]) -> list[Tuple[dict, dict]]:
+        """
+        Batched version of get_email_by_id_with_attachments.
+        
+        Args:
+            email_ids (list): Gmail message IDs to retrieve
+        
+        Returns:
+            list: (parsed email, attachments) tuples in the order of email_ids, failed emails are skipped
+        """
+        fetched = self._batch_get_messages(email_ids)
+        results = []
+        for email_id in email_ids:
+            message = fetched.get(email_id)
+            if message is None:
+                continue
+            try:
+                parsed_email = self._parse_message(txt=message, parse_body=True)
+                if parsed_email is not None:
+                    results.append((parsed_email, self._extract_attachments(message)))
+            except Exception as e:
+                logging.error(f"Error parsing email {email_id}: {str(e)}")
+        return results
         
     def get_email_by_id(self, email_id: str) -> dict | None: 
         """
@@ -417,6 +720,52 @@ class GmailService():
             logging.error(traceback.format_exc())
             return None
 
+    def save_attachment(self, message_id: str, attachment_id: str, save_path: str, sha256: bool = False) -> dict | None:
+        """
+        Stream a Gmail attachment to disk, decoding the base64 data as it arrives from the socket,
+        so memory use does not grow with the attachment size. The discovery client parses whole
+        responses, so the download goes through an authorized requests session instead.
+        The file is written next to save_path and renamed into place once complete.
+        
+        Args:
+            message_id (str): The ID of the Gmail message containing the attachment
+            attachment_id (str): The ID of the attachment to retrieve
+            save_path (str): Path to write the decoded attachment to
+            sha256 (bool): Whether to compute the SHA-256 of the content in the same pass
+        
+        Returns:
+            dict: Saved path, size in bytes and sha256 (None unless requested)
+            None: If retrieval fails
+        
+        Raises:
+            OSError, binascii.Error: If the attachment cannot be written or decoded
+        """
+        url = ATTACHMENT_URL.format(message_id=message_id, attachment_id=attachment_id)
+        partial_path = f"{save_path}.part"
+        try:
+            # Cached per credential and thread, consecutive downloads reuse its connections
+            session = GoogleServiceCache.get_session(self.credentials)
+            with session.get(url, params={'fields': 'data', 'prettyPrint': 'false'}, stream=True) as response:
+                if response.status_code >= 400:
+                    logging.error(f"Error retrieving attachment {attachment_id} from message {message_id}: HTTP {response.status_code} {response.text[:500]}")
+                    return None
+                with open(partial_path, "wb") as f:
+                    decoder = Base64UrlDecoder(f, sha256=sha256)
+                    for text in iter_json_string_value(response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES), 'data'):
+                        decoder.feed(text)
+                    size, digest = decoder.close()
+            os.replace(partial_path, save_path)
+        except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            # Bad base64 (a ValueError too) and write failures are raised, download failures return None
+            if isinstance(e, binascii.Error) or not isinstance(e, (requests.RequestException, RefreshError, ValueError)):
+                raise
+            logging.error(f"Error retrieving attachment {attachment_id} from message {message_id}: {str(e)}")
+            logging.error(traceback.format_exc())
+            return None
+        return {"path": save_path, "size": size, "sha256": digest}
+
     def send_email(self, to: str, subject: str, body: str, cc: list[str] | None = None, is_html: bool = False) -> dict | None:
         """
         Directly sends an email message.
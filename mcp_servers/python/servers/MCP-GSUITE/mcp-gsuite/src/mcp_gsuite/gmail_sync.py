@@ -0,0 +1,404 @@
+from googleapiclient.errors import HttpError
+from . import gmail
+from .message_store import MessageStore
+from .service_cache import credential_key
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import argparse
+from datetime import datetime, timezone
+import logging
+import threading
+import time
+import traceback
+from typing import Iterator, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Most recent messages stored by a full sync, older messages are always queried from the API
+FULL_SYNC_MAX_MESSAGES = 5000
+
+# Repeat queries within this window are served without asking Gmail for changes
+SYNC_MIN_INTERVAL_SECONDS = 10
+
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+# Attempts at fetching messages whose batch items failed, e.g. with a per-user 429, and the first backoff
+FETCH_ATTEMPTS = 4
+FETCH_BACKOFF_SECONDS = 2
+
+# Query terms the store can answer, as (label, must_have)
+QUERY_LABELS = {
+    'in:inbox': ('INBOX', True),
+    'label:inbox': ('INBOX', True),
+    'is:unread': ('UNREAD', True),
+    'label:unread': ('UNREAD', True),
+    'is:read': ('UNREAD', False),
+    'is:starred': ('STARRED', True),
+    'is:important': ('IMPORTANT', True),
+    'in:sent': ('SENT', True),
+}
+
+def get_sync_store_file() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sync-store",
+        type=str,
+        default="",
+        help="SQLite file for the local Gmail message store (holds message metadata and bodies unencrypted), "
+             "disabled by default",
+    )
+    args, _ = parser.parse_known_args()
+    return args.sync_store
+
+
+def account_key(credentials: dict) -> str:
+    client_id, token_hash = credential_key(credentials)
+    return f"{client_id}:{token_hash}"
+
+
+def date_to_ms(value: str) -> int:
+    """Epoch milliseconds of an ISO date or datetime, naive values are taken as UTC"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def fetch_messages(gmail_service: gmail.GmailService, message_ids: list) -> Tuple[list, list]:
+    """
+    Metadata of message_ids, retrying failed batch items with exponential backoff.
+    Messages deleted since they were listed (404) count as fetched.
+
+    Returns:
+        Tuple[list, list]: Parsed messages and the IDs that still failed
+    """
+    fetched = {}
+    gone = set()
+    missing = list(dict.fromkeys(message_ids))
+    for attempt in range(FETCH_ATTEMPTS):
+        if attempt:
+            time.sleep(FETCH_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            logging.info(f"Retrying {len(missing)} Gmail messages that failed to fetch (attempt {attempt + 1}/{FETCH_ATTEMPTS})")
+        errors = {}
+        fetched.update(gmail_service._batch_get_messages(missing, errors=errors, **gmail.metadata_request_args()))
+        gone.update(
+            message_id for message_id, error in errors.items()
+            if isinstance(error, HttpError) and error.resp.status == 404
+        )
+        missing = [message_id for message_id in missing if message_id not in fetched and message_id not in gone]
+        if not missing:
+            break
+
+    parsed = [gmail_service._parse_message(txt=fetched[message_id], parse_body=False) for message_id in message_ids if message_id in fetched]
+    return [message for message in parsed if message], missing
+
+
+def query_label_filters(query: str | None) -> list | None:
+    """Label filters equivalent to a Gmail query, None when the query needs the API"""
+    filters = []
+    for term in (query or '').lower().split():
+        if term not in QUERY_LABELS:
+            return None
+        filters.append(QUERY_LABELS[term])
+    return filters
+
+
+class GmailSync():
+    """
+    Incremental, historyId based sync of message metadata into a MessageStore.
+
+    The first sync lists the newest FULL_SYNC_MAX_MESSAGES messages. It runs on a background thread,
+    tool calls are answered from the API until it is done. Later syncs apply only the changes from
+    users.history.list, and fall back to a full sync on the background thread when the history id expired. An account whose
+    sync could not fetch every message keeps its previous history id and is not served from the store.
+
+    Syncs of one store are serialized across processes with a lock file next to it, so gateway
+    workers and replicas can share the file.
+    """
+
+    def __init__(self, store: MessageStore):
+        self.store = store
+        self._account_locks = {}
+        self._locks_lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gmail-sync")
+        self._pending = set()
+        self._lock_path = store.path + ".lock" if fcntl and store.path != ":memory:" else None
+
+    def _account_lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._account_locks.setdefault(key, threading.Lock())
+
+    @contextmanager
+    def _sync_lock(self, key: str, blocking: bool) -> Iterator[bool]:
+        """Hold the account lock of this process and the store lock file, yields False when busy and not blocking"""
+        lock = self._account_lock(key)
+        if not lock.acquire(blocking=blocking):
+            yield False
+            return
+        try:
+            if self._lock_path is None or fcntl is None:
+                yield True
+                return
+            # A descriptor per sync, flock() locks held through one descriptor do not exclude each other
+            with open(self._lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+                yield True
+        finally:
+            lock.release()
+
+    def is_synced(self, credentials: dict) -> bool:
+        """Whether the account finished a full sync that fetched every listed message"""
+        account = self.store.get_account(account_key(credentials))
+        return bool(account and account['history_id'])
+
+    def sync_in_background(self, credentials: dict):
+        """Queue a sync of the account on the background thread, unless one is already queued"""
+        key = account_key(credentials)
+        with self._locks_lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+
+        def run():
+            try:
+                # Services are cached per thread, this one is built for the sync thread
+                self.sync(gmail.GmailService(credentials=credentials), credentials)
+            except Exception as e:
+                logging.error(f"Error syncing Gmail account in the background: {str(e)}")
+                logging.error(traceback.format_exc())
+            finally:
+                with self._locks_lock:
+                    self._pending.discard(key)
+
+        self._background.submit(run)
+
+    def sync(self, gmail_service: gmail.GmailService, credentials: dict, force: bool = False, blocking: bool = True) -> dict | None:
+        """
+        Bring the store up to date for the account of credentials.
+        With blocking False (the tool call path) the call never waits on a lock and never runs a
+        full sync: that is queued on the background thread and the caller uses the API meanwhile.
+
+        Returns:
+            dict: Account sync state (history_id, complete, synced_at)
+            None: If blocking is False and another thread or process is syncing the store,
+                  or a full sync had to be queued
+        """
+        key = account_key(credentials)
+        with self._sync_lock(key, blocking) as acquired:
+            if not acquired:
+                return None
+            account = self.store.get_account(key)
+            if account and not force and time.time() - account['synced_at'] < SYNC_MIN_INTERVAL_SECONDS:
+                return account
+            if account and account['history_id']:
+                try:
+                    self._apply_history(gmail_service, key, account['history_id'])
+                    return self.store.get_account(key)
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    logging.info(f"History id {account['history_id']} expired, running a full Gmail sync")
+                    # Changes since then are unknown, nothing is served from the store until the full sync
+                    self.store.clear_account(key)
+            if not blocking:
+                self.sync_in_background(credentials)
+                return None
+            self.full_sync(gmail_service, key)
+            return self.store.get_account(key)
+
+    def full_sync(self, gmail_service: gmail.GmailService, key: str):
+        # Take the history id first, changes made while listing are replayed by the next sync
+        profile = gmail_service.service.users().getProfile(userId='me').execute()
+        self.store.clear_account(key)
+
+        listed = 0
+        stored = 0
+        capped = False
+        failed = []
+        page_token = None
+        while True:
+            list_args = {'userId': 'me', 'maxResults': gmail.MAX_PAGE_SIZE}
+            if page_token:
+                list_args['pageToken'] = page_token
+            result = gmail_service.service.users().messages().list(**list_args).execute()
+
+            message_ids = [message['id'] for message in result.get('messages', [])]
+            if listed + len(message_ids) > FULL_SYNC_MAX_MESSAGES:
+                message_ids = message_ids[:FULL_SYNC_MAX_MESSAGES - listed]
+                capped = True
+            listed += len(message_ids)
+            messages, missing = fetch_messages(gmail_service, message_ids)
+            self.store.upsert_messages(key, messages)
+            stored += len(messages)
+            failed.extend(missing)
+
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+            if capped or listed >= FULL_SYNC_MAX_MESSAGES:
+                capped = True
+                break
+
+        if failed:
+            # No history id: the store is not served and the next sync starts over
+            self.store.set_account(key, None, complete=False)
+            logging.error(f"Full Gmail sync stored {stored} messages, {len(failed)} could not be fetched")
+            return
+        self.store.set_account(key, profile['historyId'], complete=not capped)
+        logging.info(f"Full Gmail sync stored {stored} messages")
+
+    def _apply_history(self, gmail_service: gmail.GmailService, key: str, start_history_id: str):
+        added = set()
+        deleted = set()
+        labels_by_id = {}
+        latest_history_id = start_history_id
+        page_token = None
+
+        while True:
+            list_args = {'userId': 'me', 'startHistoryId': start_history_id, 'historyTypes': HISTORY_TYPES}
+            if page_token:
+                list_args['pageToken'] = page_token
+            result = gmail_service.service.users().history().list(**list_args).execute()
+
+            for record in result.get('history', []):
+                for change in record.get('messagesAdded', []):
+                    added.add(change['message']['id'])
+                    deleted.discard(change['message']['id'])
+                for change in record.get('messagesDeleted', []):
+                    deleted.add(change['message']['id'])
+                    added.discard(change['message']['id'])
+                    labels_by_id.pop(change['message']['id'], None)
+                for change in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+                    labels_by_id[change['message']['id']] = change['message'].get('labelIds', [])
+
+            latest_history_id = result.get('historyId', latest_history_id)
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+
+        missing = []
+        if added:
+            messages, missing = fetch_messages(gmail_service, list(added))
+            self.store.upsert_messages(key, messages)
+        self.store.update_labels(key, {message_id: labels for message_id, labels in labels_by_id.items() if message_id not in added})
+        self.store.delete_messages(key, list(deleted))
+        if missing:
+            # The applied changes are idempotent, the next sync replays them from the same history id
+            logging.error(f"Gmail sync could not fetch {len(missing)} added messages, keeping history id {start_history_id}")
+            return
+        self.store.set_account(key, latest_history_id)
+        logging.info(f"Gmail sync applied {len(added)} added, {len(deleted)} deleted, {len(labels_by_id)} relabelled messages")
+
+    def query_emails(self, gmail_service: gmail.GmailService, credentials: dict, query: str | None,
+                     max_results: int, fields: list[str] | None = None) -> Tuple[list, str | None] | None:
+        """
+        Serve query_emails_page from the store.
+
+        Returns:
+            Tuple[list, str | None]: Emails and the API cursor to continue the listing
+            None: If the store cannot answer the query and the API has to be used
+        """
+        label_filters = query_label_filters(query)
+        if label_filters is None or max_results >= gmail.MAX_PAGE_SIZE:
+            return None
+
+        if not self.is_synced(credentials):
+            self.sync_in_background(credentials)
+            return None
+        # A sync running elsewhere could take long, the API answers meanwhile
+        account = self.sync(gmail_service, credentials, blocking=False)
+        if account is None or not account['history_id']:
+            return None
+        emails = self.store.query(account_key(credentials), label_filters, max_results + 1)
+        # A capped store only holds the newest messages, it can answer when it has enough of them
+        if not account['complete'] and len(emails) <= max_results:
+            return None
+
+        next_cursor = None
+        if len(emails) > max_results:
+            emails = emails[:max_results]
+            # Pages of max_results, so the API resumes with the second page and fetches only that
+            next_cursor = gmail.encode_cursor(query or '', None, max_results, max_results)
+        if fields:
+            emails = [{key: value for key, value in email.items() if key in fields or key == 'id'} for email in emails]
+        return emails, next_cursor
+
+    def get_email(self, gmail_service: gmail.GmailService, credentials: dict, email_id: str) -> Tuple[dict | None, dict]:
+        """
+        get_email_by_id_with_attachments, with bodies of synced messages kept in the store.
+        Nothing is synced inline, labels of a stored body are as current as the last sync.
+        """
+        key = account_key(credentials)
+        if not self.is_synced(credentials):
+            self.sync_in_background(credentials)
+            return gmail_service.get_email_by_id_with_attachments(email_id)
+        account = self.store.get_account(key)
+        # None when a concurrent full sync cleared the account since is_synced
+        if account is None or time.time() - account['synced_at'] >= SYNC_MIN_INTERVAL_SECONDS:
+            self.sync_in_background(credentials)
+
+        stored = self.store.get_message(key, email_id)
+        if stored and stored['full_message']:
+            email = dict(stored['full_message']['email'])
+            # Bodies never change, labels are kept current by the sync
+            email['labelIds'] = stored['metadata'].get('labelIds', [])
+            return email, stored['full_message']['attachments']
+
+        email, attachments = gmail_service.get_email_by_id_with_attachments(email_id)
+        # Only messages tracked by the sync are cached, anything else could go stale
+        if email is not None and stored is not None:
+            self.store.set_full_message(key, email_id, {'email': email, 'attachments': attachments})
+        return email, attachments
+
+    def search(self, gmail_service: gmail.GmailService, credentials: dict, text: str, after: str | None = None,
+               before: str | None = None, max_results: int = 20, newest_first: bool = False) -> list:
+        """
+        Ranked full-text search over the synced messages of the account, see message_store.fts_query.
+        Bodies are indexed once a message has been read with get_gmail_email.
+
+        Raises:
+            RuntimeError: If the first sync of the account has not finished yet
+        """
+        syncing_error = "The local Gmail store is still being synced for this account, retry in a few minutes or use query_gmail_emails"
+        if not self.is_synced(credentials):
+            self.sync_in_background(credentials)
+            raise RuntimeError(syncing_error)
+        self.sync(gmail_service, credentials, blocking=False)
+        if not self.is_synced(credentials):
+            # The history id expired and a full sync was queued
+            raise RuntimeError(syncing_error)
+        return self.store.search(
+            account_key(credentials), text,
+            after_ms=date_to_ms(after) if after else None,
+            before_ms=date_to_ms(before) if before else None,
+            limit=max_results,
+            newest_first=newest_first
+        )
+
+
+_sync_lock = threading.Lock()
+_sync = None
+
+
+def get_gmail_sync() -> GmailSync | None:
+    """Shared GmailSync, None when the local store is disabled or cannot be opened"""
+    global _sync
+    with _sync_lock:
+        if _sync is None:
+            path = get_sync_store_file()
+            if not path:
+                return None
+            try:
+                _sync = GmailSync(MessageStore(path))
+            except Exception as e:
+                logging.error(f"Error opening Gmail sync store {path}: {str(e)}")
+                logging.error(traceback.format_exc())
+                return None
+        return _sync
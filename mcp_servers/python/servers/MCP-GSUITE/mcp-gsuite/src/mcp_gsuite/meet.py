@@ -1,4 +1,4 @@
-from googleapiclient.discovery import build
+from .service_cache import GoogleServiceCache
 from . import gauth
 import logging
 import traceback
@@ -13,8 +13,8 @@ class MeetService():
         Args:
             credentials: Google OAuth2 credentials object
         """
-        authorized_credentials = gauth.authorize_credentials(credentials)
-        self.service = build('calendar', 'v3', credentials=authorized_credentials)
+        # Warm calls reuse the authorized credentials and built service
+        self.service = GoogleServiceCache.get_service(credentials, 'calendar', 'v3')
 
     def create_meeting(self, summary: str, start_time: str, end_time: str,
                       description: str | None = None,
@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account_key TEXT PRIMARY KEY,
+    history_id TEXT,
+    complete INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    account_key TEXT NOT NULL,
+    id TEXT NOT NULL,
+    internal_date INTEGER,
+    labels TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    full_message TEXT,
+    PRIMARY KEY (account_key, id)
+);
+CREATE INDEX IF NOT EXISTS messages_by_date ON messages (account_key, internal_date DESC);
+"""
+
+# Full-text index, one row per messages row (same rowid). Prefix indexes keep 'term*' queries fast
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, recipients, snippet, body,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+"""
+
+# bm25 column weights, in messages_fts column order
+FTS_WEIGHTS = (10.0, 5.0, 3.0, 2.0, 1.0)
+
+# Longest body text indexed per message
+MAX_INDEXED_BODY_CHARS = 100000
+
+# Column filters accepted in search queries, e.g. 'from:alice subject:invoice*'
+SEARCH_COLUMNS = {
+    'subject': 'subject',
+    'from': 'sender',
+    'to': 'recipients',
+    'snippet': 'snippet',
+    'body': 'body',
+}
+
+SEARCH_TERM_PATTERN = re.compile(r'(?:(\w+):)?("[^"]*"\*?|\S+)')
+
+
+def labels_column(label_ids: list) -> str:
+    # Delimited on both sides so a label can be matched with LIKE '%,LABEL,%'
+    return "," + ",".join(label_ids or []) + ","
+
+
+def fts_query(text: str) -> str:
+    """
+    Translate a search string into an FTS5 query. Terms are ANDed, 'term*' is a prefix search,
+    "quoted words" a phrase and 'from:', 'to:', 'subject:', 'snippet:', 'body:' restrict a term to a field.
+    """
+    expressions = []
+    for column, term in SEARCH_TERM_PATTERN.findall(text or ''):
+        prefix = term.endswith('*')
+        term = term.rstrip('*').strip('"').replace('"', '""')
+        if column and column.lower() not in SEARCH_COLUMNS:
+            term = f"{column} {term}"
+            column = ''
+        if not term.strip():
+            continue
+        expression = f'"{term}"' + ('*' if prefix else '')
+        if column:
+            expression = f"{SEARCH_COLUMNS[column.lower()]} : {expression}"
+        expressions.append(expression)
+    return " AND ".join(expressions)
+
+
+class MessageStore():
+    """SQLite store of parsed message metadata, sync state and full-text index, per account"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            # Mailbox contents, readable by the owner only. SQLite gives the -wal and -shm files the same mode
+            os.chmod(path, 0o600)
+        # The store is a cache of Gmail, a lost last transaction on power failure is acceptable
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logging.error(f"SQLite FTS5 is not available, local search disabled: {str(e)}")
+            self.fts_enabled = False
+
+    def get_account(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history_id, complete, synced_at FROM accounts WHERE account_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'history_id': row[0], 'complete': bool(row[1]), 'synced_at': row[2]}
+
+    def set_account(self, key: str, history_id: str | None, complete: bool | None = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO accounts (account_key, history_id, complete, synced_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(account_key) DO UPDATE SET history_id = excluded.history_id, synced_at = excluded.synced_at"
+                + (", complete = excluded.complete" if complete is not None else ""),
+                (key, history_id, int(bool(complete)), time.time())
+            )
+
+    def clear_account(self, key: str):
+        with self._lock, self._conn:
+            if self.fts_enabled:
+                self._conn.execute(
+                    "DELETE FROM messages_fts WHERE rowid IN (SELECT rowid FROM messages WHERE account_key = ?)", (key,)
+                )
+            self._conn.execute("DELETE FROM messages WHERE account_key = ?", (key,))
+            self._conn.execute("DELETE FROM accounts WHERE account_key = ?", (key,))
+
+    def _index_message(self, rowid: int, metadata: dict, body: str | None):
+        # Callers hold the lock and the transaction
+        self._conn.execute("DELETE FROM messages_fts WHERE rowid = ?", (rowid,))
+        self._conn.execute(
+            "INSERT INTO messages_fts (rowid, subject, sender, recipients, snippet, body) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                rowid,
+                metadata.get('subject', ''),
+                metadata.get('from', ''),
+                ' '.join(filter(None, [metadata.get('to'), metadata.get('cc'), metadata.get('bcc')])),
+                metadata.get('snippet', ''),
+                (body or '')[:MAX_INDEXED_BODY_CHARS],
+            )
+        )
+
+    def upsert_messages(self, key: str, messages: list):
+        rows = [
+            (key, message['id'], int(message.get('internalDate') or 0), labels_column(message.get('labelIds')), json.dumps(message))
+            for message in messages
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO messages (account_key, id, internal_date, labels, metadata) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(account_key, id) DO UPDATE SET internal_date = excluded.internal_date, "
+                "labels = excluded.labels, metadata = excluded.metadata",
+                rows
+            )
+            if not self.fts_enabled:
+                return
+            # The index follows every metadata write, bodies are kept when already known
+            for message in messages:
+                rowid, full_message = self._conn.execute(
+                    "SELECT rowid, full_message FROM messages WHERE account_key = ? AND id = ?", (key, message['id'])
+                ).fetchone()
+                body = json.loads(full_message)['email'].get('body') if full_message else None
+                self._index_message(rowid, message, body)
+
+    def update_labels(self, key: str, labels_by_id: dict):
+        with self._lock, self._conn:
+            for message_id, label_ids in labels_by_id.items():
+                row = self._conn.execute(
+                    "SELECT metadata FROM messages WHERE account_key = ? AND id = ?", (key, message_id)
+                ).fetchone()
+                if row is None:
+                    continue
+                metadata = json.loads(row[0])
+                metadata['labelIds'] = label_ids
+                self._conn.execute(
+                    "UPDATE messages SET labels = ?, metadata = ? WHERE account_key = ? AND id = ?",
+                    (labels_column(label_ids), json.dumps(metadata), key, message_id)
+                )
+
+    def delete_messages(self, key: str, message_ids: list):
+        with self._lock, self._conn:
+            if self.fts_enabled:
+                self._conn.executemany(
+                    "DELETE FROM messages_fts WHERE rowid = (SELECT rowid FROM messages WHERE account_key = ? AND id = ?)",
+                    [(key, message_id) for message_id in message_ids]
+                )
+            self._conn.executemany(
+                "DELETE FROM messages WHERE account_key = ? AND id = ?", [(key, message_id) for message_id in message_ids]
+            )
+
+    def query(self, key: str, label_filters: list, limit: int) -> list:
+        """Stored metadata matching the label filters, newest first, like messages.list without spam and trash"""
+        conditions = ["account_key = ?", "labels NOT LIKE '%,SPAM,%'", "labels NOT LIKE '%,TRASH,%'"]
+        params: list[object] = [key]
+        for label, must_have in label_filters:
+            conditions.append("labels LIKE ?" if must_have else "labels NOT LIKE ?")
+            params.append(f"%,{label},%")
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT metadata FROM messages WHERE {' AND '.join(conditions)} ORDER BY internal_date DESC LIMIT ?", params
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def search(self, key: str, text: str, after_ms: int | None = None, before_ms: int | None = None,
+               limit: int = 20, newest_first: bool = False) -> list:
+        """
+        Full-text search over subject, sender, recipients, snippet and body.
+
+        Returns:
+            list: Stored metadata with 'score' (higher is better) and 'match' (highlighted excerpt),
+                  best match first, or newest first when newest_first is set
+        """
+        if not self.fts_enabled:
+            raise RuntimeError("Local search needs SQLite with FTS5")
+        match = fts_query(text)
+        if not match:
+            return []
+
+        # Like Gmail search, spam and trash are left out
+        conditions = ["messages_fts MATCH ?", "m.account_key = ?", "m.labels NOT LIKE '%,SPAM,%'", "m.labels NOT LIKE '%,TRASH,%'"]
+        params: list[object] = [match, key]
+        if after_ms is not None:
+            conditions.append("m.internal_date >= ?")
+            params.append(after_ms)
+        if before_ms is not None:
+            conditions.append("m.internal_date < ?")
+            params.append(before_ms)
+        params.append(limit)
+        order = "m.internal_date DESC" if newest_first else "score, m.internal_date DESC"
+        # CROSS JOIN keeps the full-text match as the outer loop, the planner would otherwise
+        # walk messages_by_date for newest_first and run the match once per stored message
+        weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT m.metadata, bm25(messages_fts, {weights}) AS score, "
+                f"snippet(messages_fts, -1, '[', ']', '...', 12) "
+                f"FROM messages_fts CROSS JOIN messages m ON m.rowid = messages_fts.rowid "
+                f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?",
+                params
+            ).fetchall()
+
+        results = []
+        for metadata, score, excerpt in rows:
+            message = json.loads(metadata)
+            # bm25() is lower-is-better, flip it for readers
+            message['score'] = round(-score, 6)
+            message['match'] = excerpt
+            results.append(message)
+        return results
+
+    def get_message(self, key: str, message_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata, full_message FROM messages WHERE account_key = ? AND id = ?", (key, message_id)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'metadata': json.loads(row[0]), 'full_message': json.loads(row[1]) if row[1] else None}
+
+    def set_full_message(self, key: str, message_id: str, full_message: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE messages SET full_message = ? WHERE account_key = ? AND id = ?",
+                (json.dumps(full_message), key, message_id)
+            )
+            if not self.fts_enabled:
+                return
+            row = self._conn.execute(
+                "SELECT rowid, metadata FROM messages WHERE account_key = ? AND id = ?", (key, message_id)
+            ).fetchone()
+            if row is not None:
+                self._index_message(row[0], json.loads(row[1]), full_message['email'].get('body'))
@@ -54,7 +54,9 @@ load_dotenv()
 
 from . import tools_gmail
 from . import tools_calendar
+from . import tools_diagnostics
 from . import toolhandler
+from .worker_pool import ToolWorkers
 
 # Load environment variables
 
@@ -107,6 +109,7 @@ def get_tool_handler(name: str) -> toolhandler.ToolHandler | None:
     return tool_handlers[name]
 
 add_tool_handler(tools_gmail.QueryEmailsToolHandler())
+add_tool_handler(tools_gmail.SearchLocalEmailsToolHandler())
 add_tool_handler(tools_gmail.GetEmailByIdToolHandler())
 add_tool_handler(tools_gmail.CreateDraftToolHandler())
 add_tool_handler(tools_gmail.DeleteDraftToolHandler())
@@ -128,6 +131,8 @@ add_tool_handler(tools_meet.CancelMeetingToolHandler())
 add_tool_handler(tools_meet.RescheduleMeetingToolHandler())
 add_tool_handler(tools_meet.GetAllMeetingsToolHandler())
 
+add_tool_handler(tools_diagnostics.GetServerDiagnosticsToolHandler())
+
 @app.list_tools()
 async def list_tools() -> list[Tool]:
     """List available tools."""
@@ -152,7 +157,8 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent | ImageCo
         if not tool_handler:
             raise ValueError(f"Unknown tool: {name}")
 
-        return tool_handler.run_tool(arguments)
+        # Handlers block on Google API calls, run them on the worker pool so concurrent calls overlap
+        return await ToolWorkers.run(tool_handler, arguments)
     except Exception as e:
         logging.error(traceback.format_exc())
         logging.error(f"Error during call_tool: str(e)")
@@ -0,0 +1,136 @@
+from googleapiclient.discovery import build
+from google.auth.transport.requests import AuthorizedSession
+from . import gauth
+from collections import OrderedDict
+import hashlib
+import logging
+import threading
+import time
+
+SERVICE_CACHE_MAX_ENTRIES = 64
+SERVICE_CACHE_TTL_SECONDS = 1800
+
+
+def credential_key(creds_data: dict) -> tuple:
+    """
+    Identity of a credential set: client_id plus a hash of the refresh token,
+    so raw tokens are never kept as cache keys.
+    """
+    secret = creds_data.get('refresh_token') or creds_data.get('token') or ''
+    return (creds_data.get('client_id', ''), hashlib.sha256(secret.encode('utf-8')).hexdigest())
+
+
+class ServiceCache():
+    """
+    LRU + TTL cache of authorized credentials and built Google API service objects.
+
+    The discovery document, credentials and HTTP transport are built once per credential
+    set and reused by warm tool calls. httplib2 transports are not thread-safe, so
+    services are cached per thread while the authorized credentials are shared.
+    Authorized requests sessions, used for streamed downloads, are cached per thread the
+    same way so their connections stay open between downloads.
+    """
+
+    def __init__(self, max_entries: int = SERVICE_CACHE_MAX_ENTRIES, ttl_seconds: float = SERVICE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._credentials = OrderedDict()
+        self._services = OrderedDict()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, store: OrderedDict, key):
+        entry = store.get(key)
+        if entry is None:
+            return None
+        value, created_at = entry
+        if time.monotonic() - created_at > self.ttl_seconds:
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return value
+
+    def _put(self, store: OrderedDict, key, value):
+        store[key] = (value, time.monotonic())
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def get_credentials(self, creds_data: dict):
+        """Authorized credentials for creds_data, authorizing only on a cache miss"""
+        if creds_data is None:
+            return gauth.authorize_credentials(creds_data)
+
+        key = credential_key(creds_data)
+        with self._lock:
+            credentials = self._get(self._credentials, key)
+        if credentials is not None:
+            return credentials
+
+        credentials = gauth.authorize_credentials(creds_data)
+        with self._lock:
+            self._put(self._credentials, key, credentials)
+        return credentials
+
+    def get_service(self, creds_data: dict, service_name: str, version: str):
+        """Built API service for creds_data, e.g. get_service(creds, 'gmail', 'v1')"""
+        key = (service_name, version, threading.get_ident()) + credential_key(creds_data or {})
+        with self._lock:
+            service = self._get(self._services, key)
+            if service is not None:
+                self.hits += 1
+                return service
+            self.misses += 1
+
+        credentials = self.get_credentials(creds_data)
+        service = build(service_name, version, credentials=credentials, cache_discovery=False)
+        with self._lock:
+            self._put(self._services, key, service)
+        logging.info(f"Built {service_name} {version} service, {len(self._services)} cached")
+        return service
+
+    def get_session(self, creds_data: dict) -> AuthorizedSession:
+        """Authorized requests session for creds_data on this thread, with keep-alive connections"""
+        key = (threading.get_ident(),) + credential_key(creds_data or {})
+        with self._lock:
+            session = self._get(self._sessions, key)
+        if session is not None:
+            return session
+
+        session = AuthorizedSession(self.get_credentials(creds_data))
+        with self._lock:
+            self._put(self._sessions, key, session)
+        return session
+
+    def invalidate(self, creds_data: dict | None = None):
+        """Drop cached entries for one credential set, or everything"""
+        with self._lock:
+            if creds_data is None:
+                self._credentials.clear()
+                self._services.clear()
+                self._sessions.clear()
+                return
+            key = credential_key(creds_data)
+            self._credentials.pop(key, None)
+            for service_key in [k for k in self._services if k[3:] == key]:
+                del self._services[service_key]
+            for session_key in [k for k in self._sessions if k[1:] == key]:
+                del self._sessions[session_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'credentials': len(self._credentials),
+                'services': len(self._services),
+                'sessions': len(self._sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+# Shared by GmailService, CalendarService and MeetService
+GoogleServiceCache = ServiceCache()
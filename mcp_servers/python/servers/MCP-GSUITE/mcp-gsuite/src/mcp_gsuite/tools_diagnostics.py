@@ -0,0 +1,37 @@
+from collections.abc import Sequence
+from mcp.types import (
+    Tool,
+    TextContent,
+    ImageContent,
+    EmbeddedResource,
+)
+from . import toolhandler
+from .service_cache import GoogleServiceCache
+from .worker_pool import ToolWorkers
+import json
+
+class GetServerDiagnosticsToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("get_gsuite_server_diagnostics")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Returns diagnostics of the GSuite MCP server: busy workers and queue depth of the tool worker pool,
+            per-tool call counts and latency, and the Google API service cache hit rate.""",
+            inputSchema={
+                "type": "object",
+                "properties": {},
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        return [
+            TextContent(
+                type="text",
+                text=json.dumps({
+                    "worker_pool": ToolWorkers.stats(),
+                    "service_cache": GoogleServiceCache.stats(),
+                }, indent=2)
+            )
+        ]
@@ -7,16 +7,17 @@ from mcp.types import (
     LoggingLevel,
 )
 from . import gmail
+from . import gmail_sync
 import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from . import toolhandler
-import base64
+from .worker_pool import ToolWorkers
 
-def decode_base64_data(file_data):
-    standard_base64_data = file_data.replace("-", "+").replace("_", "/")
-    missing_padding = len(standard_base64_data) % 4
-    if missing_padding:
-        standard_base64_data += '=' * (4 - missing_padding)
-    return base64.b64decode(standard_base64_data, validate=True)
+# Threads for the attachment downloads of bulk_save_gmail_attachments, long lived so they keep
+# their cached services between calls. Each call fans out to at most its credential's slot limit
+AttachmentDownloads = ThreadPoolExecutor(max_workers=ToolWorkers.max_workers, thread_name_prefix="gsuite-download")
 
 class QueryEmailsToolHandler(toolhandler.ToolHandler):
     def __init__(self):
@@ -28,6 +29,7 @@ class QueryEmailsToolHandler(toolhandler.ToolHandler):
             description="""Query Gmail emails based on an optional search query. 
             Returns emails in reverse chronological order (newest first).
             Returns metadata such as subject and also a short summary of the content.
+            When more emails match, also returns a next_cursor; pass it as cursor to continue the listing.
             """,
             inputSchema={
                 "type": "object",
@@ -45,10 +47,22 @@ class QueryEmailsToolHandler(toolhandler.ToolHandler):
                     },
                     "max_results": {
                         "type": "integer",
-                        "description": "Maximum number of emails to retrieve (1-500)",
+                        "description": "Maximum number of emails to retrieve (1-5000)",
                         "minimum": 1,
-                        "maximum": 500,
+                        "maximum": 5000,
                         "default": 100
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor returned by a previous query_gmail_emails call (optional). Continues that listing, the query argument is ignored."
+                    },
+                    "fields": {
+                        "type": "array",
+                        "items": {
+                            "type": "string",
+                            "enum": gmail.QUERY_FIELDS
+                        },
+                        "description": "Email fields to return (optional), e.g. ['subject', 'from', 'date', 'snippet']. Returns all metadata fields if not provided."
                     }
                 },
             }
@@ -67,7 +81,121 @@ class QueryEmailsToolHandler(toolhandler.ToolHandler):
         gmail_service = gmail.GmailService(credentials=credentials)
         query = args.get('query')
         max_results = args.get('max_results', 100)
-        emails = gmail_service.query_emails(query=query, max_results=max_results)
+        fields = args.get('fields')
+        if fields:
+            invalid_fields = [field for field in fields if field not in gmail.QUERY_FIELDS]
+            if invalid_fields:
+                raise RuntimeError(f"Invalid fields: {', '.join(invalid_fields)}. Valid fields: {', '.join(gmail.QUERY_FIELDS)}")
+        cursor = args.get('cursor')
+        if cursor:
+            try:
+                gmail.decode_cursor(cursor)
+            except ValueError as e:
+                raise RuntimeError(str(e))
+
+        # Repeat listings are answered from the local store, kept current with Gmail history
+        served = None
+        sync = gmail_sync.get_gmail_sync()
+        if sync and not cursor:
+            try:
+                served = sync.query_emails(gmail_service, credentials, query, max_results, fields)
+            except Exception as e:
+                logging.error(f"Error serving emails from the sync store: {str(e)}")
+        if served is not None:
+            emails, next_cursor = served
+        else:
+            emails, next_cursor = gmail_service.query_emails_page(query=query, max_results=max_results, fields=fields, cursor=cursor)
+
+        result = [
+            TextContent(
+                type="text",
+                text=json.dumps(emails, indent=2)
+            )
+        ]
+        if next_cursor:
+            result.append(
+                TextContent(
+                    type="text",
+                    text=json.dumps({"next_cursor": next_cursor})
+                )
+            )
+        return result
+
+class SearchLocalEmailsToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("search_local_gmail")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Fast ranked full-text search over the locally synced Gmail messages (the most recent emails of the account).
+            Searches subject, sender, recipients, snippet and the bodies of emails already read with get_gmail_email.
+            Returns the best matches first with a highlighted excerpt. Use query_gmail_emails for Gmail search operators or older emails.
+            """,
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": """Search terms, all terms must match. Examples:
+                            - 'invoice march' for emails containing both words
+                            - 'invoi*' for a prefix search
+                            - '"quarterly report"' for an exact phrase
+                            - 'from:alice subject:budget' to restrict terms to a field (from, to, subject, snippet, body)"""
+                    },
+                    "after": {
+                        "type": "string",
+                        "description": "Only emails received on or after this date, ISO format e.g. 2024-03-01 (optional)"
+                    },
+                    "before": {
+                        "type": "string",
+                        "description": "Only emails received before this date, ISO format e.g. 2024-04-01 (optional)"
+                    },
+                    "sort": {
+                        "type": "string",
+                        "enum": ["relevance", "newest"],
+                        "description": "Order of the results (default: relevance)",
+                        "default": "relevance"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "Maximum number of emails to return (1-500)",
+                        "minimum": 1,
+                        "maximum": 500,
+                        "default": 20
+                    }
+                },
+                "required": ["query"]
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        if "query" not in args:
+            raise RuntimeError("Missing required argument: query")
+
+        credentials = args.get(toolhandler.CREDENTIALS_ARG)
+        if not credentials:
+            raise RuntimeError(f"Missing required argument: {toolhandler.CREDENTIALS_ARG}")
+
+        sync = gmail_sync.get_gmail_sync()
+        if sync is None:
+            raise RuntimeError("Local Gmail search is disabled, start the server with a --sync-store file")
+
+        for date_arg in ("after", "before"):
+            if args.get(date_arg):
+                try:
+                    gmail_sync.date_to_ms(args[date_arg])
+                except ValueError:
+                    raise RuntimeError(f"Invalid {date_arg} date: {args[date_arg]}, expected ISO format e.g. 2024-03-01")
+
+        gmail_service = gmail.GmailService(credentials=credentials)
+        emails = sync.search(
+            gmail_service, credentials, args["query"],
+            after=args.get("after"),
+            before=args.get("before"),
+            max_results=min(max(1, args.get("max_results", 20)), 500),
+            newest_first=args.get("sort") == "newest"
+        )
 
         return [
             TextContent(
@@ -109,7 +237,17 @@ class GetEmailByIdToolHandler(toolhandler.ToolHandler):
             raise RuntimeError(f"Missing required argument: {toolhandler.CREDENTIALS_ARG}")
 
         gmail_service = gmail.GmailService(credentials=credentials)
-        email, attachments = gmail_service.get_email_by_id_with_attachments(args["email_id"])
+        served = None
+        sync = gmail_sync.get_gmail_sync()
+        if sync:
+            try:
+                served = sync.get_email(gmail_service, credentials, args["email_id"])
+            except Exception as e:
+                logging.error(f"Error serving email from the sync store: {str(e)}")
+        if served is not None:
+            email, attachments = served
+        else:
+            email, attachments = gmail_service.get_email_by_id_with_attachments(args["email_id"])
 
         if email is None:
             return [
@@ -166,11 +304,9 @@ class BulkGetEmailsByIdsToolHandler(toolhandler.ToolHandler):
         gmail_service = gmail.GmailService(credentials=credentials)
         
         results = []
-        for email_id in args["email_ids"]:
-            email, attachments = gmail_service.get_email_by_id_with_attachments(email_id)
-            if email is not None:
-                email["attachments"] = attachments
-                results.append(email)
+        for email, attachments in gmail_service.get_emails_by_ids_with_attachments(args["email_ids"]):
+            email["attachments"] = attachments
+            results.append(email)
 
         if not results:
             return [
@@ -425,6 +561,11 @@ class GetAttachmentToolHandler(toolhandler.ToolHandler):
                     "save_to_disk": {
                         "type": "string",
                         "description": "The fullpath to save the attachment to disk. If not provided, the attachment is returned as a resource."
+                    },
+                    "sha256": {
+                        "type": "boolean",
+                        "description": "Whether to return the SHA-256 checksum of the attachment saved to disk (optional)",
+                        "default": False
                     }
                 },
                 "required": ["message_id", "attachment_id", "mime_type", "filename"]
@@ -451,33 +592,34 @@ class GetAttachmentToolHandler(toolhandler.ToolHandler):
             raise RuntimeError(f"Missing required argument: {toolhandler.CREDENTIALS_ARG}")
 
         gmail_service = gmail.GmailService(credentials=credentials)
-        attachment_data = gmail_service.get_attachment(args["message_id"], args["attachment_id"])
+        failed_text = f"Failed to retrieve attachment with ID: {args['attachment_id']} from message: {args['message_id']}"
 
-        if attachment_data is None:
+        if args.get("save_to_disk"):
+            # Streamed from the socket and decoded straight into the file
+            saved = gmail_service.save_attachment(
+                args["message_id"], args["attachment_id"], args["save_to_disk"], sha256=args.get("sha256", False)
+            )
+            if saved is None:
+                return [TextContent(type="text", text=failed_text)]
             return [
                 TextContent(
                     type="text",
-                    text=f"Failed to retrieve attachment with ID: {args['attachment_id']} from message: {args['message_id']}"
+                    text=f"Attachment saved to disk: {saved['path']} ({saved['size']} bytes"
+                         + (f", sha256 {saved['sha256']})" if saved["sha256"] else ")")
                 )
             ]
 
-        file_data = attachment_data["data"]
+        attachment_data = gmail_service.get_attachment(args["message_id"], args["attachment_id"])
+        if attachment_data is None:
+            return [TextContent(type="text", text=failed_text)]
+
+        # The base64 blob from Gmail is handed over as is, never decoded and re-encoded
         attachment_url = f"attachment://gmail/{args['message_id']}/{args['attachment_id']}/{filename}"
-        if args.get("save_to_disk"):
-            decoded_data = decode_base64_data(file_data)
-            with open(args["save_to_disk"], "wb") as f:
-                f.write(decoded_data)
-            return [
-                TextContent(
-                    type="text",
-                    text=f"Attachment saved to disk: {args['save_to_disk']}"
-                )
-            ]
         return [
             EmbeddedResource(
                 type="resource",
                 resource={
-                    "blob": file_data,
+                    "blob": attachment_data["data"],
                     "uri": attachment_url,
                     "mimeType": mime_type,
                 },
@@ -515,6 +657,11 @@ class BulkSaveAttachmentsToolHandler(toolhandler.ToolHandler):
                             },
                             "required": ["message_id", "part_id", "save_path"]
                         }
+                    },
+                    "sha256": {
+                        "type": "boolean",
+                        "description": "Whether to return the SHA-256 checksum of every saved attachment (optional)",
+                        "default": False
                     }
                 },
                 "required": ["attachments"]
@@ -534,57 +681,55 @@ class BulkSaveAttachmentsToolHandler(toolhandler.ToolHandler):
             raise RuntimeError(f"Missing required argument: {toolhandler.CREDENTIALS_ARG}")
 
         gmail_service = gmail.GmailService(credentials=credentials)
-        results = []
+        sha256 = args.get("sha256", False)
 
-        for attachment_info in args["attachments"]:
-            # get attachment data from message_id and part_id
-            message, attachments = gmail_service.get_email_by_id_with_attachments(
-                attachment_info["message_id"]
-            )
-            if message is None:
-                results.append(
-                    TextContent(
-                        type="text",
-                        text=f"Failed to retrieve message with ID: {attachment_info['message_id']}"
-                    )
-                )
-                continue
-            # get attachment_id from part_id
-            attachment_id = attachments[attachment_info["part_id"]]["attachmentId"]
-            attachment_data = gmail_service.get_attachment(
-                attachment_info["message_id"], 
-                attachment_id
-            )
-            if attachment_data is None:
-                results.append(
-                    TextContent(
-                        type="text",
-                        text=f"Failed to retrieve attachment with ID: {attachment_id} from message: {attachment_info['message_id']}"
-                    )
-                )
-                continue
-
-            file_data = attachment_data["data"]
-            try:    
-                decoded_data = decode_base64_data(file_data)
-                with open(attachment_info["save_path"], "wb") as f:
-                    f.write(decoded_data)
-                results.append(
-                    TextContent(
-                        type="text",
-                        text=f"Attachment saved to: {attachment_info['save_path']}"
-                    )
+        # One parts-only fetch per distinct message, however many of its attachments are requested
+        message_ids = list(dict.fromkeys(item["message_id"] for item in args["attachments"]))
+        attachments_by_message = gmail_service.get_attachments_by_message_ids(message_ids)
+
+        def save_item(attachment_info: dict) -> str:
+            start_time = time.perf_counter()
+            message_id = attachment_info["message_id"]
+
+            def elapsed_ms() -> float:
+                return (time.perf_counter() - start_time) * 1000
+
+            attachments = attachments_by_message.get(message_id)
+            if attachments is None:
+                return f"Failed to retrieve message with ID: {message_id} ({elapsed_ms():.0f} ms)"
+            attachment = attachments.get(attachment_info["part_id"])
+            if attachment is None:
+                return f"Failed to find attachment part {attachment_info['part_id']} in message: {message_id} ({elapsed_ms():.0f} ms)"
+
+            try:
+                saved = gmail_service.save_attachment(
+                    message_id, attachment["attachmentId"], attachment_info["save_path"], sha256=sha256
                 )
             except Exception as e:
-                results.append(
-                    TextContent(
-                        type="text",
-                        text=f"Failed to save attachment to {attachment_info['save_path']}: {str(e)}"
-                    )
-                )
-                continue
+                return f"Failed to save attachment to {attachment_info['save_path']}: {str(e)} ({elapsed_ms():.0f} ms)"
+
+            if saved is None:
+                return f"Failed to retrieve attachment with ID: {attachment['attachmentId']} from message: {message_id} ({elapsed_ms():.0f} ms)"
+            return (
+                f"Attachment saved to: {saved['path']} ({saved['size']} bytes, {elapsed_ms():.0f} ms"
+                + (f", sha256 {saved['sha256']})" if saved["sha256"] else ")")
+            )
 
-        return results
+        def save_share(share: list) -> list:
+            return [save_item(attachment_info) for attachment_info in share]
+
+        # This call holds one of its credential's worker pool slots, so it downloads on at most
+        # max_calls_per_credential threads: its own plus that many minus one from AttachmentDownloads
+        items = args["attachments"]
+        workers = max(1, min(len(items), ToolWorkers.max_calls_per_credential))
+        shares = [items[index::workers] for index in range(workers)]
+        futures = [AttachmentDownloads.submit(save_share, share) for share in shares[1:]]
+        texts: list[str] = [""] * len(items)
+        texts[0::workers] = save_share(shares[0])
+        for index, future in enumerate(futures, start=1):
+            texts[index::workers] = future.result()
+
+        return [TextContent(type="text", text=text) for text in texts]
 
 class SendEmailToolHandler(toolhandler.ToolHandler):
     def __init__(self):
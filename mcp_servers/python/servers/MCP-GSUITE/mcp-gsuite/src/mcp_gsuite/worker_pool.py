@@ -0,0 +1,142 @@
+from . import toolhandler
+from .service_cache import credential_key
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import threading
+import time
+
+
+def get_worker_pool_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=8,
+        help="Threads running tool calls concurrently",
+    )
+    parser.add_argument(
+        "--max-calls-per-credential",
+        type=int,
+        default=4,
+        help="Concurrent tool calls allowed for one Google account",
+    )
+    args, _ = parser.parse_known_args()
+    return args
+
+
+class ToolWorkerPool():
+    """
+    Runs the blocking run_tool handlers on a thread pool, so tool calls arriving concurrently
+    on the stdio session overlap. A per-credential semaphore keeps one account from taking
+    every worker (and from hitting Google's per-user rate limits).
+    """
+
+    def __init__(self, max_workers: int, max_calls_per_credential: int):
+        self.max_workers = max_workers
+        self.max_calls_per_credential = max_calls_per_credential
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gsuite-tool")
+        # credential key -> [semaphore, calls holding or waiting for it], dropped when unused
+        self._credential_slots = {}
+        self._lock = threading.Lock()
+        self.waiting_for_credential = 0
+        self.queued = 0
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.tool_stats = {}
+
+    def _credential_key(self, arguments: dict) -> tuple | None:
+        credentials = arguments.get(toolhandler.CREDENTIALS_ARG)
+        if not isinstance(credentials, dict):
+            return None
+        return credential_key(credentials)
+
+    def _take_slot_ref(self, key: tuple) -> asyncio.Semaphore:
+        state = self._credential_slots.get(key)
+        if state is None:
+            state = [asyncio.Semaphore(self.max_calls_per_credential), 0]
+            self._credential_slots[key] = state
+        state[1] += 1
+        return state[0]
+
+    def _drop_slot_ref(self, key: tuple):
+        state = self._credential_slots[key]
+        state[1] -= 1
+        if state[1] == 0:
+            del self._credential_slots[key]
+
+    def _run(self, tool_handler: toolhandler.ToolHandler, arguments: dict):
+        with self._lock:
+            self.queued -= 1
+            self.busy += 1
+        start_time = time.perf_counter()
+        failed = False
+        try:
+            return tool_handler.run_tool(arguments)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self._lock:
+                self.busy -= 1
+                self.completed += 1
+                self.failed += int(failed)
+                stats = self.tool_stats.setdefault(tool_handler.name, {"calls": 0, "failed": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                stats["calls"] += 1
+                stats["failed"] += int(failed)
+                stats["total_seconds"] += elapsed
+                stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    async def run(self, tool_handler: toolhandler.ToolHandler, arguments: dict):
+        """Run a tool handler on the pool, waiting for a slot of its credential first"""
+        key = self._credential_key(arguments)
+        if key is None:
+            return await self._submit(tool_handler, arguments)
+
+        slot = self._take_slot_ref(key)
+        try:
+            self.waiting_for_credential += 1
+            try:
+                await slot.acquire()
+            finally:
+                self.waiting_for_credential -= 1
+            try:
+                return await self._submit(tool_handler, arguments)
+            finally:
+                slot.release()
+        finally:
+            self._drop_slot_ref(key)
+
+    async def _submit(self, tool_handler: toolhandler.ToolHandler, arguments: dict):
+        with self._lock:
+            self.queued += 1
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._run, tool_handler, arguments)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_calls_per_credential": self.max_calls_per_credential,
+                "busy_workers": self.busy,
+                "queue_depth": self.queued,
+                "waiting_for_credential_slot": self.waiting_for_credential,
+                "active_credentials": len(self._credential_slots),
+                "credentials_at_limit": sum(1 for slot, _ in self._credential_slots.values() if slot.locked()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "tools": {
+                    name: {
+                        "calls": stats["calls"],
+                        "failed": stats["failed"],
+                        "avg_seconds": round(stats["total_seconds"] / stats["calls"], 4),
+                        "max_seconds": round(stats["max_seconds"], 4),
+                    }
+                    for name, stats in self.tool_stats.items()
+                },
+            }
+
+
+_pool_args = get_worker_pool_args()
+ToolWorkers = ToolWorkerPool(max(1, _pool_args.max_workers), max(1, _pool_args.max_calls_per_credential))
@@ -0,0 +1,34 @@
+import base64
+
+import pytest
+
+from mcp_gsuite.gmail import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("from:alice is:unread", "token-2", 7, 25)
+    assert decode_cursor(cursor) == {'query': "from:alice is:unread", 'page_token': "token-2", 'offset': 7, 'page_size': 25}
+
+
+def test_cursor_round_trip_first_page():
+    cursor = encode_cursor("", None, 0, 100)
+    assert decode_cursor(cursor) == {'query': "", 'page_token': None, 'offset': 0, 'page_size': 100}
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor("subject:\"a/b+c?\" ünïcode", "~~~>>>???", 1, 1)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+    assert decode_cursor(cursor)['query'] == "subject:\"a/b+c?\" ünïcode"
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "",
+    "ünïcode",
+    base64.urlsafe_b64encode(b"[1, 2]").decode('ascii'),
+    base64.urlsafe_b64encode(b'{"query": "x"}').decode('ascii'),
+    base64.urlsafe_b64encode(b'{"query": "x", "page_token": null, "offset": "a", "page_size": 10}').decode('ascii'),
+])
+def test_decode_cursor_rejects_invalid_input(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
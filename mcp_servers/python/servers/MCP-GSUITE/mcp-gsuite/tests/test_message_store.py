@@ -0,0 +1,72 @@
+import pytest
+
+from mcp_gsuite.message_store import MessageStore, fts_query
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("invoice march", '"invoice" AND "march"'),
+    ("inv*", '"inv"*'),
+    ('"quarterly report"', '"quarterly report"'),
+    ('"quarterly rep"*', '"quarterly rep"*'),
+    ("from:alice subject:invoice*", 'sender : "alice" AND subject : "invoice"*'),
+    ("FROM:alice to:bob", 'sender : "alice" AND recipients : "bob"'),
+    ('body:"wire transfer" snippet:urgent', 'body : "wire transfer" AND snippet : "urgent"'),
+    # Unknown columns are searched as plain text
+    ("label:inbox", '"label inbox"'),
+    # Quotes inside a term are escaped, a dangling quote is dropped
+    ('O"Brien', '"O""Brien"'),
+    ('"unterminated', '"unterminated"'),
+    ("", ""),
+    (None, ""),
+    ("* \"\"", ""),
+])
+def test_fts_query(text, expected):
+    assert fts_query(text) == expected
+
+
+def message(message_id, subject, sender, internal_date, snippet=""):
+    return {
+        'id': message_id, 'internalDate': str(internal_date), 'labelIds': ['INBOX'],
+        'subject': subject, 'from': sender, 'to': 'me@example.com', 'snippet': snippet,
+    }
+
+
+@pytest.fixture
+def store():
+    store = MessageStore(":memory:")
+    if not store.fts_enabled:
+        pytest.skip("SQLite without FTS5")
+    store.upsert_messages("account", [
+        message("m1", "Invoice for March", "alice@example.com", 1000, "Please pay by Friday"),
+        message("m2", "Lunch on Friday?", "bob@example.com", 2000),
+        message("m3", "Re: Invoice for March", "bob@example.com", 3000, "Paid"),
+    ])
+    return store
+
+
+def test_search_runs_translated_queries(store):
+    assert {m['id'] for m in store.search("account", "invoice")} == {"m1", "m3"}
+    assert [m['id'] for m in store.search("account", "from:alice invoice")] == ["m1"]
+    assert [m['id'] for m in store.search("account", "subject:lun*")] == ["m2"]
+    assert {m['id'] for m in store.search("account", "friday")} == {"m1", "m2"}
+    assert [m['id'] for m in store.search("account", '"for march"', newest_first=True)] == ["m3", "m1"]
+    assert store.search("account", 'quote"s and:odd (syntax)') == []
+    assert store.search("other", "invoice") == []
+
+
+def test_search_ranks_subject_over_snippet(store):
+    results = store.search("account", "friday")
+    assert results[0]['id'] == "m2"
+    assert results[0]['score'] > results[1]['score']
+    assert "[Friday]" in results[0]['match']
+
+
+def test_search_leaves_out_spam_and_trash(store):
+    store.update_labels("account", {"m1": ["TRASH"], "m3": ["SPAM", "UNREAD"]})
+    assert store.search("account", "invoice") == []
+    assert [m['id'] for m in store.search("account", "friday")] == ["m2"]
+
+
+def test_deleted_messages_leave_the_index(store):
+    store.delete_messages("account", ["m1"])
+    assert [m['id'] for m in store.search("account", "invoice")] == ["m3"]